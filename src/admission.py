@@ -0,0 +1,276 @@
+"""
+SOLAR PhotoSync v1.2.0 - Admission Control Module
+Допуск загрузок: лимит размера файла, бюджет байт в полёте, отдельные полосы для мелких и крупных файлов
+"""
+
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from logger import get_logger
+from metrics import LatencyWindow
+
+
+MB = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    """Файл больше processing.max_file_size_mb"""
+
+
+class AdmissionTimeout(Exception):
+    """Загрузка не дождалась места в полосе за max_wait"""
+
+
+class Lane:
+    """
+    Полоса загрузок: не больше concurrency файлов и max_bytes байт одновременно.
+    
+    Ожидающие допускаются строго по очереди (FIFO), поэтому крупный файл не
+    голодает за потоком мелких. Файл больше всего бюджета полосы допускается,
+    когда полоса пуста.
+    """
+    
+    __slots__ = (
+        "name", "max_bytes", "concurrency", "in_flight_bytes", "active",
+        "_waiters", "admitted", "timeouts", "wait_times"
+    )
+    
+    def __init__(self, name: str, max_bytes: int, concurrency: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.in_flight_bytes = 0
+        self.active = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        
+        # Счётчики
+        self.admitted = 0
+        self.timeouts = 0
+        self.wait_times = LatencyWindow()
+    
+    def _fits(self, size: int) -> bool:
+        if self.active == 0:
+            return True
+        return self.active < self.concurrency and self.in_flight_bytes + size <= self.max_bytes
+    
+    async def acquire(self, size: int, timeout: Optional[float]) -> None:
+        """Занять место в полосе (ждать не дольше timeout секунд)"""
+        started = time.perf_counter()
+        
+        if not self._waiters and self._fits(size):
+            self._take(size)
+            self.wait_times.observe(0.0)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = (size, future)
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Место уже выдано, но ожидавший ушёл (отмена / таймаут) - вернуть
+                self.release(size)
+            else:
+                future.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._wake()
+            raise
+        
+        self.wait_times.observe(time.perf_counter() - started)
+    
+    def _take(self, size: int) -> None:
+        self.active += 1
+        self.in_flight_bytes += size
+        self.admitted += 1
+    
+    def release(self, size: int) -> None:
+        """Освободить место и допустить следующих по очереди"""
+        self.active -= 1
+        self.in_flight_bytes -= size
+        self._wake()
+    
+    def _wake(self) -> None:
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(size):
+                break
+            self._waiters.popleft()
+            self._take(size)
+            future.set_result(None)
+    
+    def snapshot(self) -> dict:
+        """Занятость полосы для /stats"""
+        return {
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "in_flight_mb": round(self.in_flight_bytes / MB, 2),
+            "max_in_flight_mb": round(self.max_bytes / MB, 2),
+            "occupancy": round(self.in_flight_bytes / self.max_bytes, 3) if self.max_bytes else 0.0,
+            "waiting": sum(1 for _, future in self._waiters if not future.done()),
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "wait": self.wait_times.snapshot()
+        }
+
+
+class LimitedStream:
+    """Чанки загрузки, обрывающиеся FileTooLarge после max_file_size байт"""
+    
+    __slots__ = ("_chunks", "_controller", "received", "exceeded")
+    
+    def __init__(self, chunks: AsyncIterator[bytes], controller: "AdmissionController"):
+        self._chunks = chunks.__aiter__()
+        self._controller = controller
+        self.received = 0
+        # Загрузка оборвана по лимиту (save_stream сообщает об этом только текстом)
+        self.exceeded = False
+    
+    def __aiter__(self) -> "LimitedStream":
+        return self
+    
+    async def __anext__(self) -> bytes:
+        chunk = await self._chunks.__anext__()
+        self.received += len(chunk)
+        if self.received > self._controller.max_file_size:
+            self.exceeded = True
+            self._controller.rejected += 1
+            raise FileTooLarge(f"more than {self._controller.max_file_size // MB} MB received")
+        return chunk
+
+
+class AdmissionController:
+    """
+    Контроль допуска перед скачиванием.
+    
+    - файлы больше processing.max_file_size_mb отклоняются сразу (по file_size
+      из update) или при загрузке, если размер не был известен;
+    - файлы до small_file_mb идут в полосу small, остальные - в large; у полос
+      свои бюджеты байт и слотов, поэтому пачка видео не задерживает фото.
+    """
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация контроллера
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        processing_config = config.get("processing", {})
+        self.max_file_size = int(processing_config.get("max_file_size_mb", 100) * MB)
+        
+        admission_config = config.get("admission", {})
+        self.enabled = admission_config.get("enabled", True)
+        self.small_file_size = int(admission_config.get("small_file_mb", 5) * MB)
+        self.max_wait = admission_config.get("max_wait_s", 300)
+        
+        # Неизвестный размер (file_size не пришёл) считается крупным файлом такого размера
+        self.unknown_size = int(admission_config.get("unknown_size_mb", 20) * MB)
+        
+        self.lanes: Dict[str, Lane] = {
+            "small": Lane(
+                "small",
+                int(admission_config.get("small_max_in_flight_mb", 64) * MB),
+                max(1, admission_config.get("small_concurrency", 16))
+            ),
+            "large": Lane(
+                "large",
+                int(admission_config.get("large_max_in_flight_mb", 256) * MB),
+                max(1, admission_config.get("large_concurrency", 2))
+            )
+        }
+        
+        self.rejected = 0
+        
+        self.logger.info(
+            f"Admission control: max file {self.max_file_size // MB} MB, "
+            f"small <= {self.small_file_size // MB} MB"
+        )
+    
+    def check_size(self, size: int) -> bool:
+        """Проходит ли файл по лимиту размера (0 - размер неизвестен)"""
+        if size and size > self.max_file_size:
+            self.rejected += 1
+            return False
+        return True
+    
+    def lane_for(self, size: int) -> Lane:
+        """Полоса для файла такого размера"""
+        if size and size <= self.small_file_size:
+            return self.lanes["small"]
+        return self.lanes["large"]
+    
+    @asynccontextmanager
+    async def admit(self, size: int) -> AsyncIterator[Lane]:
+        """
+        Дождаться допуска к скачиванию
+        
+        Args:
+            size: file_size из update (0 - неизвестен)
+        
+        Yields:
+            Полоса, в которой идёт загрузка
+        
+        Raises:
+            FileTooLarge: Файл больше лимита
+            AdmissionTimeout: Место не освободилось за max_wait секунд
+        """
+        if not self.check_size(size):
+            raise FileTooLarge(f"{size / MB:.1f} MB > {self.max_file_size // MB} MB")
+        
+        lane = self.lane_for(size)
+        if not self.enabled:
+            yield lane
+            return
+        
+        cost = size or self.unknown_size
+        try:
+            await lane.acquire(cost, self.max_wait or None)
+        except asyncio.TimeoutError:
+            lane.timeouts += 1
+            raise AdmissionTimeout(f"No room in {lane.name} lane for {self.max_wait}s")
+        
+        try:
+            yield lane
+        finally:
+            lane.release(cost)
+    
+    def limit_stream(self, chunks: AsyncIterator[bytes]) -> "LimitedStream":
+        """
+        Пропустить чанки, оборвав загрузку при превышении лимита размера
+        
+        Нужен, когда file_size в update не было или он оказался неверным.
+        """
+        return LimitedStream(chunks, self)
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "max_file_size_mb": self.max_file_size // MB,
+            "rejected": self.rejected,
+            "lanes": {name: lane.snapshot() for name, lane in self.lanes.items()}
+        }
+
+
+def create_admission_controller(config: dict) -> AdmissionController:
+    """
+    Фабричная функция для создания AdmissionController
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр AdmissionController
+    """
+    return AdmissionController(config)
@@ -0,0 +1,183 @@
+"""
+SOLAR PhotoSync v1.2.0 - Album Aggregator Module
+Сборка альбомов Telegram (media_group_id) в один пакет обработки
+"""
+
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from logger import get_logger
+from state_store import connect
+from models import Message
+
+
+class _Album:
+    """Собираемый альбом"""
+    
+    __slots__ = ("messages", "first_seen", "timer")
+    
+    def __init__(self, first_seen: float):
+        self.messages: List[Message] = []
+        self.first_seen = first_seen
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class AlbumAggregator:
+    """
+    Альбом из N фото приходит N отдельными updates с общим media_group_id.
+    
+    Участники копятся, пока не пройдёт window_ms без новых (но не дольше
+    max_wait_ms от первого), затем весь альбом отдаётся обработчику одним вызовом.
+    
+    В режиме --workers участники одного альбома могут прийти в разные процессы.
+    Файлы сохраняет каждый процесс свои, но подпись (по ней выбирается категория)
+    есть только у одного участника, поэтому подписи альбомов пишутся в общую
+    базу и подставляются процессам, которым достались участники без подписи.
+    """
+    
+    # Сколько хранить подпись альбома в общей базе (секунды)
+    CAPTION_TTL = 600
+    
+    def __init__(self, config: dict, handler: Callable[[List[Message]], Awaitable[Any]]):
+        """
+        Инициализация агрегатора
+        
+        Args:
+            config: Конфигурация приложения
+            handler: Корутина обработки альбома (WebhookHandler.handle_album)
+        """
+        self.logger = get_logger()
+        self.handler = handler
+        
+        album_config = config.get("albums", {})
+        self.enabled = album_config.get("enabled", True)
+        self.window = album_config.get("window_ms", 800) / 1000
+        self.max_wait = album_config.get("max_wait_ms", 3000) / 1000
+        self.concurrency = max(1, album_config.get("concurrency", 4))
+        
+        self._albums: Dict[str, _Album] = {}
+        self._tasks = set()
+        
+        self.conn = None
+        if config.get("server", {}).get("workers", 1) > 1:
+            self.conn = connect(config, "albums.sqlite3")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                " group_id TEXT PRIMARY KEY,"
+                " caption TEXT NOT NULL,"
+                " created REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self.conn.commit()
+        
+        # Счётчики
+        self.albums = 0
+        self.messages = 0
+    
+    def add(self, message: Message) -> None:
+        """
+        Добавить сообщение-участника альбома
+        
+        Args:
+            message: Сообщение с media_group_id
+        """
+        loop = asyncio.get_running_loop()
+        group_id = message.media_group_id
+        
+        album = self._albums.get(group_id)
+        if album is None:
+            album = self._albums[group_id] = _Album(loop.time())
+        album.messages.append(message)
+        self.messages += 1
+        
+        if self.conn is not None and message.caption:
+            self._share_caption(group_id, message.caption)
+        
+        # Окно тишины сдвигается с каждым участником, но не дальше max_wait
+        if album.timer is not None:
+            album.timer.cancel()
+        delay = min(self.window, album.first_seen + self.max_wait - loop.time())
+        album.timer = loop.call_later(max(0.0, delay), self._flush, group_id)
+    
+    def _flush(self, group_id: str) -> None:
+        """Отдать собранный альбом обработчику в отдельной задаче"""
+        album = self._albums.pop(group_id, None)
+        if album is None:
+            return
+        
+        self.albums += 1
+        messages = album.messages
+        if self.conn is not None and not any(m.caption for m in messages):
+            caption = self._shared_caption(group_id)
+            if caption:
+                messages[0].caption = caption
+        
+        task = asyncio.create_task(self._run(group_id, messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    def _share_caption(self, group_id: str, caption: str) -> None:
+        """Записать подпись альбома для других процессов"""
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO captions (group_id, caption, created) VALUES (?, ?, ?)",
+            (group_id, caption, now)
+        )
+        self.conn.execute("DELETE FROM captions WHERE created < ?", (now - self.CAPTION_TTL,))
+        self.conn.commit()
+    
+    def _shared_caption(self, group_id: str) -> Optional[str]:
+        """Подпись альбома, полученная другим процессом"""
+        row = self.conn.execute(
+            "SELECT caption FROM captions WHERE group_id = ?", (group_id,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    async def _run(self, group_id: str, messages: List[Message]) -> None:
+        """Обработка альбома с логированием ошибок"""
+        try:
+            await self.handler(messages)
+        except Exception as e:
+            self.logger.error(f"Album {group_id} failed: {e}")
+    
+    async def stop(self) -> None:
+        """Обработать недособранные альбомы и дождаться текущих"""
+        for group_id, album in list(self._albums.items()):
+            if album.timer is not None:
+                album.timer.cancel()
+            self._flush(group_id)
+        
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "shared": self.conn is not None,
+            "pending": len(self._albums),
+            "in_flight": len(self._tasks),
+            "albums": self.albums,
+            "messages": self.messages
+        }
+
+
+def create_album_aggregator(
+    config: dict,
+    handler: Callable[[List[Message]], Awaitable[Any]]
+) -> AlbumAggregator:
+    """
+    Фабричная функция для создания AlbumAggregator
+    
+    Args:
+        config: Конфигурация приложения
+        handler: Корутина обработки альбома
+    
+    Returns:
+        Экземпляр AlbumAggregator
+    """
+    return AlbumAggregator(config, handler)
@@ -9,11 +9,13 @@ Telegram Bot для автоматической загрузки медиафа
 
 import os
 import sys
+import hmac
 import json
 import asyncio
 import time
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import quote
 from aiohttp import web
 from dotenv import load_dotenv
 
@@ -21,10 +23,23 @@ from dotenv import load_dotenv
 sys.path.insert(0, str(Path(__file__).parent))
 
 from logger import get_logger, PhotoSyncLogger, get_last_saved
+from metrics import get_registry
 from classifier import create_classifier
 from heic_converter import create_converter
 from file_saver import create_file_saver
+from thumbnailer import create_thumbnailer
+from exif_reader import create_exif_reader
+from dedup_index import create_dedup_index
+from stats_index import create_stats_index
+from telegram_api import create_api_client
+from json_codec import create_json_codec
+from file_id_cache import create_file_id_cache
+from user_state import create_user_state_manager
+from media_index import InvalidQuery, create_media_index
+from job_queue import create_job_queue
+from poller import create_poller
 from webhook_handler import create_webhook_handler
+from workers import run_workers, reuse_port_supported
 
 
 class SolarPhotoSyncBot:
@@ -32,13 +47,22 @@ class SolarPhotoSyncBot:
     
     VERSION = "1.2.0"
     
-    def __init__(self, config_path: str = None):
+    # Источники updates: webhook от Telegram или long polling getUpdates
+    MODES = ("webhook", "polling")
+    
+    def __init__(self, config_path: str = None, mode: str = "webhook", workers: int = 1, worker_id: int = 0):
         """
         Инициализация бота
         
         Args:
             config_path: Путь к конфигурационному файлу
+            mode: webhook или polling
+            workers: Количество процессов в режиме --workers
+            worker_id: Номер этого процесса (0..workers-1)
         """
+        self.mode = mode
+        self.workers = workers
+        self.worker_id = worker_id
         # Фиксируем время старта для uptime
         self.start_time = time.time()
         
@@ -51,6 +75,11 @@ class SolarPhotoSyncBot:
         # Применяем токен из переменной окружения если есть
         self._apply_env_token()
         
+        # Компоненты с общим состоянием смотрят сюда (режим --workers)
+        server_config = self.config.setdefault("server", {})
+        server_config["workers"] = workers
+        server_config["worker_id"] = worker_id
+        
         # Инициализируем логгер
         self.logger = get_logger()
         self.logger.setup(self.config)
@@ -62,16 +91,64 @@ class SolarPhotoSyncBot:
         # Инициализируем компоненты
         self.classifier = create_classifier(self.config)
         self.heic_converter = create_converter(self.config)
-        self.file_saver = create_file_saver(self.config, self.heic_converter)
+        self.dedup_index = create_dedup_index(self.config)
+        self.stats_index = create_stats_index(self.config)
+        self.thumbnailer = create_thumbnailer(self.config)
+        self.exif_reader = create_exif_reader(self.config)
+        self.file_saver = create_file_saver(
+            self.config,
+            self.heic_converter,
+            self.dedup_index,
+            self.stats_index,
+            self.thumbnailer,
+            self.exif_reader
+        )
+        self.codec = create_json_codec(self.config)
+        self.api_client = create_api_client(self.config, self.codec)
+        self.file_cache = create_file_id_cache(self.config)
+        self.user_state = create_user_state_manager(self.config)
+        self.media_index = create_media_index(self.config)
         self.webhook_handler = create_webhook_handler(
             self.config, 
             self.classifier, 
-            self.file_saver
+            self.file_saver,
+            self.api_client,
+            self.file_cache,
+            self.user_state,
+            self.media_index
+        )
+        
+        # Фоновая очередь: webhook отвечает сразу, обработка идёт в воркерах
+        self.job_queue = create_job_queue(
+            self.config,
+            self.webhook_handler.handle_update,
+            self.webhook_handler.timings
         )
         
-        # Web приложение
+        # В режиме polling updates берутся через getUpdates
+        self.poller = None
+        if self.mode == "polling":
+            self.poller = create_poller(
+                self.config,
+                self.api_client,
+                self.webhook_handler.handle_update,
+                self.webhook_handler.timings
+            )
+            self.webhook_handler.on_album_done = self.poller.finished
+        
+        # Доигрывание незавершённых после рестарта updates (фоновая задача)
+        self.replay_task = None
+        
+        # Метрики в формате Prometheus (gauge читаются при запросе)
+        self.metrics_enabled = self.config.get("metrics", {}).get("enabled", True)
+        if self.metrics_enabled:
+            self._register_gauges()
+        
+        # Web приложение (в режиме polling - только health и stats)
         self.app = web.Application()
         self._setup_routes()
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
         
         self.logger.info("All components initialized successfully")
     
@@ -132,12 +209,17 @@ class SolarPhotoSyncBot:
             "storage": {
                 "root_path": str(Path.home() / "SOLAR" / "PhotoSync"),
                 "allowed_types": ["photo", "document", "video", "animation"],
-                "allowed_extensions": [".jpg", ".jpeg", ".png", ".heic", ".pdf", ".mp4"]
+                "allowed_extensions": [".jpg", ".jpeg", ".png", ".heic", ".pdf", ".mp4"],
+                "folder_date": "capture"
             },
             "processing": {
                 "convert_heic": True,
                 "heic_quality": 85,
-                "preserve_exif": True
+                "preserve_exif": True,
+                "heic_workers": 2,
+                "heic_queue_limit": 32,
+                "heic_memory_limit_mb": 32,
+                "download_chunk_kb": 256
             },
             "classification": {
                 "auto_classification": True,
@@ -149,11 +231,119 @@ class SolarPhotoSyncBot:
                     "Documents": ["document", "паспорт"]
                 }
             },
+            "thumbnails": {
+                "enabled": True,
+                "sizes": [256, 1024],
+                "format": "webp",
+                "quality": 80,
+                "workers": 2,
+                "queue_limit": 256
+            },
+            "exif": {
+                "enabled": True,
+                "max_header_kb": 256
+            },
+            "state": {
+                "path": ""
+            },
+            "dedup": {
+                "enabled": True,
+                "mode": "hardlink"
+            },
+            "stats": {
+                "enabled": True,
+                "reconcile_interval_hours": 24
+            },
+            "metrics": {
+                "enabled": True
+            },
+            "update_journal": {
+                "enabled": True,
+                "window": 65536,
+                "snapshot_interval": 5,
+                "stale_after_s": 600
+            },
+            "ingest_journal": {
+                "enabled": True,
+                "commit_interval_ms": 10,
+                "fsync": True,
+                "replay_concurrency": 4,
+                "compact_after": 10000,
+                "orphan_age_s": 3600
+            },
+            "user_state": {
+                "inactivity_timeout": 600,
+                "max_entries": 100000,
+                "flush_interval": 5
+            },
+            "file_cache": {
+                "enabled": True,
+                "memory_entries": 10000
+            },
+            "media_index": {
+                "enabled": True,
+                "page_size": 50,
+                "max_page_size": 500,
+                "api_token": ""
+            },
+            "albums": {
+                "enabled": True,
+                "window_ms": 800,
+                "max_wait_ms": 3000,
+                "concurrency": 4
+            },
+            "sender": {
+                "global_rate": 30,
+                "chat_rate": 1,
+                "max_in_flight": 8,
+                "max_pending": 10000,
+                "max_retries": 5,
+                "drain_timeout": 10
+            },
+            "polling": {
+                "timeout": 30,
+                "limit": 100,
+                "allowed_updates": ["message"],
+                "delete_webhook": True
+            },
+            "admission": {
+                "enabled": True,
+                "small_file_mb": 5,
+                "small_max_in_flight_mb": 64,
+                "small_concurrency": 16,
+                "large_max_in_flight_mb": 256,
+                "large_concurrency": 2,
+                "unknown_size_mb": 20,
+                "max_wait_s": 300
+            },
+            "json": {
+                "backend": "auto",
+                "typed_updates": True
+            },
+            "queue": {
+                "enabled": True,
+                "workers": 4,
+                "max_size": 1000,
+                "drain_timeout": 30
+            },
+            "http": {
+                "pool_limit": 100,
+                "limit_per_host": 30,
+                "keepalive_timeout": 60,
+                "dns_cache_ttl": 300,
+                "request_timeout": 120
+            },
             "logging": {
                 "enabled": True,
                 "log_path": str(Path.home() / "SOLAR" / "PhotoSync" / "logs"),
                 "log_file": "photosync.log",
-                "log_level": "INFO"
+                "log_level": "INFO",
+                "async": True,
+                "events": {
+                    "enabled": True,
+                    "file": "photosync.events.jsonl",
+                    "debug_sample_rate": 0.05
+                }
             },
             "server": {
                 "host": "0.0.0.0",
@@ -169,12 +359,155 @@ class SolarPhotoSyncBot:
     
     def _setup_routes(self):
         """Настройка маршрутов веб-сервера"""
-        self.app.router.add_post('/api/photosync/webhook', self.handle_webhook)
+        if self.poller is None:
+            self.app.router.add_post('/api/photosync/webhook', self.handle_webhook)
         self.app.router.add_get('/api/photosync/health', self.handle_health)
         self.app.router.add_get('/api/photosync/ping', self.handle_ping)
         self.app.router.add_get('/api/photosync/stats', self.handle_stats)
+        self.app.router.add_post('/api/photosync/stats/reconcile', self.handle_stats_reconcile)
+        if self.media_index.enabled:
+            self.app.router.add_get('/api/photosync/files', self.handle_files)
+            self.app.router.add_get('/api/photosync/files/{file_id:\\d+}', self.handle_file)
+            self.app.router.add_get('/api/photosync/files/{file_id:\\d+}/content', self.handle_file_content)
+            self.app.router.add_get('/api/photosync/files/{file_id:\\d+}/thumb', self.handle_file_thumb)
+        if self.metrics_enabled:
+            self.app.router.add_get('/api/photosync/metrics', self.handle_metrics)
         self.app.router.add_get('/', self.handle_root)
     
+    def _register_gauges(self):
+        """Gauge для /api/photosync/metrics: состояние очередей и полос на момент запроса"""
+        registry = get_registry()
+        
+        # Каждый воркер отдаёт свои счётчики - различаем их меткой
+        if self.workers > 1:
+            registry.set_const_labels({"worker": str(self.worker_id)})
+        
+        registry.gauge(
+            "photosync_uptime_seconds",
+            "Seconds since start",
+            lambda: [((), time.time() - self.start_time)]
+        )
+        registry.gauge(
+            "photosync_last_saved_timestamp_seconds",
+            "Unix time of the last stored file",
+            lambda: [((), get_last_saved().timestamp())] if get_last_saved() else []
+        )
+        registry.gauge(
+            "photosync_queue_depth",
+            "Updates waiting in the job queue",
+            lambda: [((), self.job_queue.get_stats()["depth"])]
+        )
+        registry.gauge(
+            "photosync_queue_in_flight",
+            "Updates being processed",
+            lambda: [((), self.job_queue.in_flight)]
+        )
+        
+        lanes = self.webhook_handler.admission.lanes
+        registry.gauge(
+            "photosync_admission_in_flight_bytes",
+            "Bytes of downloads admitted to the lane",
+            lambda: [((name,), lane.in_flight_bytes) for name, lane in lanes.items()],
+            ("lane",)
+        )
+        registry.gauge(
+            "photosync_admission_occupancy_ratio",
+            "In-flight bytes relative to the lane budget",
+            lambda: [((name,), lane.in_flight_bytes / lane.max_bytes if lane.max_bytes else 0.0)
+                     for name, lane in lanes.items()],
+            ("lane",)
+        )
+        registry.gauge(
+            "photosync_admission_active",
+            "Downloads running in the lane",
+            lambda: [((name,), lane.active) for name, lane in lanes.items()],
+            ("lane",)
+        )
+        registry.gauge(
+            "photosync_admission_waiting",
+            "Downloads waiting for the lane",
+            lambda: [((name,), lane.snapshot()["waiting"]) for name, lane in lanes.items()],
+            ("lane",)
+        )
+        
+        sender = self.webhook_handler.sender
+        registry.gauge(
+            "photosync_sender_pending",
+            "Outgoing messages waiting for rate limits",
+            lambda: [((), sender.pending)]
+        )
+        
+        def heic_conversions():
+            stats = self.heic_converter.get_stats()
+            return [((state,), stats[state]) for state in ("running", "waiting")]
+        
+        registry.gauge(
+            "photosync_heic_conversions",
+            "HEIC conversions by state",
+            heic_conversions,
+            ("state",)
+        )
+        registry.gauge(
+            "photosync_thumbnails_in_flight",
+            "Files waiting for or being processed by the thumbnail pool",
+            lambda: [((), self.thumbnailer.get_stats()["in_flight"])]
+        )
+    
+    async def _on_startup(self, app: web.Application):
+        """Запуск долгоживущих ресурсов вместе с веб-сервером"""
+        await self.api_client.start()
+        await self.webhook_handler.sender.start()
+        
+        # Временные файлы загрузок, оборванных падением; с --workers .incoming общий -
+        # убираем только старые, новые может писать живой процесс
+        orphan_age = None
+        if self.workers > 1:
+            orphan_age = self.config.get("ingest_journal", {}).get("orphan_age_s", 3600)
+        await asyncio.to_thread(self.file_saver.sweep_incoming, orphan_age)
+        await self.webhook_handler.ingest.start()
+        
+        # Сверку счётчиков ведёт один процесс, индекс общий
+        if self.stats_index.enabled and self.worker_id == 0:
+            await self.stats_index.start()
+        if self.worker_id == 0:
+            await self.media_index.start()
+        if self.poller is not None:
+            await self.poller.start()
+        elif self.job_queue.enabled:
+            await self.job_queue.start()
+        
+        self.replay_task = asyncio.create_task(
+            self.webhook_handler.ingest.replay(
+                self.webhook_handler.handle_update,
+                self.webhook_handler.sender.confirm
+            ),
+            name="photosync-ingest-replay"
+        )
+    
+    async def _on_cleanup(self, app: web.Application):
+        """Освобождение ресурсов при остановке веб-сервера"""
+        # Сначала дорабатываем очередь, потом закрываем сессию Telegram
+        if self.replay_task is not None:
+            self.replay_task.cancel()
+            await asyncio.gather(self.replay_task, return_exceptions=True)
+        if self.poller is not None:
+            await self.poller.stop()
+        await self.job_queue.stop()
+        await self.webhook_handler.albums.stop()
+        await self.webhook_handler.sender.stop()
+        await self.webhook_handler.ingest.stop()
+        self.webhook_handler.journal.close()
+        await self.stats_index.stop()
+        await self.media_index.stop()
+        await self.api_client.close()
+        self.heic_converter.close()
+        self.thumbnailer.close()
+        self.dedup_index.close()
+        self.stats_index.close()
+        self.media_index.close()
+        self.file_cache.close()
+        self.user_state.close()
+    
     async def handle_webhook(self, request: web.Request) -> web.Response:
         """
         Обработчик webhook от Telegram
@@ -186,34 +519,51 @@ class SolarPhotoSyncBot:
             content_type = request.headers.get('Content-Type', '')
             if 'application/json' not in content_type:
                 self.logger.warning(f"Invalid Content-Type: {content_type}")
-                return web.json_response(
+                return self.codec.response(
                     {"error": "Invalid Content-Type, expected application/json"},
                     status=400
                 )
             
-            # Читаем тело запроса
+            # Разбираем тело прямо из байтов, без промежуточной str
             try:
-                body = await request.text()
+                body = await request.read()
                 if not body:
                     self.logger.debug("Empty webhook body received")
-                    return web.json_response({"status": "ok", "message": "empty"})
+                    return self.codec.response({"status": "ok", "message": "empty"})
                 
-                update = json.loads(body)
-            except json.JSONDecodeError as e:
+                update = self.codec.decode_update(body)
+            except ValueError as e:
                 self.logger.warning(f"Invalid JSON in webhook: {e}")
-                return web.json_response(
+                return self.codec.response(
                     {"error": f"Invalid JSON: {str(e)}"},
                     status=400
                 )
             
-            # Обрабатываем update
-            result = await self.webhook_handler.handle_update(update)
+            # Повтор уже обработанного update - сразу 200, без очереди
+            if self.webhook_handler.journal.is_done(update.get("update_id")):
+                return self.codec.response({"status": "ok", "duplicate": True})
+            
+            # 200 только после того, как update записан в журнал приёма (group commit)
+            await self.webhook_handler.ingest.accept(update)
+            
+            # Без очереди обрабатываем update синхронно (как раньше)
+            if not self.job_queue.enabled:
+                self.logger.start_trace()
+                result = await self.webhook_handler.handle_update(update)
+                return self.codec.response(result)
+            
+            # Ставим в очередь и сразу отвечаем 200, чтобы Telegram не повторял доставку
+            if not self.job_queue.submit(update):
+                return self.codec.response(
+                    {"error": "Queue is full, retry later"},
+                    status=503
+                )
             
-            return web.json_response(result)
+            return self.codec.response({"status": "ok", "queued": True})
             
         except Exception as e:
             self.logger.error(f"Webhook error: {e}")
-            return web.json_response(
+            return self.codec.response(
                 {"error": str(e)},
                 status=500
             )
@@ -224,7 +574,7 @@ class SolarPhotoSyncBot:
         
         GET /api/photosync/ping
         """
-        return web.json_response({
+        return self.codec.response({
             "status": "alive",
             "timestamp": datetime.now().isoformat()
         })
@@ -245,7 +595,7 @@ class SolarPhotoSyncBot:
         # Получаем root_path
         root_path = self.config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync")
         
-        return web.json_response({
+        return self.codec.response({
             "status": "ok",
             "version": self.VERSION,
             "uptime": f"{uptime_seconds}s",
@@ -259,9 +609,166 @@ class SolarPhotoSyncBot:
         
         GET /api/photosync/stats
         """
-        stats = self.file_saver.get_storage_stats()
+        stats = await asyncio.to_thread(self.file_saver.get_storage_stats)
         stats["version"] = self.VERSION
-        return web.json_response(stats)
+        stats["mode"] = self.mode
+        stats["worker"] = {"id": self.worker_id, "workers": self.workers, "pid": os.getpid()}
+        stats["queue"] = self.job_queue.get_stats()
+        if self.poller is not None:
+            stats["polling"] = self.poller.get_stats()
+        stats["stages"] = self.webhook_handler.timings.snapshot()
+        stats["classifier"] = self.classifier.get_stats()
+        stats["json"] = self.codec.get_stats()
+        stats["heic"] = self.heic_converter.get_stats()
+        stats["thumbnails"] = self.thumbnailer.get_stats()
+        stats["exif"] = self.exif_reader.get_stats()
+        stats["dedup"] = {
+            "enabled": self.dedup_index.enabled,
+            "mode": self.dedup_index.mode,
+            "hits": self.dedup_index.hits
+        }
+        stats["file_cache"] = self.file_cache.get_stats()
+        stats["media_index"] = self.media_index.get_stats()
+        stats["albums"] = self.webhook_handler.albums.get_stats()
+        stats["admission"] = self.webhook_handler.admission.get_stats()
+        stats["update_journal"] = self.webhook_handler.journal.get_stats()
+        stats["ingest_journal"] = self.webhook_handler.ingest.get_stats()
+        stats["sender"] = self.webhook_handler.sender.get_stats()
+        stats["user_state"] = self.user_state.get_stats()
+        return self.codec.response(stats)
+    
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """
+        Метрики в текстовом формате Prometheus
+        
+        GET /api/photosync/metrics
+        """
+        return web.Response(
+            body=get_registry().render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+    
+    async def handle_stats_reconcile(self, request: web.Request) -> web.Response:
+        """
+        Пересчитать счётчики хранилища обходом дерева (в фоне)
+        
+        POST /api/photosync/stats/reconcile
+        """
+        if not self.stats_index.enabled:
+            return self.codec.response({"error": "Stats index disabled"}, status=400)
+        
+        self.stats_index.reconcile_async()
+        return self.codec.response({"status": "reconciling"}, status=202)
+    
+    def _check_api_token(self, request: web.Request) -> bool:
+        """Токен media_index.api_token: заголовок Authorization: Bearer или ?token= (ссылки из <img>)"""
+        token = self.config.get("media_index", {}).get("api_token", "")
+        if not token:
+            return True
+        
+        supplied = request.query.get("token", "")
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            supplied = authorization[len("Bearer "):]
+        return hmac.compare_digest(supplied.encode(), token.encode())
+    
+    def _file_links(self, item: dict) -> dict:
+        """Запись индекса со ссылками на содержимое и миниатюры"""
+        base = f"/api/photosync/files/{item['id']}"
+        item["url"] = f"{base}/content"
+        if self.thumbnailer.accepts(Path(item["path"])):
+            item["thumbnails"] = {str(size): f"{base}/thumb?size={size}" for size in self.thumbnailer.sizes}
+        return item
+    
+    async def _get_file_item(self, request: web.Request) -> dict:
+        """Запись файла из пути запроса (HTTPUnauthorized / HTTPNotFound)"""
+        if not self._check_api_token(request):
+            raise web.HTTPUnauthorized()
+        item = await asyncio.to_thread(self.media_index.get, int(request.match_info["file_id"]))
+        if item is None:
+            raise web.HTTPNotFound()
+        return item
+    
+    async def handle_files(self, request: web.Request) -> web.Response:
+        """
+        Поиск и постраничный просмотр сохранённых файлов (от новых к старым)
+        
+        GET /api/photosync/files?category=&media_type=&chat_id=&user_id=&from=&to=&q=&cursor=&limit=
+        """
+        if not self._check_api_token(request):
+            return self.codec.response({"error": "Unauthorized"}, status=401)
+        
+        query = request.query
+        try:
+            files, next_cursor = await asyncio.to_thread(
+                self.media_index.search,
+                category=query.get("category") or None,
+                media_type=query.get("media_type") or None,
+                chat_id=int(query["chat_id"]) if query.get("chat_id") else None,
+                user_id=int(query["user_id"]) if query.get("user_id") else None,
+                date_from=query.get("from") or None,
+                date_to=query.get("to") or None,
+                text=query.get("q") or None,
+                cursor=query.get("cursor") or None,
+                limit=int(query["limit"]) if query.get("limit") else None
+            )
+        except ValueError as e:
+            # InvalidQuery и нечисловые chat_id / user_id / limit
+            message = str(e) if isinstance(e, InvalidQuery) else "chat_id, user_id and limit must be integers"
+            return self.codec.response({"error": message}, status=400)
+        
+        return self.codec.response({
+            "files": [self._file_links(item) for item in files],
+            "next_cursor": next_cursor
+        })
+    
+    async def handle_file(self, request: web.Request) -> web.Response:
+        """
+        Метаданные одного файла
+        
+        GET /api/photosync/files/{id}
+        """
+        item = await self._get_file_item(request)
+        return self.codec.response(self._file_links(item))
+    
+    async def handle_file_content(self, request: web.Request) -> web.StreamResponse:
+        """
+        Содержимое файла; Range / If-Range, ETag и Last-Modified обрабатывает FileResponse
+        (sendfile, без чтения в память)
+        
+        GET /api/photosync/files/{id}/content
+        """
+        item = await self._get_file_item(request)
+        path = self.media_index.resolve(item)
+        if path is None or not path.is_file():
+            raise web.HTTPNotFound()
+        
+        filename = quote(item["file_name"] or path.name)
+        return web.FileResponse(
+            path,
+            headers={"Content-Disposition": f"inline; filename*=UTF-8''{filename}"}
+        )
+    
+    async def handle_file_thumb(self, request: web.Request) -> web.StreamResponse:
+        """
+        Миниатюра файла (размер из thumbnails.sizes, по умолчанию наименьший)
+        
+        GET /api/photosync/files/{id}/thumb?size=256
+        """
+        item = await self._get_file_item(request)
+        path = self.media_index.resolve(item)
+        try:
+            size = int(request.query.get("size", self.thumbnailer.sizes[0]))
+        except ValueError:
+            raise web.HTTPBadRequest(text="size must be an integer")
+        if path is None or size not in self.thumbnailer.sizes or not self.thumbnailer.accepts(path):
+            raise web.HTTPNotFound()
+        
+        thumb_path = self.thumbnailer.thumb_path(path, size)
+        if not thumb_path.is_file():
+            raise web.HTTPNotFound()
+        # mimetypes до Python 3.13 не знает .webp
+        return web.FileResponse(thumb_path, headers={"Content-Type": self.thumbnailer.content_type})
     
     async def handle_root(self, request: web.Request) -> web.Response:
         """Корневой endpoint"""
@@ -288,6 +795,9 @@ class SolarPhotoSyncBot:
                 <li><code>POST /api/photosync/webhook</code> - Telegram webhook</li>
                 <li><code>GET /api/photosync/health</code> - Health check</li>
                 <li><code>GET /api/photosync/stats</code> - Storage statistics</li>
+                <li><code>POST /api/photosync/stats/reconcile</code> - Rebuild storage statistics</li>
+                <li><code>GET /api/photosync/metrics</code> - Prometheus metrics</li>
+                <li><code>GET /api/photosync/files</code> - Browse and search saved files</li>
             </ul>
             
             <h2>Categories</h2>
@@ -310,9 +820,17 @@ class SolarPhotoSyncBot:
         port = server_config.get("port", 8080)
         
         self.logger.info(f"Starting server on {host}:{port}")
-        self.logger.info(f"Webhook endpoint: http://{host}:{port}/api/photosync/webhook")
+        if self.poller is None:
+            self.logger.info(f"Webhook endpoint: http://{host}:{port}/api/photosync/webhook")
+        else:
+            self.logger.info("Receiving updates via getUpdates long polling")
         
-        web.run_app(self.app, host=host, port=port, print=None)
+        # SO_REUSEPORT: все воркеры слушают один порт, соединения распределяет ядро
+        try:
+            web.run_app(self.app, host=host, port=port, print=None, reuse_port=self.workers > 1 or None)
+        finally:
+            # Воркер завершается через os._exit (atexit не сработает) - дописываем логи здесь
+            self.logger.stop()
 
 
 def main():
@@ -332,17 +850,50 @@ def main():
         help='Server port (overrides config)',
         default=None
     )
+    parser.add_argument(
+        '-m', '--mode',
+        choices=SolarPhotoSyncBot.MODES,
+        help='Update source: webhook (default) or getUpdates long polling',
+        default='webhook'
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        help='Number of server processes sharing the port via SO_REUSEPORT',
+        default=1
+    )
     
     args = parser.parse_args()
     
-    # Создаём и запускаем бота
-    bot = SolarPhotoSyncBot(config_path=args.config)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.mode == "polling":
+        parser.error("--workers requires webhook mode: Telegram allows one getUpdates consumer")
+    if args.workers > 1 and not reuse_port_supported():
+        parser.error("--workers requires fork() and SO_REUSEPORT")
+    
+    def run_worker(worker_id: int = 0):
+        # Создаём и запускаем бота
+        bot = SolarPhotoSyncBot(
+            config_path=args.config,
+            mode=args.mode,
+            workers=args.workers,
+            worker_id=worker_id
+        )
+        
+        # Переопределяем порт если указан
+        if args.port:
+            bot.config["server"]["port"] = args.port
+        
+        bot.run()
     
-    # Переопределяем порт если указан
-    if args.port:
-        bot.config["server"]["port"] = args.port
+    if args.workers == 1:
+        run_worker()
+        return
     
-    bot.run()
+    # Родитель ничего не обрабатывает: только запускает и перезапускает воркеры
+    get_logger().setup_console()
+    sys.exit(run_workers(args.workers, run_worker))
 
 
 if __name__ == "__main__":
@@ -4,8 +4,127 @@ SOLAR PhotoSync v1.2.0 - Classifier Module (Command Routing Edition)
 """
 
 import re
-from typing import Optional, Tuple
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
 from logger import get_logger
+from metrics import LatencyWindow
+from models import Message
+
+
+class KeywordMatcher:
+    """
+    Поиск всех ключевых слов всех категорий за один проход по тексту
+    
+    Однословные ключевые слова (только \\w символы) лежат в словаре
+    слово -> номер категории: текст режется на слова одним regex, каждое слово -
+    один поиск в словаре. Это ровно то же, что \\bkw\\b, но не зависит от
+    числа ключевых слов. Фразы и слова с пунктуацией собраны в одно выражение
+    с именованными группами c0..cN; оно обёрнуто в lookahead, поэтому
+    перекрывающиеся совпадения не теряются.
+    
+    Побеждает категория с наименьшим номером (порядок в конфиге), как при
+    прежнем переборе категорий по очереди.
+    """
+    
+    # Разделитель полей при поиске по нескольким текстам за один проход
+    FIELD_SEPARATOR = "\n"
+    
+    _WORD = re.compile(r'\w+')
+    
+    def __init__(self, categories: Dict[str, List[str]]):
+        """
+        Args:
+            categories: {категория: [ключевые слова]} в порядке приоритета
+        """
+        self.categories = list(categories.keys())
+        
+        self._words: Dict[str, int] = {}
+        groups = []
+        for index, keywords in enumerate(categories.values()):
+            phrases = set()
+            for kw in keywords:
+                kw = kw.lower()
+                if not kw:
+                    continue
+                if self._WORD.fullmatch(kw):
+                    # При повторе слова в нескольких категориях важнее первая
+                    self._words.setdefault(kw, index)
+                else:
+                    phrases.add(kw)
+            
+            if phrases:
+                # Длинные фразы первыми: меньше откатов при общих префиксах
+                alternation = "|".join(re.escape(kw) for kw in sorted(phrases, key=len, reverse=True))
+                groups.append(f"(?P<c{index}>{alternation})")
+        
+        self._phrases = None
+        if groups:
+            self._phrases = re.compile(rf'(?=\b(?:{"|".join(groups)})\b)', re.IGNORECASE)
+    
+    def match(self, text: Optional[str]) -> Optional[str]:
+        """
+        Категория с наивысшим приоритетом среди ключевых слов в тексте
+        
+        Args:
+            text: Текст для анализа
+        
+        Returns:
+            Название категории или None
+        """
+        found = self.match_fields((text,))
+        return found[1] if found else None
+    
+    def match_fields(self, texts: Sequence[Optional[str]]) -> Optional[Tuple[int, str]]:
+        """
+        Поиск по нескольким полям за один проход
+        
+        Поле с меньшим номером важнее любой категории в следующих полях,
+        внутри поля решает приоритет категории.
+        
+        Args:
+            texts: Поля в порядке приоритета (None/пустые пропускаются)
+        
+        Returns:
+            Tuple[номер поля, категория] или None
+        """
+        # Начало каждого поля в склеенном тексте
+        offsets = []
+        parts = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            text = (text or "").lower()
+            parts.append(text)
+            position += len(text) + len(self.FIELD_SEPARATOR)
+        joined = self.FIELD_SEPARATOR.join(parts)
+        
+        best = (len(texts), len(self.categories))
+        
+        words = self._words
+        if words:
+            for match in self._WORD.finditer(joined):
+                category = words.get(match.group())
+                if category is None:
+                    continue
+                found = (bisect_right(offsets, match.start()) - 1, category)
+                if found < best:
+                    best = found
+                    if category == 0:
+                        break
+        
+        if self._phrases is not None:
+            for match in self._phrases.finditer(joined):
+                field = bisect_right(offsets, match.start()) - 1
+                if field > best[0]:
+                    break
+                found = (field, int(match.lastgroup[1:]))
+                if found < best:
+                    best = found
+        
+        if best[0] == len(texts):
+            return None
+        return best[0], self.categories[best[1]]
 
 
 class FileClassifier:
@@ -25,11 +144,12 @@ class FileClassifier:
         self.default_category = classification_config.get("default_category", "Other")
         self.categories = classification_config.get("categories", {})
         
-        # Компилируем регулярные выражения для быстрого поиска
-        self._compiled_patterns = {}
-        for category, keywords in self.categories.items():
-            patterns = [re.compile(rf'\b{re.escape(kw)}\b', re.IGNORECASE) for kw in keywords]
-            self._compiled_patterns[category] = patterns
+        # Все ключевые слова в одном выражении, команды - в словаре
+        self._build_matchers()
+        
+        # Время одного вызова classify
+        self.match_times = LatencyWindow()
+        self.last_duration_ms = 0.0
         
         self.logger.debug(f"Classifier initialized with {len(self.categories)} categories")
     
@@ -55,36 +175,77 @@ class FileClassifier:
         if not self.enabled:
             return self.default_category, "classification_disabled"
         
+        started = time.perf_counter()
+        category, reason, log_reason = self._classify(filename, caption, chat_title, command)
+        elapsed = time.perf_counter() - started
+        self.match_times.observe(elapsed)
+        self.last_duration_ms = elapsed * 1000
+        
+        self.logger.classification_result(filename, category, log_reason)
+        return category, reason
+    
+    def classify_message(self, message: Message, filename: str) -> Tuple[str, str]:
+        """
+        Классифицировать файл сообщения (подпись, команда в подписи, название чата)
+        
+        Args:
+            message: Сообщение
+            filename: Имя файла (после getFile может отличаться от media.file_name)
+        
+        Returns:
+            Tuple[category, reason]
+        """
+        return self.classify(
+            filename=filename,
+            caption=message.caption,
+            chat_title=message.chat_title,
+            command=self.extract_command_from_text(message.caption)
+        )
+    
+    def _classify(
+        self,
+        filename: str,
+        caption: Optional[str],
+        chat_title: Optional[str],
+        command: Optional[str]
+    ) -> Tuple[str, str, str]:
+        """
+        Сама классификация (без логирования и замеров)
+        
+        Returns:
+            Tuple[category, reason, причина для лога]
+        """
         # 1. Приоритет: явная команда от пользователя
         if command:
             category = self._match_command(command)
             if category:
-                self.logger.classification_result(filename, category, f"command: {command}")
-                return category, f"command: {command}"
-        
-        # 2. Проверка подписи к файлу
-        if caption:
-            category = self._match_text(caption)
-            if category:
-                self.logger.classification_result(filename, category, f"caption match")
-                return category, "caption_match"
-        
-        # 3. Проверка названия чата
-        if chat_title:
-            category = self._match_text(chat_title)
-            if category:
-                self.logger.classification_result(filename, category, f"chat_title: {chat_title}")
-                return category, "chat_title_match"
+                return category, f"command: {command}", f"command: {command}"
         
-        # 4. Проверка имени файла
-        category = self._match_text(filename)
-        if category:
-            self.logger.classification_result(filename, category, "filename_match")
-            return category, "filename_match"
+        # 2-4. Подпись, название чата, имя файла - один проход по всем трём
+        found = self._matcher.match_fields((caption, chat_title, filename))
+        if found:
+            field, category = found
+            if field == 0:
+                return category, "caption_match", "caption match"
+            if field == 1:
+                return category, "chat_title_match", f"chat_title: {chat_title}"
+            return category, "filename_match", "filename_match"
         
         # 5. Не удалось классифицировать -> Other
-        self.logger.classification_result(filename, self.default_category, "no_match")
-        return self.default_category, "no_match"
+        return self.default_category, "no_match", "no_match"
+    
+    def _build_matchers(self) -> None:
+        """Пересобрать выражение ключевых слов и словарь команд"""
+        self._matcher = KeywordMatcher(self.categories)
+        
+        # Прямое совпадение с названием категории важнее ключевых слов,
+        # при повторах побеждает категория, объявленная раньше
+        self._commands: Dict[str, str] = {}
+        for category, keywords in reversed(list(self.categories.items())):
+            for kw in keywords:
+                self._commands[kw.lower()] = category
+        for category in reversed(list(self.categories)):
+            self._commands[category.lower()] = category
     
     def _match_command(self, command: str) -> Optional[str]:
         """
@@ -99,17 +260,7 @@ class FileClassifier:
         # Убираем слеш и приводим к нижнему регистру
         cmd = command.lstrip('/').lower().strip()
         
-        # Прямое совпадение с названием категории
-        for category in self.categories:
-            if cmd == category.lower():
-                return category
-        
-        # Проверка по ключевым словам
-        for category, keywords in self.categories.items():
-            if cmd in [kw.lower() for kw in keywords]:
-                return category
-        
-        return None
+        return self._commands.get(cmd)
     
     def _match_text(self, text: str) -> Optional[str]:
         """
@@ -124,20 +275,18 @@ class FileClassifier:
         if not text:
             return None
         
-        text_lower = text.lower()
-        
-        # Проверяем каждую категорию
-        for category, patterns in self._compiled_patterns.items():
-            for pattern in patterns:
-                if pattern.search(text_lower):
-                    return category
-        
-        return None
+        return self._matcher.match(text)
     
     def get_categories(self) -> list:
         """Получить список всех категорий"""
         return list(self.categories.keys()) + [self.default_category]
     
+    def get_stats(self) -> dict:
+        """Время классификации для /api/photosync/stats"""
+        stats = self.match_times.snapshot()
+        stats["keywords"] = sum(len(keywords) for keywords in self.categories.values())
+        return stats
+    
     def add_category(self, name: str, keywords: list):
         """
         Добавить новую категорию
@@ -147,8 +296,7 @@ class FileClassifier:
             keywords: Список ключевых слов
         """
         self.categories[name] = keywords
-        patterns = [re.compile(rf'\b{re.escape(kw)}\b', re.IGNORECASE) for kw in keywords]
-        self._compiled_patterns[name] = patterns
+        self._build_matchers()
         self.logger.info(f"Added category: {name} with {len(keywords)} keywords")
     
     def extract_command_from_text(self, text: str) -> Optional[str]:
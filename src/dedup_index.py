@@ -0,0 +1,188 @@
+"""
+SOLAR PhotoSync v1.2.0 - Dedup Index Module
+Индекс содержимого (хэш -> сохранённый файл) для дедупликации медиа
+"""
+
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+from logger import get_logger
+from state_store import connect
+
+
+class DedupIndex:
+    """Персистентный индекс SHA-256 содержимого -> путь сохранённого файла (SQLite)"""
+    
+    # hardlink: дубликат становится жёсткой ссылкой в новой папке
+    # skip: дубликат не сохраняется, пользователю уходит "already saved"
+    MODES = {"hardlink", "skip"}
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация индекса
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        dedup_config = config.get("dedup", {})
+        self.enabled = dedup_config.get("enabled", True)
+        self.mode = dedup_config.get("mode", "hardlink")
+        if self.mode not in self.MODES:
+            self.logger.warning(f"Unknown dedup mode '{self.mode}', using hardlink")
+            self.mode = "hardlink"
+        
+        self.hits = 0
+        # lookup/add вызываются из потоков сохранения параллельно
+        self._lock = threading.Lock()
+        self.conn = connect(config, "dedup.sqlite3")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            " hash TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+        
+        self.logger.info(f"Dedup index initialized (mode: {self.mode}, enabled: {self.enabled})")
+    
+    @staticmethod
+    def new_hasher():
+        """Хэшер, который обновляется по мере поступления чанков"""
+        return hashlib.sha256()
+    
+    def lookup(self, content_hash: str) -> Optional[str]:
+        """
+        Найти уже сохранённый файл с таким содержимым
+        
+        Точечный запрос по первичному ключу; записи, чей файл удалён с диска,
+        вычищаются при обращении. Блокирует (stat + коммит) - из event loop
+        вызывать через asyncio.to_thread.
+        
+        Args:
+            content_hash: hex SHA-256
+        
+        Returns:
+            Путь к файлу или None
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT path FROM media WHERE hash = ?", (content_hash,)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        
+        if not os.path.exists(row[0]):
+            with self._lock:
+                self.conn.execute("DELETE FROM media WHERE hash = ? AND path = ?", (content_hash, row[0]))
+                self.conn.commit()
+            return None
+        
+        with self._lock:
+            self.hits += 1
+        return row[0]
+    
+    def add(self, content_hash: str, path: str, size: int) -> None:
+        """Запомнить сохранённый файл"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO media (hash, path, size) VALUES (?, ?, ?)",
+                (content_hash, path, size)
+            )
+            self.conn.commit()
+    
+    def count(self) -> int:
+        """Количество записей в индексе"""
+        return self.conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+    
+    def build(
+        self,
+        root_path: Path,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Tuple[int, int]:
+        """
+        Проиндексировать существующее дерево root_path/YYYY-MM-DD/Category/
+        
+        Файлы уже в индексе (по пути) не перехэшируются. Если содержимое
+        встречается несколько раз, в индексе остаётся первый найденный путь.
+        
+        Args:
+            root_path: Корень хранилища
+            progress: Колбэк (проиндексировано, найдено дубликатов)
+        
+        Returns:
+            Tuple[добавлено записей, найдено дубликатов]
+        """
+        known_paths = {row[0] for row in self.conn.execute("SELECT path FROM media")}
+        added = 0
+        duplicates = 0
+        
+        for file_path in iter_media_files(root_path):
+            if str(file_path) in known_paths:
+                continue
+            
+            content_hash = hash_file(file_path)
+            existing = self.conn.execute(
+                "SELECT path FROM media WHERE hash = ?", (content_hash,)
+            ).fetchone()
+            
+            if existing and os.path.exists(existing[0]):
+                duplicates += 1
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO media (hash, path, size) VALUES (?, ?, ?)",
+                    (content_hash, str(file_path), file_path.stat().st_size)
+                )
+                added += 1
+            
+            if (added + duplicates) % 1000 == 0:
+                self.conn.commit()
+                if progress:
+                    progress(added, duplicates)
+        
+        self.conn.commit()
+        return added, duplicates
+    
+    def close(self) -> None:
+        """Закрыть соединение с базой"""
+        self.conn.close()
+
+
+def iter_media_files(root_path: Path) -> Iterator[Path]:
+    """Файлы хранилища: root/YYYY-MM-DD/Category/file (скрытые директории и logs пропускаются)"""
+    for date_dir in sorted(Path(root_path).iterdir()):
+        if not date_dir.is_dir() or date_dir.name.startswith('.') or date_dir.name == 'logs':
+            continue
+        for cat_dir in date_dir.iterdir():
+            if not cat_dir.is_dir():
+                continue
+            for file in cat_dir.iterdir():
+                if file.is_file():
+                    yield file
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 файла (читается чанками)"""
+    hasher = DedupIndex.new_hasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def create_dedup_index(config: dict) -> DedupIndex:
+    """
+    Фабричная функция для создания DedupIndex
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр DedupIndex
+    """
+    return DedupIndex(config)
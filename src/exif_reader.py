@@ -0,0 +1,527 @@
+"""
+SOLAR PhotoSync v1.2.0 - Exif Reader Module
+Дата съёмки и GPS из заголовка JPEG / HEIC без декодирования изображения (прямо из потока загрузки)
+"""
+
+import time
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+from logger import get_logger
+from metrics import LatencyWindow
+
+
+# Даты раньше - сброшенные часы камеры (1970, 1980), для папки не годятся
+EARLIEST_CAPTURE = datetime(1990, 1, 1)
+
+JPEG_SOI = b"\xff\xd8"
+EXIF_HEADER = b"Exif\x00\x00"
+
+# Бренды ftyp контейнеров HEIF (iPhone HEIC, AVIF); MP4 / MOV сюда не попадают
+HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1", b"avif"}
+
+# Теги TIFF / EXIF
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_GPS_LATITUDE_REF = 1
+TAG_GPS_LATITUDE = 2
+TAG_GPS_LONGITUDE_REF = 3
+TAG_GPS_LONGITUDE = 4
+
+# Типы значений TIFF, которые нужны: ASCII, SHORT, LONG, RATIONAL, SLONG, SRATIONAL
+TYPE_FORMATS = {2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("I", 8), 9: ("i", 4), 10: ("i", 8)}
+
+# Результат разбора заголовка: нужно больше байт
+NEED_MORE = object()
+
+# (смещение в файле, длина) - блок Exif HEIC лежит дальше заголовка
+Region = Tuple[int, int]
+
+
+class ExifInfo:
+    """Метаданные снимка из EXIF"""
+    
+    __slots__ = ("taken_at", "latitude", "longitude")
+    
+    def __init__(
+        self,
+        taken_at: Optional[datetime] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ):
+        self.taken_at = taken_at
+        self.latitude = latitude
+        self.longitude = longitude
+    
+    def __repr__(self) -> str:
+        return f"ExifInfo(taken_at={self.taken_at}, latitude={self.latitude}, longitude={self.longitude})"
+
+
+def parse_header(buf: bytes) -> Union[ExifInfo, Region, None, object]:
+    """
+    Разобрать начало файла
+    
+    Returns:
+        ExifInfo, None (метаданных нет или формат не поддерживается),
+        NEED_MORE или Region (блок Exif HEIC за пределами buf)
+    """
+    if len(buf) < 12:
+        return NEED_MORE
+    if buf[:2] == JPEG_SOI:
+        return _parse_jpeg(buf)
+    if buf[4:8] == b"ftyp":
+        return _parse_heif(buf)
+    return None
+
+
+def _parse_jpeg(buf: bytes):
+    """APP1 "Exif" среди сегментов до начала данных изображения (SOS)"""
+    pos = 2
+    while True:
+        if pos + 4 > len(buf):
+            return NEED_MORE
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            # Заполняющие байты перед маркером
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Маркеры без длины
+            pos += 2
+            continue
+        if marker in (0xDA, 0xD9):
+            return None
+        
+        end = pos + 2 + (buf[pos + 2] << 8 | buf[pos + 3])
+        if marker == 0xE1:
+            if pos + 10 > len(buf):
+                return NEED_MORE
+            if buf[pos + 4:pos + 10] == EXIF_HEADER:
+                if end > len(buf):
+                    return NEED_MORE
+                return parse_tiff(bytes(buf[pos + 10:end]))
+        pos = end
+
+
+def _boxes(buf: bytes, start: int, end: int):
+    """Боксы ISOBMFF в buf[start:end]: (тип, начало содержимого, конец бокса)"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            # До конца файла
+            size = 1 << 62
+        if size < header:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _parse_heif(buf: bytes):
+    """Элемент Exif из meta: тип из iinf, расположение из iloc"""
+    try:
+        # ftyp: основной бренд, версия, совместимые бренды
+        _, start, end = next(_boxes(buf, 0, len(buf)))
+        brands = {bytes(buf[pos:pos + 4]) for pos in range(start, min(end, len(buf)), 4)}
+        if not brands & HEIF_BRANDS:
+            return None
+        
+        for kind, start, end in _boxes(buf, 0, len(buf)):
+            if kind == b"meta":
+                if end > len(buf):
+                    return NEED_MORE
+                return _parse_heif_meta(buf, start + 4, end)
+            if kind == b"mdat":
+                # meta после данных изображения - в заголовке её нет
+                return None
+    except (struct.error, IndexError, StopIteration):
+        return None
+    return NEED_MORE
+
+
+def _parse_heif_meta(buf: bytes, start: int, end: int):
+    boxes = {kind: (box_start, box_end) for kind, box_start, box_end in _boxes(buf, start, end)}
+    if b"iinf" not in boxes or b"iloc" not in boxes:
+        return None
+    
+    exif_id = _find_exif_item(buf, *boxes[b"iinf"])
+    if exif_id is None:
+        return None
+    location = _find_item_location(buf, *boxes[b"iloc"], exif_id)
+    if location is None:
+        return None
+    
+    method, offset, length = location
+    if method == 1:
+        # Данные элемента внутри meta (idat)
+        if b"idat" not in boxes:
+            return None
+        offset += boxes[b"idat"][0]
+    elif method != 0:
+        return None
+    elif offset + length > len(buf):
+        return offset, length
+    return parse_heif_exif(bytes(buf[offset:offset + length]))
+
+
+def _find_exif_item(buf: bytes, start: int, end: int) -> Optional[int]:
+    """item_ID элемента типа Exif из iinf"""
+    version = buf[start]
+    pos = start + 4 + (2 if version == 0 else 4)
+    for kind, box_start, _ in _boxes(buf, pos, end):
+        if kind != b"infe" or buf[box_start] < 2:
+            continue
+        pos = box_start + 4
+        if buf[box_start] == 2:
+            item_id = struct.unpack_from(">H", buf, pos)[0]
+            pos += 2
+        else:
+            item_id = struct.unpack_from(">I", buf, pos)[0]
+            pos += 4
+        # item_protection_index, затем item_type
+        if buf[pos + 2:pos + 6] == b"Exif":
+            return item_id
+    return None
+
+
+def _find_item_location(buf: bytes, start: int, end: int, item_id: int) -> Optional[Tuple[int, int, int]]:
+    """(construction_method, смещение, длина) элемента из iloc (только из одного экстента)"""
+    version = buf[start]
+    pos = start + 4
+    offset_size, length_size = buf[pos] >> 4, buf[pos] & 0x0F
+    base_offset_size, index_size = buf[pos + 1] >> 4, buf[pos + 1] & 0x0F
+    pos += 2
+    
+    def read(size: int) -> int:
+        nonlocal pos
+        value = int.from_bytes(buf[pos:pos + size], "big") if size else 0
+        pos += size
+        return value
+    
+    count = read(2 if version < 2 else 4)
+    for _ in range(count):
+        current = read(2 if version < 2 else 4)
+        method = read(2) & 0x0F if version in (1, 2) else 0
+        read(2)
+        base_offset = read(base_offset_size)
+        extents = read(2)
+        found = []
+        for _ in range(extents):
+            if version in (1, 2):
+                read(index_size)
+            found.append((read(offset_size), read(length_size)))
+        if current == item_id:
+            if len(found) != 1:
+                return None
+            return method, base_offset + found[0][0], found[0][1]
+        if pos > end:
+            return None
+    return None
+
+
+def parse_heif_exif(payload: bytes) -> Optional[ExifInfo]:
+    """Данные элемента Exif HEIF: смещение заголовка TIFF (4 байта), затем TIFF"""
+    if len(payload) < 4:
+        return None
+    tiff = payload[4 + struct.unpack_from(">I", payload)[0]:]
+    if tiff[:6] == EXIF_HEADER:
+        tiff = tiff[6:]
+    return parse_tiff(tiff)
+
+
+def parse_tiff(data: bytes) -> Optional[ExifInfo]:
+    """Дата съёмки и GPS из блока EXIF (TIFF); None - ни того, ни другого"""
+    try:
+        if data[:2] == b"II":
+            order = "<"
+        elif data[:2] == b"MM":
+            order = ">"
+        else:
+            return None
+        magic, ifd0_offset = struct.unpack_from(order + "HI", data, 2)
+        if magic != 42:
+            return None
+        
+        ifd0 = _read_ifd(data, order, ifd0_offset)
+        info = ExifInfo()
+        
+        if TAG_EXIF_IFD in ifd0:
+            exif = _read_ifd(data, order, ifd0[TAG_EXIF_IFD][0])
+            info.taken_at = _parse_datetime(exif.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME_DIGITIZED))
+        
+        if TAG_GPS_IFD in ifd0:
+            gps = _read_ifd(data, order, ifd0[TAG_GPS_IFD][0])
+            latitude = _parse_coordinate(gps.get(TAG_GPS_LATITUDE), gps.get(TAG_GPS_LATITUDE_REF), "S", 90)
+            longitude = _parse_coordinate(gps.get(TAG_GPS_LONGITUDE), gps.get(TAG_GPS_LONGITUDE_REF), "W", 180)
+            # 0, 0 пишут телефоны без фиксации GPS
+            if latitude is not None and longitude is not None and (latitude, longitude) != (0.0, 0.0):
+                info.latitude, info.longitude = latitude, longitude
+    except (struct.error, IndexError, ValueError):
+        return None
+    
+    if info.taken_at is None and info.latitude is None:
+        return None
+    return info
+
+
+def _read_ifd(data: bytes, order: str, offset: int) -> Dict[int, tuple]:
+    """Записи IFD нужных типов: tag -> str (ASCII) или кортеж чисел (RATIONAL - float)"""
+    values = {}
+    count = struct.unpack_from(order + "H", data, offset)[0]
+    for index in range(count):
+        tag, kind, number, raw = struct.unpack_from(order + "HHI4s", data, offset + 2 + index * 12)
+        if kind not in TYPE_FORMATS:
+            continue
+        code, size = TYPE_FORMATS[kind]
+        length = size * number
+        if length <= 4:
+            chunk = raw[:length]
+        else:
+            start = struct.unpack(order + "I", raw)[0]
+            chunk = data[start:start + length]
+            if len(chunk) < length:
+                continue
+        
+        if kind == 2:
+            values[tag] = chunk.split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+        elif kind in (5, 10):
+            parts = struct.unpack(f"{order}{number * 2}{code}", chunk)
+            values[tag] = tuple(
+                parts[i] / parts[i + 1] if parts[i + 1] else float("nan") for i in range(0, len(parts), 2)
+            )
+        else:
+            values[tag] = struct.unpack(f"{order}{number}{code}", chunk)
+    return values
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    """EXIF "YYYY:MM:DD HH:MM:SS" (местное время камеры)"""
+    if not isinstance(value, str) or len(value) < 19:
+        return None
+    try:
+        # Формат фиксированный - без strptime (он в разы медленнее разбора всего заголовка)
+        return datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19])
+        )
+    except ValueError:
+        # Пустая дата "    :  :     " или нестандартный формат
+        return None
+
+
+def _parse_coordinate(value, ref, negative: str, limit: float) -> Optional[float]:
+    """Градусы, минуты, секунды -> десятичные градусы"""
+    if not isinstance(value, tuple) or len(value) != 3:
+        return None
+    degrees = value[0] + value[1] / 60 + value[2] / 3600
+    if not -limit <= degrees <= limit:
+        # В том числе NaN (знаменатель 0)
+        return None
+    if ref == negative:
+        degrees = -degrees
+    return round(degrees, 7)
+
+
+class ExifScanner:
+    """
+    Разбор EXIF по ходу загрузки: чанки копятся только до конца заголовка
+    (max_header_kb); для HEIC, у которого блок Exif лежит дальше, из потока
+    вырезается только этот блок. Разобравшись, сканер перестаёт смотреть на
+    чанки.
+    """
+    
+    __slots__ = ("reader", "buffer", "position", "region", "collected", "done", "info", "elapsed")
+    
+    def __init__(self, reader: "ExifReader"):
+        self.reader = reader
+        self.buffer = bytearray()
+        self.position = 0
+        self.region: Optional[Region] = None
+        self.collected = bytearray()
+        self.done = False
+        self.info: Optional[ExifInfo] = None
+        self.elapsed = 0.0
+    
+    def feed(self, chunk: bytes) -> None:
+        """Очередной чанк загрузки"""
+        if self.done:
+            return
+        
+        started = time.perf_counter()
+        chunk_start = self.position
+        self.position += len(chunk)
+        
+        if self.region is not None:
+            self._collect(chunk, chunk_start)
+        else:
+            self.buffer += chunk[:max(0, self.reader.max_header - chunk_start)]
+            result = parse_header(self.buffer)
+            if isinstance(result, tuple):
+                self._start_region(result)
+            elif result is not NEED_MORE:
+                self._finish(result)
+            elif len(self.buffer) >= self.reader.max_header:
+                self._finish(None)
+        
+        self.elapsed += time.perf_counter() - started
+    
+    def _start_region(self, region: Region) -> None:
+        offset, length = region
+        if length > self.reader.max_header:
+            self._finish(None)
+            return
+        self.region = region
+        # Начало блока могло уже прийти в заголовке
+        self.collected = bytearray(self.buffer[offset:offset + length])
+        self.buffer = bytearray()
+        if offset + len(self.collected) < min(self.position, offset + length):
+            # Часть блока прошла мимо буфера (за max_header_kb)
+            self._finish(None)
+        elif len(self.collected) == length:
+            self._finish(parse_heif_exif(bytes(self.collected)))
+    
+    def _collect(self, chunk: bytes, chunk_start: int) -> None:
+        offset, length = self.region
+        wanted = offset + len(self.collected)
+        if wanted >= chunk_start + len(chunk):
+            return
+        self.collected += chunk[wanted - chunk_start:offset + length - chunk_start]
+        if len(self.collected) == length:
+            self._finish(parse_heif_exif(bytes(self.collected)))
+    
+    def _finish(self, info: Optional[ExifInfo]) -> None:
+        self.done = True
+        self.info = info
+        self.buffer = bytearray()
+        self.collected = bytearray()
+    
+    def result(self) -> Optional[ExifInfo]:
+        """Конец потока: метаданные или None"""
+        if not self.done:
+            self._finish(None)
+        self.reader.record(self.info, self.elapsed)
+        return self.info
+
+
+class ExifReader:
+    """
+    Чтение даты съёмки (DateTimeOriginal) и координат из EXIF.
+    
+    Разбираются только байты заголовка: сегменты JPEG до APP1 или боксы
+    meta/iinf/iloc HEIC и сам блок Exif. Изображение не открывается и не
+    декодируется - в отличие от PIL, которому нужен весь файл на диске и
+    разбор всех тегов.
+    """
+    
+    # Первое чтение заголовка с диска
+    READ_STEP = 16 * 1024
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация чтения EXIF
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        exif_config = config.get("exif", {})
+        self.enabled = exif_config.get("enabled", True)
+        # Сколько байт от начала файла смотреть (JPEG: APP1 до 64 KB после APP0 / ICC)
+        self.max_header = exif_config.get("max_header_kb", 256) * 1024
+        
+        # Счётчики
+        self.scanned = 0
+        self.with_date = 0
+        self.with_gps = 0
+        self.parse_times = LatencyWindow()
+    
+    def scanner(self) -> Optional[ExifScanner]:
+        """Сканер для потока загрузки (None если выключено)"""
+        if not self.enabled:
+            return None
+        return ExifScanner(self)
+    
+    def read_file(self, path: Path) -> Optional[ExifInfo]:
+        """
+        Метаданные уже сохранённого файла (читается только заголовок)
+        
+        Args:
+            path: Путь к файлу
+        
+        Returns:
+            ExifInfo или None
+        """
+        if not self.enabled:
+            return None
+        
+        started = time.perf_counter()
+        info = None
+        try:
+            with open(path, "rb") as f:
+                # Читаем с запасом 16 KB -> 64 KB -> 256 KB: у JPEG APP1 почти всегда в начале
+                data = f.read(min(self.READ_STEP, self.max_header))
+                result = parse_header(data)
+                while result is NEED_MORE and len(data) < self.max_header:
+                    more = f.read(min(len(data) * 3, self.max_header - len(data)))
+                    if not more:
+                        break
+                    data += more
+                    result = parse_header(data)
+                if isinstance(result, tuple):
+                    offset, length = result
+                    if length <= self.max_header:
+                        f.seek(offset)
+                        result = parse_heif_exif(f.read(length))
+                if isinstance(result, ExifInfo):
+                    info = result
+        except OSError as e:
+            self.logger.debug("EXIF read failed for %s: %s", path, e)
+        
+        self.record(info, time.perf_counter() - started)
+        return info
+    
+    def record(self, info: Optional[ExifInfo], elapsed: float) -> None:
+        """Учесть разобранный файл в статистике"""
+        self.scanned += 1
+        self.parse_times.observe(elapsed)
+        if info is not None:
+            if info.taken_at is not None:
+                self.with_date += 1
+            if info.latitude is not None:
+                self.with_gps += 1
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        stats = {
+            "enabled": self.enabled,
+            "scanned": self.scanned,
+            "with_date": self.with_date,
+            "with_gps": self.with_gps
+        }
+        stats.update(self.parse_times.snapshot())
+        return stats
+
+
+def create_exif_reader(config: dict) -> ExifReader:
+    """
+    Фабричная функция для создания ExifReader
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр ExifReader
+    """
+    return ExifReader(config)
@@ -0,0 +1,129 @@
+"""
+SOLAR PhotoSync v1.2.0 - File ID Cache Module
+Кэш Telegram file_unique_id -> сохранённый файл (LRU в памяти поверх SQLite)
+"""
+
+import os
+from collections import OrderedDict
+from typing import Optional
+from logger import get_logger
+from state_store import connect
+
+
+class FileIdCache:
+    """Персистентное отображение file_unique_id -> путь, чтобы не скачивать файл повторно"""
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация кэша
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        cache_config = config.get("file_cache", {})
+        self.enabled = cache_config.get("enabled", True)
+        self.memory_entries = cache_config.get("memory_entries", 10000)
+        
+        # LRU: самые свежие записи в конце
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+        self.conn = connect(config, "file_ids.sqlite3")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " unique_id TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+    
+    def get(self, unique_id: str) -> Optional[str]:
+        """
+        Найти сохранённый файл по file_unique_id
+        
+        Args:
+            unique_id: file_unique_id из Telegram
+        
+        Returns:
+            Путь к существующему файлу или None
+        """
+        if not self.enabled:
+            return None
+        
+        path = self._lru.get(unique_id)
+        if path is not None:
+            self._lru.move_to_end(unique_id)
+        else:
+            row = self.conn.execute(
+                "SELECT path FROM files WHERE unique_id = ?", (unique_id,)
+            ).fetchone()
+            path = row[0] if row else None
+        
+        if path is None:
+            self.misses += 1
+            return None
+        
+        # Файл могли удалить или переместить вручную
+        if not os.path.exists(path):
+            self._forget(unique_id)
+            self.misses += 1
+            return None
+        
+        self._remember(unique_id, path)
+        self.hits += 1
+        return path
+    
+    def put(self, unique_id: str, path: str, size: int) -> None:
+        """Запомнить сохранённый файл"""
+        if not self.enabled:
+            return
+        
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (unique_id, path, size) VALUES (?, ?, ?)",
+            (unique_id, path, size)
+        )
+        self.conn.commit()
+        self._remember(unique_id, path)
+    
+    def _remember(self, unique_id: str, path: str) -> None:
+        """Положить запись в LRU, вытеснив самую старую при переполнении"""
+        self._lru[unique_id] = path
+        self._lru.move_to_end(unique_id)
+        if len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+    
+    def _forget(self, unique_id: str) -> None:
+        """Удалить запись из памяти и с диска"""
+        self._lru.pop(unique_id, None)
+        self.conn.execute("DELETE FROM files WHERE unique_id = ?", (unique_id,))
+        self.conn.commit()
+    
+    def get_stats(self) -> dict:
+        """Статистика кэша для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+    
+    def close(self) -> None:
+        """Закрыть соединение с базой"""
+        self.conn.close()
+
+
+def create_file_id_cache(config: dict) -> FileIdCache:
+    """
+    Фабричная функция для создания FileIdCache
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр FileIdCache
+    """
+    return FileIdCache(config)
@@ -4,149 +4,513 @@ SOLAR PhotoSync v1.2.0 - File Saver Module (Command Routing Edition)
 """
 
 import os
+import time
 import shutil
-from datetime import datetime
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import AsyncIterator, Optional
 from logger import get_logger, update_last_saved, root_path_created
+from metrics import stage_histogram
 from heic_converter import HeicConverter
+from dedup_index import DedupIndex
+from stats_index import StatsIndex
+from thumbnailer import Thumbnailer
+from exif_reader import EARLIEST_CAPTURE, ExifInfo, ExifReader
 
 
 class FileSaver:
     """Менеджер сохранения файлов в файловую систему SOLAR"""
     
-    def __init__(self, config: dict, heic_converter: HeicConverter):
+    # Временные файлы потоковой загрузки (та же ФС, что и root_path -> атомарный rename)
+    INCOMING_DIR = ".incoming"
+    
+    def __init__(
+        self,
+        config: dict,
+        heic_converter: HeicConverter,
+        dedup_index: Optional[DedupIndex] = None,
+        stats_index: Optional[StatsIndex] = None,
+        thumbnailer: Optional[Thumbnailer] = None,
+        exif_reader: Optional[ExifReader] = None
+    ):
         """
         Инициализация сохранятеля файлов
         
         Args:
             config: Конфигурация из photosync.config.json
             heic_converter: Экземпляр HEIC конвертера
+            dedup_index: Индекс содержимого для дедупликации (опционально)
+            stats_index: Счётчики хранилища для /stats (опционально)
+            thumbnailer: Генератор миниатюр (опционально)
+            exif_reader: Чтение даты съёмки и GPS из заголовка (опционально)
         """
         self.logger = get_logger()
         self.heic_converter = heic_converter
+        self.dedup_index = dedup_index if dedup_index and dedup_index.enabled else None
+        
+        self.stats_index = stats_index if stats_index and stats_index.enabled else None
+        self.thumbnailer = thumbnailer if thumbnailer and thumbnailer.enabled else None
+        self.exif_reader = exif_reader if exif_reader and exif_reader.enabled else None
+        
+        # Как сохранять уже известное содержимое: hardlink или skip
+        self.duplicate_mode = dedup_index.mode if dedup_index else "hardlink"
         
         storage_config = config.get("storage", {})
         self.root_path = Path(storage_config.get("root_path", "/SOLAR/PhotoSync"))
         self.allowed_extensions = set(storage_config.get("allowed_extensions", []))
+        # Папка даты: capture - дата съёмки из EXIF (если есть), receive - дата получения
+        self.folder_date = storage_config.get("folder_date", "capture")
         
         # Автосоздание корневой директории если не существует
         if not self.root_path.exists():
             self.root_path.mkdir(parents=True, exist_ok=True)
             root_path_created(str(self.root_path))
         
+        self.incoming_path = self.root_path / self.INCOMING_DIR
+        self.incoming_path.mkdir(parents=True, exist_ok=True)
+        
+        # Максимальный размер HEIC, который конвертируется прямо из памяти
+        processing_config = config.get("processing", {})
+        self.heic_memory_limit = processing_config.get("heic_memory_limit_mb", 32) * 1024 * 1024
+        
+        # Время записи на диск за файл: write + fsync + rename (без ожидания сети)
+        self.disk_write_histogram = stage_histogram("disk_write")
+        
         self.logger.info(f"FileSaver initialized. Root: {self.root_path}")
     
-    def save_file(
+    async def save_stream(
         self,
-        source_path: str,
+        chunks: AsyncIterator[bytes],
         category: str,
         original_filename: str,
         file_date: Optional[datetime] = None
-    ) -> Tuple[bool, str]:
+    ) -> dict:
         """
-        Сохранить файл в структурированную директорию
+        Потоково сохранить файл: чанки пишутся во временный файл в root_path/.incoming,
+        после fsync файл атомарно переименовывается в YYYY-MM-DD/Category/.
+        В памяти держится только текущий чанк, лишних копий нет.
+        
+        HEIC при наличии pillow-heif собирается в памяти (до heic_memory_limit_mb)
+        и декодируется прямо из буфера: на диск пишется только итоговый JPEG.
+        
+        Хэш содержимого считается по ходу загрузки; если такой файл уже есть
+        в индексе дедупликации, вместо новой копии создаётся жёсткая ссылка
+        (или сохранение пропускается в режиме skip).
+        
+        Запись, fsync, rename и счётчики идут в потоке: event loop не ждёт диск.
+        
+        EXIF разбирается из первых чанков, до записи файла: к концу загрузки
+        уже известна дата съёмки, от которой зависит папка.
         
         Args:
-            source_path: Путь к исходному файлу (временный)
-            category: Категория (Sprinter, LDZ, Legal, Documents, Other)
+            chunks: Асинхронный итератор чанков (например resp.content.iter_chunked)
+            category: Категория
             original_filename: Оригинальное имя файла
-            file_date: Дата файла для именования (опционально)
+            file_date: Дата получения
         
         Returns:
-            Tuple[success, saved_path or error_message]
+            Словарь {"success", "file_path", "size", "message", "duplicate", "content_hash",
+            "file_date" (дата папки), "exif"}
         """
-        source = Path(source_path)
-        
-        if not source.exists():
-            return False, f"Source file not found: {source_path}"
+        result = {
+            "success": False,
+            "file_path": None,
+            "size": 0,
+            "message": "",
+            "duplicate": False,
+            "content_hash": None,
+            "file_date": None,
+            "exif": None
+        }
         
-        # Определяем дату
         if file_date is None:
             file_date = datetime.now()
         
-        # Проверяем нужна ли конвертация HEIC
-        if self.heic_converter.is_heic(source_path):
-            success, result = self.heic_converter.convert(source_path)
-            if success:
-                source = Path(result)
-                original_filename = Path(original_filename).stem + ".jpg"
-            else:
-                self.logger.warning(f"HEIC conversion failed, saving original: {result}")
-        
-        # Создаём структуру директорий: /SOLAR/PhotoSync/YYYY-MM-DD/Category/
-        date_folder = file_date.strftime("%Y-%m-%d")
-        target_dir = self.root_path / date_folder / category
-        target_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Формируем имя файла: YYYYMMDD_HHMMSS_originalname.ext
-        timestamp = file_date.strftime("%Y%m%d_%H%M%S")
-        clean_name = self._sanitize_filename(original_filename)
-        extension = Path(clean_name).suffix.lower()
-        base_name = Path(clean_name).stem
-        
-        new_filename = f"{timestamp}_{base_name}{extension}"
-        target_path = target_dir / new_filename
-        
-        # Если файл уже существует, добавляем счётчик
-        counter = 1
-        while target_path.exists():
-            new_filename = f"{timestamp}_{base_name}_{counter}{extension}"
-            target_path = target_dir / new_filename
-            counter += 1
+        extension = Path(original_filename).suffix.lower()
+        buffer = bytearray() if self.heic_converter.can_convert_bytes(original_filename) else None
+        hasher = self.dedup_index.new_hasher() if self.dedup_index else None
+        scanner = self.exif_reader.scanner() if self.exif_reader else None
+        tmp = None
+        tmp_path = None
+        converted_path = None
+        disk_time = 0.0
         
         try:
-            # Копируем файл
-            shutil.copy2(source, target_path)
+            async for chunk in chunks:
+                result["size"] += len(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                if scanner is not None:
+                    scanner.feed(chunk)
+                
+                if buffer is not None:
+                    buffer += chunk
+                    if len(buffer) <= self.heic_memory_limit:
+                        continue
+                    # Слишком большой для памяти - дописываем на диск
+                    write_started = time.perf_counter()
+                    tmp, tmp_path = await asyncio.to_thread(self._open_incoming, extension)
+                    await asyncio.to_thread(tmp.write, buffer)
+                    disk_time += time.perf_counter() - write_started
+                    buffer = None
+                    continue
+                
+                write_started = time.perf_counter()
+                if tmp is None:
+                    tmp, tmp_path = await asyncio.to_thread(self._open_incoming, extension)
+                await asyncio.to_thread(tmp.write, chunk)
+                disk_time += time.perf_counter() - write_started
             
-            # Обновляем timestamp последнего сохранения
-            update_last_saved()
+            if scanner is not None:
+                result["exif"] = scanner.result()
+            file_date = self._folder_date(result["exif"], file_date)
+            result["file_date"] = file_date
             
+            # Такое содержимое уже сохранено - конвертация и новая копия не нужны
+            if hasher is not None:
+                result["content_hash"] = hasher.hexdigest()
+                existing = await asyncio.to_thread(self.dedup_index.lookup, result["content_hash"])
+                if existing and await asyncio.to_thread(
+                    self._save_duplicate, existing, category, original_filename, file_date, result
+                ):
+                    return result
+            
+            source_path = None
+            
+            # Быстрый путь: HEIC из памяти -> JPEG в .incoming
+            if buffer is not None:
+                converted_path = await asyncio.to_thread(self._reserve_incoming, ".jpg")
+                success, message = await self.heic_converter.convert_bytes_async(buffer, converted_path)
+                if success:
+                    write_started = time.perf_counter()
+                    await asyncio.to_thread(self._fsync_file, converted_path)
+                    disk_time += time.perf_counter() - write_started
+                    source_path = converted_path
+                    original_filename = Path(original_filename).stem + ".jpg"
+                else:
+                    self.logger.warning(f"HEIC conversion failed, saving original: {message}")
+                    tmp, tmp_path = await asyncio.to_thread(self._open_incoming, extension)
+                    await asyncio.to_thread(tmp.write, buffer)
+                buffer = None
+            
+            if source_path is None:
+                write_started = time.perf_counter()
+                if tmp is None:
+                    tmp, tmp_path = await asyncio.to_thread(self._open_incoming, extension)
+                await asyncio.to_thread(self._close_incoming, tmp)
+                disk_time += time.perf_counter() - write_started
+                source_path = tmp_path
+                
+                # HEIC конвертируем рядом во .incoming, чтобы rename остался атомарным
+                if not converted_path and self.heic_converter.is_heic(tmp_path):
+                    success, converted = await self.heic_converter.convert_async(tmp_path)
+                    if success:
+                        converted_path = converted
+                        source_path = converted
+                        original_filename = Path(original_filename).stem + ".jpg"
+                    else:
+                        self.logger.warning(f"HEIC conversion failed, saving original: {converted}")
+            
+            write_started = time.perf_counter()
+            target_path = await asyncio.to_thread(
+                self._move_into_place, source_path, category, original_filename, file_date
+            )
+            disk_time += time.perf_counter() - write_started
+            self.disk_write_histogram.observe(disk_time)
+            self.logger.event("disk_write", disk_time, size=result["size"], category=category)
+            
+            update_last_saved()
             self.logger.file_saved(original_filename, str(target_path), category)
+            await asyncio.to_thread(self._after_save, target_path)
+            
+            if result["content_hash"]:
+                await asyncio.to_thread(
+                    self.dedup_index.add, result["content_hash"], str(target_path), result["size"]
+                )
             
-            return True, str(target_path)
+            result["success"] = True
+            result["file_path"] = str(target_path)
+            return result
             
         except Exception as e:
-            error_msg = f"Failed to save file: {str(e)}"
-            self.logger.error(error_msg)
-            return False, error_msg
+            result["message"] = f"Failed to save file: {str(e)}"
+            self.logger.error(result["message"])
+            return result
+        
+        finally:
+            # Убираем то, что не было переименовано в хранилище
+            if tmp is not None or tmp_path or converted_path:
+                await asyncio.to_thread(self._discard_incoming, tmp, tmp_path, converted_path)
     
-    def save_from_bytes(
+    async def save_existing(
         self,
-        file_bytes: bytes,
+        existing: str,
         category: str,
         original_filename: str,
         file_date: Optional[datetime] = None
-    ) -> Tuple[bool, str]:
+    ) -> Optional[dict]:
+        """
+        Сохранить уже имеющийся в хранилище файл в новую категорию/дату
+        (жёсткая ссылка или "already saved" в режиме skip)
+        
+        Размер, EXIF, mkdir и link - в потоке, event loop не ждёт диск.
+        
+        Args:
+            existing: Путь к сохранённому ранее файлу
+            category: Категория
+            original_filename: Оригинальное имя файла
+            file_date: Дата файла
+        
+        Returns:
+            Словарь как у save_stream или None, если нужно обычное скачивание
+        """
+        if file_date is None:
+            file_date = datetime.now()
+        return await asyncio.to_thread(self._save_existing, existing, category, original_filename, file_date)
+    
+    def _save_existing(
+        self,
+        existing: str,
+        category: str,
+        original_filename: str,
+        file_date: datetime
+    ) -> Optional[dict]:
+        """save_existing в потоке"""
+        exif = self._read_exif(existing)
+        file_date = self._folder_date(exif, file_date)
+        result = {
+            "success": False,
+            "file_path": None,
+            "size": os.path.getsize(existing),
+            "message": "",
+            "duplicate": False,
+            "content_hash": None,
+            "file_date": file_date,
+            "exif": exif
+        }
+        
+        if self._save_duplicate(existing, category, original_filename, file_date, result):
+            return result
+        return None
+    
+    def _save_duplicate(
+        self,
+        existing: str,
+        category: str,
+        original_filename: str,
+        file_date: datetime,
+        result: dict
+    ) -> bool:
+        """
+        Сохранить дубликат без новой копии данных
+        
+        Args:
+            existing: Путь к уже сохранённому файлу с тем же содержимым
+            category: Категория
+            original_filename: Оригинальное имя файла
+            file_date: Дата файла
+            result: Словарь результата save_stream (заполняется)
+        
+        Блокирует (mkdir, link, счётчики) - вызывается в потоке.
+        
+        Returns:
+            False если ссылку создать не удалось (нужно обычное сохранение)
         """
-        Сохранить файл из байтов
+        existing_path = Path(existing)
+        target_dir = self.root_path / file_date.strftime("%Y-%m-%d") / category
+        
+        # Режим skip или файл уже лежит в этой же папке
+        if self.duplicate_mode == "skip" or existing_path.parent == target_dir:
+            self.logger.info("Duplicate skipped: %s already saved as %s", original_filename, existing)
+            result["success"] = True
+            result["duplicate"] = True
+            result["file_path"] = existing
+            result["message"] = "already_saved"
+            return True
+        
+        # Расширение берём у сохранённого файла (HEIC мог быть сконвертирован в JPG)
+        link_name = Path(original_filename).stem + existing_path.suffix
+        
+        while True:
+            target_path = self._build_target_path(category, link_name, file_date)
+            try:
+                os.link(existing, target_path)
+                break
+            except FileExistsError:
+                # Имя заняли параллельным сохранением - берём следующее
+                continue
+            except OSError as e:
+                self.logger.warning(f"Hardlink failed, saving a copy: {e}")
+                return False
+        
+        update_last_saved()
+        self.logger.file_saved(link_name, str(target_path), category)
+        self._after_save(target_path)
+        
+        result["success"] = True
+        result["duplicate"] = True
+        result["file_path"] = str(target_path)
+        result["message"] = "linked"
+        return True
+    
+    def _read_exif(self, path: str) -> Optional[ExifInfo]:
+        """EXIF файла на диске (только заголовок)"""
+        if self.exif_reader is None:
+            return None
+        return self.exif_reader.read_file(path)
+    
+    def _folder_date(self, exif: Optional[ExifInfo], received: datetime) -> datetime:
+        """
+        Дата папки и имени файла
+        
+        Дата съёмки берётся, только если она правдоподобна: не раньше
+        EARLIEST_CAPTURE и не позже получения больше чем на сутки (часовой
+        пояс камеры) - иначе часы камеры сбиты.
+        """
+        if self.folder_date != "capture" or exif is None or exif.taken_at is None:
+            return received
+        if not EARLIEST_CAPTURE <= exif.taken_at <= received + timedelta(days=1):
+            return received
+        return exif.taken_at
+    
+    def _after_save(self, target_path: Path) -> None:
+        """Файл на месте: счётчики хранилища и миниатюры (в фоне)"""
+        self._record_stats(target_path)
+        if self.thumbnailer is not None:
+            self.thumbnailer.submit(target_path)
+    
+    def _record_stats(self, target_path: Path) -> None:
+        """Учесть сохранённый файл в счётчиках хранилища (размер - уже после конвертации)"""
+        if self.stats_index is None:
+            return
+        
+        try:
+            self.stats_index.record(target_path, target_path.stat().st_size)
+        except Exception as e:
+            self.logger.warning(f"Stats index update failed: {e}")
+    
+    def _move_into_place(
+        self,
+        source_path: str,
+        category: str,
+        original_filename: str,
+        file_date: datetime
+    ) -> Path:
+        """
+        Переместить файл из .incoming в хранилище без перезаписи
+        
+        Файлы альбома сохраняются параллельно и могут получить одно и то же
+        свободное имя; os.link не перезаписывает существующий файл, поэтому при
+        гонке берётся следующее имя. Если ФС не умеет жёсткие ссылки - rename.
+        Запись каталога fsync-ится (выполняется в потоке).
+        
+        Returns:
+            Итоговый путь
+        """
+        while True:
+            target_path = self._build_target_path(category, original_filename, file_date)
+            try:
+                os.link(source_path, target_path)
+            except FileExistsError:
+                continue
+            except OSError:
+                os.rename(source_path, target_path)
+                break
+            os.unlink(source_path)
+            break
+        
+        self._fsync_dir(target_path.parent)
+        return target_path
+    
+    def _open_incoming(self, extension: str):
+        """Открыть новый временный файл в root_path/.incoming"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.incoming_path, suffix=extension)
+        return os.fdopen(fd, 'wb'), tmp_path
+    
+    def _reserve_incoming(self, extension: str) -> str:
+        """Пустой временный файл в root_path/.incoming (его перезапишет другой процесс)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.incoming_path, suffix=extension)
+        os.close(fd)
+        return tmp_path
+    
+    @staticmethod
+    def _close_incoming(tmp) -> None:
+        """Дописать буфер, fsync и закрыть временный файл"""
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp.close()
+    
+    @staticmethod
+    def _discard_incoming(tmp, *paths: Optional[str]) -> None:
+        """Закрыть и удалить временные файлы, не ставшие файлами хранилища"""
+        if tmp is not None and not tmp.closed:
+            tmp.close()
+        for path in paths:
+            if path and os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except Exception:
+                    pass
+    
+    @staticmethod
+    def _fsync_file(path: str) -> None:
+        """fsync файла, записанного другим процессом"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _build_target_path(self, category: str, original_filename: str, file_date: datetime) -> Path:
+        """
+        Сформировать свободный путь назначения
         
         Args:
-            file_bytes: Содержимое файла в байтах
             category: Категория
             original_filename: Оригинальное имя файла
             file_date: Дата файла
         
         Returns:
-            Tuple[success, saved_path or error_message]
+            Путь вида root/YYYY-MM-DD/Category/YYYYMMDD_HHMMSS_name.ext
         """
-        import tempfile
+        # Создаём структуру директорий: /SOLAR/PhotoSync/YYYY-MM-DD/Category/
+        date_folder = file_date.strftime("%Y-%m-%d")
+        target_dir = self.root_path / date_folder / category
+        target_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Формируем имя файла: YYYYMMDD_HHMMSS_originalname.ext
+        timestamp = file_date.strftime("%Y%m%d_%H%M%S")
+        clean_name = self._sanitize_filename(original_filename)
+        extension = Path(clean_name).suffix.lower()
+        base_name = Path(clean_name).stem
+        
+        new_filename = f"{timestamp}_{base_name}{extension}"
+        target_path = target_dir / new_filename
         
-        # Создаём временный файл
-        extension = Path(original_filename).suffix
-        with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
+        # Если файл уже существует, добавляем счётчик
+        counter = 1
+        while target_path.exists():
+            new_filename = f"{timestamp}_{base_name}_{counter}{extension}"
+            target_path = target_dir / new_filename
+            counter += 1
         
+        return target_path
+    
+    @staticmethod
+    def _fsync_dir(path: Path) -> None:
+        """fsync директории, чтобы rename пережил сбой питания"""
         try:
-            result = self.save_file(tmp_path, category, original_filename, file_date)
-            return result
+            dir_fd = os.open(str(path), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
         finally:
-            # Удаляем временный файл
-            try:
-                os.unlink(tmp_path)
-            except Exception:
-                pass
+            os.close(dir_fd)
     
     def _sanitize_filename(self, filename: str) -> str:
         """
@@ -184,9 +548,14 @@ class FileSaver:
         """
         Получить статистику хранилища
         
+        С индексом счётчиков - O(категорий) без обхода дерева; без него - полный обход.
+        
         Returns:
             Словарь со статистикой
         """
+        if self.stats_index is not None:
+            return self.stats_index.snapshot()
+        
         stats = {
             "root_path": str(self.root_path),
             "total_files": 0,
@@ -222,6 +591,41 @@ class FileSaver:
         
         return stats
     
+    def sweep_incoming(self, min_age: Optional[float] = None) -> int:
+        """
+        Удалить временные файлы, брошенные в .incoming (загрузка оборвалась падением процесса)
+        
+        Args:
+            min_age: Удалять только файлы старше стольких секунд (None - все; с --workers
+                     .incoming общий, и файлы других процессов ещё пишутся)
+        
+        Returns:
+            Сколько файлов удалено
+        """
+        removed = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.incoming_path))
+        except OSError as e:
+            self.logger.warning(f"Failed to scan {self.incoming_path}: {e}")
+            return 0
+        
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if min_age is not None and now - entry.stat(follow_symlinks=False).st_mtime < min_age:
+                    continue
+                os.unlink(entry.path)
+                removed += 1
+            except OSError:
+                # Файл уже убрал другой процесс
+                continue
+        
+        if removed:
+            self.logger.info(f"Removed {removed} orphaned temp files from {self.incoming_path}")
+        return removed
+    
     def cleanup_temp_files(self, temp_dir: str = "/tmp/photosync"):
         """
         Очистить временные файлы
@@ -238,15 +642,26 @@ class FileSaver:
                 self.logger.warning(f"Failed to cleanup temp: {e}")
 
 
-def create_file_saver(config: dict, heic_converter: HeicConverter) -> FileSaver:
+def create_file_saver(
+    config: dict,
+    heic_converter: HeicConverter,
+    dedup_index: Optional[DedupIndex] = None,
+    stats_index: Optional[StatsIndex] = None,
+    thumbnailer: Optional[Thumbnailer] = None,
+    exif_reader: Optional[ExifReader] = None
+) -> FileSaver:
     """
     Фабричная функция для создания FileSaver
     
     Args:
         config: Конфигурация приложения
         heic_converter: Экземпляр HEIC конвертера
+        dedup_index: Индекс содержимого для дедупликации (опционально)
+        stats_index: Счётчики хранилища для /stats (опционально)
+        thumbnailer: Генератор миниатюр (опционально)
+        exif_reader: Чтение даты съёмки и GPS (опционально)
     
     Returns:
         Экземпляр FileSaver
     """
-    return FileSaver(config, heic_converter)
+    return FileSaver(config, heic_converter, dedup_index, stats_index, thumbnailer, exif_reader)
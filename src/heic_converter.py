@@ -3,13 +3,95 @@ SOLAR PhotoSync v1.2.0 - HEIC Converter Module (Command Routing Edition)
 Конвертация HEIC/HEIF в JPG с сохранением EXIF
 """
 
+import io
 import os
+import time
+import asyncio
 import subprocess
 import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 from datetime import datetime
 from logger import get_logger
+from metrics import LatencyWindow, stage_histogram
+
+
+def _init_pillow_heif_worker():
+    """Инициализация процесса пула: регистрируем HEIF opener один раз"""
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+
+
+def _pillow_heif_convert(input_path: str, output_path: str, quality: int, preserve_exif: bool) -> Tuple[bool, str]:
+    """
+    Конвертация через pillow-heif (выполняется в процессе пула или в текущем процессе)
+    
+    Returns:
+        Tuple[success, error_message]
+    """
+    try:
+        import pillow_heif
+        from PIL import Image
+        
+        # Регистрируем HEIF opener
+        pillow_heif.register_heif_opener()
+        
+        # Открываем и конвертируем
+        with Image.open(input_path) as img:
+            _save_jpeg(img, output_path, quality, preserve_exif)
+        
+        return True, ""
+        
+    except Exception as e:
+        return False, str(e)
+
+
+def _pillow_heif_convert_bytes(data, output_path: str, quality: int, preserve_exif: bool) -> Tuple[bool, str]:
+    """
+    Декодировать HEIC из буфера в памяти и записать JPEG сразу в output_path
+    
+    Args:
+        data: bytes / bytearray / memoryview с содержимым HEIC
+    
+    Returns:
+        Tuple[success, error_message]
+    """
+    try:
+        import pillow_heif
+        from PIL import Image
+        
+        pillow_heif.register_heif_opener()
+        
+        with Image.open(io.BytesIO(data)) as img:
+            _save_jpeg(img, output_path, quality, preserve_exif)
+        
+        return True, ""
+        
+    except Exception as e:
+        return False, str(e)
+
+
+def _save_jpeg(img, output_path: str, quality: int, preserve_exif: bool) -> None:
+    """Сохранить открытое изображение как JPEG (с EXIF если есть)"""
+    # Сохраняем EXIF если есть
+    exif_data = img.info.get('exif', None)
+    
+    # Конвертируем в RGB если нужно
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+    
+    # Сохраняем как JPEG
+    save_kwargs = {
+        'quality': quality,
+        'optimize': True
+    }
+    
+    if preserve_exif and exif_data:
+        save_kwargs['exif'] = exif_data
+    
+    img.save(output_path, 'JPEG', **save_kwargs)
 
 
 class HeicConverter:
@@ -31,6 +113,19 @@ class HeicConverter:
         self.quality = processing_config.get("heic_quality", 85)
         self.preserve_exif = processing_config.get("preserve_exif", True)
         
+        # Асинхронная конвертация: число параллельных конвертаций и лимит ожидающих
+        self.workers = max(1, processing_config.get("heic_workers", 2))
+        self.queue_limit = processing_config.get("heic_queue_limit", 32)
+        
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+        self.rejected = 0
+        self.failed = 0
+        self.conversion_times = LatencyWindow()
+        self.conversion_histogram = stage_histogram("heic_convert")
+        
         # Проверяем доступные инструменты конвертации
         self.converter_tool = self._detect_converter()
         
@@ -44,7 +139,16 @@ class HeicConverter:
         Returns:
             Название инструмента или None
         """
-        # Приоритет: ImageMagick -> sips (macOS) -> pillow-heif -> heif-convert
+        # Приоритет: pillow-heif -> ImageMagick -> sips (macOS) -> heif-convert
+        # pillow-heif работает в процессе (без fork внешней программы) и умеет
+        # декодировать прямо из памяти (convert_bytes)
+        
+        # Пробуем pillow-heif (Python библиотека)
+        try:
+            import pillow_heif
+            return "pillow-heif"
+        except ImportError:
+            pass
         
         # ImageMagick (кроссплатформенный)
         if shutil.which("magick") or shutil.which("convert"):
@@ -58,13 +162,6 @@ class HeicConverter:
         if shutil.which("heif-convert"):
             return "heif-convert"
         
-        # Пробуем pillow-heif (Python библиотека)
-        try:
-            import pillow_heif
-            return "pillow-heif"
-        except ImportError:
-            pass
-        
         self.logger.warning("No HEIC converter found! Install ImageMagick, pillow-heif, or use macOS")
         return None
     
@@ -83,7 +180,7 @@ class HeicConverter:
     
     def convert(self, input_path: str, output_path: Optional[str] = None) -> Tuple[bool, str]:
         """
-        Конвертировать HEIC в JPG
+        Конвертировать HEIC в JPG (синхронно, блокирует вызывающий поток)
         
         Args:
             input_path: Путь к HEIC файлу
@@ -92,124 +189,295 @@ class HeicConverter:
         Returns:
             Tuple[success, output_path or error_message]
         """
-        if not self.enabled:
-            return False, "HEIC conversion disabled"
-        
-        if not self.converter_tool:
-            return False, "No converter tool available"
-        
-        input_file = Path(input_path)
-        if not input_file.exists():
-            return False, f"Input file not found: {input_path}"
-        
-        if not self.is_heic(input_path):
-            return False, f"Not a HEIC file: {input_path}"
+        error = self._check_input(input_path)
+        if error:
+            return False, error
         
         # Определяем выходной путь
         if output_path is None:
-            output_path = str(input_file.with_suffix('.jpg'))
+            output_path = str(Path(input_path).with_suffix('.jpg'))
+        
+        started = time.perf_counter()
         
         try:
-            if self.converter_tool == "imagemagick":
-                success = self._convert_imagemagick(input_path, output_path)
-            elif self.converter_tool == "sips":
-                success = self._convert_sips(input_path, output_path)
-            elif self.converter_tool == "heif-convert":
-                success = self._convert_heif_convert(input_path, output_path)
-            elif self.converter_tool == "pillow-heif":
+            if self.converter_tool == "pillow-heif":
                 success = self._convert_pillow_heif(input_path, output_path)
             else:
-                return False, "Unknown converter tool"
+                cmd = self._build_command(input_path, output_path)
+                if cmd is None:
+                    return False, "Unknown converter tool"
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                success = result.returncode == 0
             
-            if success:
-                self.logger.file_converted(
-                    input_file.name,
-                    Path(output_path).name,
-                    "HEIC",
-                    "JPG"
-                )
-                return True, output_path
-            else:
-                return False, "Conversion failed"
+            return self._finish(success, input_path, output_path, started)
                 
         except Exception as e:
             error_msg = f"Conversion error: {str(e)}"
             self.logger.error(error_msg)
             return False, error_msg
     
-    def _convert_imagemagick(self, input_path: str, output_path: str) -> bool:
-        """Конвертация через ImageMagick"""
-        cmd_name = "magick" if shutil.which("magick") else "convert"
-        
-        cmd = [
-            cmd_name,
-            input_path,
-            "-quality", str(self.quality),
-            output_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode == 0
-    
-    def _convert_sips(self, input_path: str, output_path: str) -> bool:
-        """Конвертация через sips (macOS)"""
-        cmd = [
-            "sips",
-            "-s", "format", "jpeg",
-            "-s", "formatOptions", str(self.quality),
-            input_path,
-            "--out", output_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode == 0
-    
-    def _convert_heif_convert(self, input_path: str, output_path: str) -> bool:
-        """Конвертация через heif-convert (libheif)"""
-        cmd = [
-            "heif-convert",
-            "-q", str(self.quality),
-            input_path,
-            output_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode == 0
-    
-    def _convert_pillow_heif(self, input_path: str, output_path: str) -> bool:
-        """Конвертация через pillow-heif"""
+    async def convert_async(self, input_path: str, output_path: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Конвертировать HEIC в JPG, не блокируя event loop
+        
+        pillow-heif выполняется в ProcessPoolExecutor, CLI-инструменты запускаются
+        через asyncio.create_subprocess_exec. Одновременно идёт не больше heic_workers
+        конвертаций; если ожидающих больше heic_queue_limit, задача отклоняется
+        (файл сохраняется без конвертации).
+        
+        Args:
+            input_path: Путь к HEIC файлу
+            output_path: Путь для сохранения JPG (опционально)
+        
+        Returns:
+            Tuple[success, output_path or error_message]
+        """
+        error = self._check_input(input_path)
+        if error:
+            return False, error
+        
+        if output_path is None:
+            output_path = str(Path(input_path).with_suffix('.jpg'))
+        
+        if not await self._acquire_slot():
+            return False, f"Conversion queue is full ({self.queue_limit})"
+        
+        started = time.perf_counter()
+        
         try:
-            import pillow_heif
-            from PIL import Image
-            
-            # Регистрируем HEIF opener
-            pillow_heif.register_heif_opener()
+            if self.converter_tool == "pillow-heif":
+                loop = asyncio.get_running_loop()
+                success, error = await loop.run_in_executor(
+                    self._get_executor(),
+                    _pillow_heif_convert,
+                    input_path,
+                    output_path,
+                    self.quality,
+                    self.preserve_exif
+                )
+                if not success:
+                    self.logger.error(f"pillow-heif conversion failed: {error}")
+            else:
+                cmd = self._build_command(input_path, output_path)
+                if cmd is None:
+                    return False, "Unknown converter tool"
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+                success = process.returncode == 0
+                if not success:
+                    self.logger.error(f"{self.converter_tool} failed: {stderr.decode(errors='replace').strip()}")
             
-            # Открываем и конвертируем
-            with Image.open(input_path) as img:
-                # Сохраняем EXIF если есть
-                exif_data = img.info.get('exif', None)
-                
-                # Конвертируем в RGB если нужно
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Сохраняем как JPEG
-                save_kwargs = {
-                    'quality': self.quality,
-                    'optimize': True
-                }
-                
-                if self.preserve_exif and exif_data:
-                    save_kwargs['exif'] = exif_data
-                
-                img.save(output_path, 'JPEG', **save_kwargs)
+            return self._finish(success, input_path, output_path, started)
             
-            return True
+        except Exception as e:
+            error_msg = f"Conversion error: {str(e)}"
+            self.logger.error(error_msg)
+            return False, error_msg
+        
+        finally:
+            self._release_slot()
+    
+    def can_convert_bytes(self, filename: str) -> bool:
+        """Можно ли конвертировать файл из памяти (convert_bytes)"""
+        return self.enabled and self.converter_tool == "pillow-heif" and self.is_heic(filename)
+    
+    def convert_bytes(self, data, output_path: str) -> Tuple[bool, str]:
+        """
+        Конвертировать HEIC из буфера в памяти прямо в JPEG по output_path
+        (без временного HEIC файла и повторного чтения с диска)
+        
+        Args:
+            data: bytes / bytearray / memoryview с содержимым HEIC
+            output_path: Путь для сохранения JPG
+        
+        Returns:
+            Tuple[success, output_path or error_message]
+        """
+        if not self.enabled:
+            return False, "HEIC conversion disabled"
+        
+        if self.converter_tool != "pillow-heif":
+            return False, "In-memory conversion requires pillow-heif"
+        
+        started = time.perf_counter()
+        success, error = _pillow_heif_convert_bytes(data, output_path, self.quality, self.preserve_exif)
+        if not success:
+            self.logger.error(f"pillow-heif conversion failed: {error}")
+        return self._finish(success, "memory.heic", output_path, started)
+    
+    async def convert_bytes_async(self, data, output_path: str) -> Tuple[bool, str]:
+        """
+        Асинхронный вариант convert_bytes (декодирование в пуле процессов)
+        
+        Args:
+            data: bytes / bytearray с содержимым HEIC
+            output_path: Путь для сохранения JPG
+        
+        Returns:
+            Tuple[success, output_path or error_message]
+        """
+        if not self.enabled:
+            return False, "HEIC conversion disabled"
+        
+        if self.converter_tool != "pillow-heif":
+            return False, "In-memory conversion requires pillow-heif"
+        
+        if not await self._acquire_slot():
+            return False, f"Conversion queue is full ({self.queue_limit})"
+        
+        started = time.perf_counter()
+        
+        try:
+            loop = asyncio.get_running_loop()
+            success, error = await loop.run_in_executor(
+                self._get_executor(),
+                _pillow_heif_convert_bytes,
+                data,
+                output_path,
+                self.quality,
+                self.preserve_exif
+            )
+            if not success:
+                self.logger.error(f"pillow-heif conversion failed: {error}")
+            return self._finish(success, "memory.heic", output_path, started)
             
         except Exception as e:
-            self.logger.error(f"pillow-heif conversion failed: {e}")
+            error_msg = f"Conversion error: {str(e)}"
+            self.logger.error(error_msg)
+            return False, error_msg
+        
+        finally:
+            self._release_slot()
+    
+    async def _acquire_slot(self) -> bool:
+        """Занять слот конвертации (False если очередь ожидания переполнена)"""
+        if self._waiting >= self.queue_limit:
+            self.rejected += 1
             return False
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        
+        self._running += 1
+        return True
+    
+    def _release_slot(self) -> None:
+        """Освободить слот конвертации"""
+        self._running -= 1
+        self._semaphore.release()
+    
+    def _check_input(self, input_path: str) -> Optional[str]:
+        """Проверить, можно ли конвертировать файл (None если можно)"""
+        if not self.enabled:
+            return "HEIC conversion disabled"
+        
+        if not self.converter_tool:
+            return "No converter tool available"
+        
+        if not Path(input_path).exists():
+            return f"Input file not found: {input_path}"
+        
+        if not self.is_heic(input_path):
+            return f"Not a HEIC file: {input_path}"
+        
+        return None
+    
+    def _finish(self, success: bool, input_path: str, output_path: str, started: float) -> Tuple[bool, str]:
+        """Учесть время конвертации и залогировать результат"""
+        elapsed = time.perf_counter() - started
+        if not success:
+            self.failed += 1
+            self.logger.event("heic_convert", elapsed, result="failed", tool=self.converter_tool)
+            return False, "Conversion failed"
+        
+        self.conversion_times.observe(elapsed)
+        self.conversion_histogram.observe(elapsed)
+        self.logger.event("heic_convert", elapsed, tool=self.converter_tool)
+        self.logger.file_converted(
+            Path(input_path).name,
+            Path(output_path).name,
+            "HEIC",
+            "JPG"
+        )
+        return True, output_path
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Пул процессов для pillow-heif (создаётся при первой конвертации)"""
+        if self._executor is None:
+            # spawn: дочерние процессы не наследуют сокеты и event loop сервера
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pillow_heif_worker
+            )
+        return self._executor
+    
+    def _build_command(self, input_path: str, output_path: str) -> Optional[List[str]]:
+        """Командная строка для CLI-инструмента конвертации"""
+        if self.converter_tool == "imagemagick":
+            cmd_name = "magick" if shutil.which("magick") else "convert"
+            return [
+                cmd_name,
+                input_path,
+                "-quality", str(self.quality),
+                output_path
+            ]
+        
+        if self.converter_tool == "sips":
+            return [
+                "sips",
+                "-s", "format", "jpeg",
+                "-s", "formatOptions", str(self.quality),
+                input_path,
+                "--out", output_path
+            ]
+        
+        if self.converter_tool == "heif-convert":
+            return [
+                "heif-convert",
+                "-q", str(self.quality),
+                input_path,
+                output_path
+            ]
+        
+        return None
+    
+    def _convert_pillow_heif(self, input_path: str, output_path: str) -> bool:
+        """Конвертация через pillow-heif"""
+        success, error = _pillow_heif_convert(input_path, output_path, self.quality, self.preserve_exif)
+        if not success:
+            self.logger.error(f"pillow-heif conversion failed: {error}")
+        return success
+    
+    def get_stats(self) -> dict:
+        """Статистика конвертаций для /api/photosync/stats"""
+        stats = {
+            "tool": self.converter_tool,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "running": self._running,
+            "waiting": self._waiting,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+        stats.update(self.conversion_times.snapshot())
+        return stats
+    
+    def close(self) -> None:
+        """Остановить пул процессов"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
     
     def get_exif_date(self, filepath: str) -> Optional[datetime]:
         """
@@ -0,0 +1,415 @@
+"""
+SOLAR PhotoSync v1.2.0 - Ingest Journal Module
+Журнал упреждающей записи принятых updates: после рестарта незавершённые updates обрабатываются заново
+"""
+
+import os
+import asyncio
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+from logger import get_logger
+from json_codec import JsonCodec
+from state_store import get_state_path
+
+
+class IngestJournal:
+    """
+    Write-ahead журнал updates (JSON Lines в state/ingest.jsonl).
+    Этапы update: accepted -> stored -> confirmed (или skipped / failed).
+    Скачивание, конвертация HEIC и запись в хранилище идут одним потоком до
+    атомарного rename, поэтому отдельно не журналируются: до stored после
+    рестарта update обрабатывается с начала, после stored - только
+    отправляется подтверждение.
+    
+    Записи копятся в буфере и сбрасываются одной записью и одним fsync
+    (group commit) не чаще commit_interval_ms. accept ждёт fsync, чтобы
+    Telegram получил 200 только для сохранённого update; остальные этапы
+    дописываются без ожидания.
+    
+    Журналы, которыми не владеет ни один воркер текущего запуска (число
+    воркеров уменьшилось или режим сменился на однопроцессный), забирает
+    и доигрывает воркер 0.
+    """
+    
+    STAGES = ("accepted", "stored", "confirmed", "skipped", "failed")
+    FINISHED = {"confirmed", "skipped", "failed"}
+    
+    def __init__(self, config: dict, codec: JsonCodec):
+        """
+        Инициализация журнала
+        
+        Args:
+            config: Конфигурация приложения
+            codec: JSON кодек (записи журнала)
+        """
+        self.logger = get_logger()
+        self.codec = codec
+        
+        journal_config = config.get("ingest_journal", {})
+        self.enabled = journal_config.get("enabled", True)
+        self.commit_interval = journal_config.get("commit_interval_ms", 10) / 1000
+        self.fsync = journal_config.get("fsync", True)
+        self.replay_concurrency = max(1, journal_config.get("replay_concurrency", 4))
+        # Журнал переписывается только незавершёнными записями после стольких записей
+        self.compact_after = journal_config.get("compact_after", 10000)
+        
+        # В режиме --workers у каждого воркера свой журнал (перезапущенный воркер доигрывает свой)
+        server_config = config.get("server", {})
+        workers = server_config.get("workers", 1)
+        self.worker_id = server_config.get("worker_id", 0)
+        owned = {journal_name(workers, worker_id) for worker_id in range(max(1, workers))}
+        self.path: Path = get_state_path(config) / journal_name(workers, self.worker_id)
+        # Журналы прошлых запусков без владельца (читает только воркер 0)
+        self._orphans: List[Path] = []
+        if self.worker_id == 0:
+            self._orphans = [
+                path for path in sorted(self.path.parent.glob("ingest*.jsonl"))
+                if path.name not in owned
+            ]
+        
+        # Незавершённые updates: update_id -> {"stage", "update", поля этапа}
+        self._live: Dict[int, dict] = {}
+        self._buffer: List[bytes] = []
+        self._waiters: List[asyncio.Future] = []
+        self._file = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._since_compact = 0
+        
+        # Счётчики
+        self.commits = 0
+        self.records = 0
+        # Записей на диске (из records)
+        self.written = 0
+        self.replayed = 0
+        
+        if self.enabled:
+            self._load()
+    
+    def _load(self) -> None:
+        """Прочитать журнал (и журналы без владельца): последнее состояние каждого update"""
+        corrupt = 0
+        for path in [self.path] + self._orphans:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            
+            with f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = self.codec.loads(line)
+                    except ValueError:
+                        # Оборванная запись в конце файла (падение во время write)
+                        corrupt += 1
+                        continue
+                    self._apply(record)
+        
+        if self._orphans:
+            self.logger.info(f"Ingest journal: adopting {', '.join(path.name for path in self._orphans)}")
+        if corrupt:
+            self.logger.warning(f"Ingest journal: {corrupt} damaged records skipped")
+        if self._live:
+            self.logger.info(f"Ingest journal: {len(self._live)} unfinished updates to replay")
+    
+    def _apply(self, record: dict) -> None:
+        """Применить запись журнала к состоянию в памяти"""
+        update_id = record.get("id")
+        stage = record.get("stage")
+        if stage == "accepted":
+            self._live[update_id] = {"stage": stage, "update": record.get("update")}
+            return
+        
+        entry = self._live.get(update_id)
+        if entry is None:
+            return
+        if stage in self.FINISHED:
+            del self._live[update_id]
+            return
+        entry["stage"] = stage
+        entry.update({key: value for key, value in record.items() if key not in ("id", "stage", "update")})
+    
+    async def start(self) -> None:
+        """Открыть журнал (переписав его только незавершёнными записями) и запустить group commit"""
+        if not self.enabled or self._task is not None:
+            return
+        
+        await asyncio.to_thread(self._compact, self._snapshot())
+        # Записи без владельца уже в своём журнале
+        await asyncio.to_thread(self._remove_orphans)
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._committer(), name="photosync-ingest-journal")
+    
+    async def stop(self) -> None:
+        """Дописать буфер и закрыть журнал"""
+        if self._task is None:
+            return
+        
+        # Не cancel: committer может быть внутри записи в потоке - он дописывает буфер и выходит сам
+        self._closing = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        
+        # Этапы, отмеченные после последней записи, уже в снимке незавершённых
+        waiters = self._waiters
+        self._buffer = []
+        self._waiters = []
+        try:
+            await asyncio.to_thread(self._compact, self._snapshot())
+            self.written = self.records
+        finally:
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+        self._file.close()
+        self._file = None
+    
+    async def accept(self, update: dict) -> bool:
+        """
+        Записать принятый update и дождаться fsync
+        
+        Args:
+            update: JSON объект update
+        
+        Returns:
+            False если запись не удалась (update обрабатывается, но без гарантии после рестарта)
+        """
+        update_id = update.get("update_id")
+        if not self.enabled or self._task is None or update_id is None:
+            return False
+        if update_id in self._live:
+            # Повторная доставка ещё не завершённого update - уже в журнале
+            return True
+        
+        self._live[update_id] = {"stage": "accepted", "update": update}
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._append({"id": update_id, "stage": "accepted", "update": update})
+        
+        try:
+            await asyncio.shield(future)
+            return True
+        except Exception as e:
+            self.logger.error(f"Ingest journal write failed: {e}")
+            return False
+    
+    def mark(self, update_id: Optional[int], stage: str, **fields) -> None:
+        """
+        Записать этап update (без ожидания fsync)
+        
+        Args:
+            update_id: ID update (не принятые через accept игнорируются)
+            stage: stored / confirmed / skipped / failed
+            **fields: Поля этапа (для stored - chat_id, category, date и счётчики подтверждения)
+        """
+        entry = self._live.get(update_id)
+        if entry is None:
+            return
+        
+        if stage in self.FINISHED:
+            del self._live[update_id]
+        else:
+            entry["stage"] = stage
+            entry.update(fields)
+        
+        record = {"id": update_id, "stage": stage}
+        record.update(fields)
+        self._append(record)
+    
+    def finish(self, update_id: Optional[int], success: bool) -> None:
+        """Update обработан без подтверждения (команда, дубликат, ошибка): закрыть запись"""
+        entry = self._live.get(update_id)
+        if entry is not None and entry["stage"] == "accepted":
+            self.mark(update_id, "skipped" if success else "failed")
+    
+    def confirmed(self, update_ids: List[int]) -> None:
+        """Подтверждение доставлено (MessageSender.on_delivered)"""
+        for update_id in update_ids:
+            self.mark(update_id, "confirmed")
+    
+    async def sync(self) -> None:
+        """
+        Дождаться, пока все записанные до вызова этапы окажутся на диске
+        
+        Ошибка записи не выбрасывается (её уже видит accept): вызывающему
+        нужен порядок записей, а не гарантия.
+        """
+        if self._task is None or self.written >= self.records:
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._wakeup.set()
+        try:
+            await asyncio.shield(future)
+        except Exception:
+            pass
+    
+    def _append(self, record: dict) -> None:
+        if self._task is None:
+            return
+        self._buffer.append(self.codec.dumps(record) + b"\n")
+        self.records += 1
+        self._since_compact += 1
+        self._wakeup.set()
+    
+    async def _committer(self) -> None:
+        """Group commit: всё, что накопилось за commit_interval, - одной записью и одним fsync"""
+        while True:
+            await self._wakeup.wait()
+            if self.commit_interval and not self._closing:
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            await self._commit()
+            if self._closing:
+                return
+            
+            if self._since_compact >= self.compact_after:
+                await asyncio.to_thread(self._compact, self._snapshot())
+    
+    async def _commit(self) -> None:
+        if not self._buffer and not self._waiters:
+            return
+        
+        data = b"".join(self._buffer)
+        waiters = self._waiters
+        records = self.records
+        self._buffer = []
+        self._waiters = []
+        
+        # Пустой буфер у sync: его записи ушли предыдущей записью, она уже завершена
+        if data:
+            try:
+                await asyncio.to_thread(self._write, data)
+            except Exception as e:
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self.commits += 1
+        
+        self.written = records
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+    
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+    
+    def _snapshot(self) -> bytes:
+        """Незавершённые updates записями журнала (собирается в event loop, пока состояние не меняется)"""
+        lines = []
+        for update_id, entry in self._live.items():
+            lines.append(self.codec.dumps({"id": update_id, "stage": "accepted", "update": entry["update"]}))
+            if entry["stage"] != "accepted":
+                record = {key: value for key, value in entry.items() if key != "update"}
+                record["id"] = update_id
+                lines.append(self.codec.dumps(record))
+        return b"".join(line + b"\n" for line in lines)
+    
+    def _compact(self, data: bytes) -> None:
+        """Переписать журнал снимком незавершённых записей (tmp + fsync + rename)"""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "ab")
+        self._since_compact = 0
+    
+    def _remove_orphans(self) -> None:
+        for path in self._orphans:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._orphans = []
+    
+    async def replay(self, handler: Callable[[dict], Awaitable], confirm: Callable[..., None]) -> None:
+        """
+        Доиграть незавершённые updates после рестарта
+        
+        Args:
+            handler: Обработка update с начала (accepted)
+            confirm: MessageSender.confirm - повторное подтверждение (stored)
+        """
+        if not self._live:
+            return
+        
+        # Сохранённые, но не подтверждённые - одно подтверждение на чат / категорию / дату
+        confirmations: Dict[tuple, dict] = {}
+        accepted = []
+        for update_id, entry in self._live.items():
+            if entry["stage"] != "stored":
+                accepted.append(entry["update"])
+                continue
+            key = (entry.get("chat_id"), entry.get("category"), entry.get("date"))
+            pending = confirmations.setdefault(key, {"saved": 0, "duplicates": 0, "failed": 0, "update_ids": []})
+            for name in ("saved", "duplicates", "failed"):
+                pending[name] += entry.get(name, 0)
+            pending["update_ids"].append(update_id)
+        
+        self.logger.info(
+            f"Replaying ingest journal: {len(accepted)} updates, {len(confirmations)} confirmations"
+        )
+        
+        for (chat_id, category, date), pending in confirmations.items():
+            confirm(chat_id, category, date, **pending)
+        
+        semaphore = asyncio.Semaphore(self.replay_concurrency)
+        
+        async def run(update: dict) -> None:
+            async with semaphore:
+                self.logger.start_trace()
+                try:
+                    await handler(update)
+                except Exception as e:
+                    self.logger.error(f"Replay of update {update.get('update_id')} failed: {e}")
+                    self.finish(update.get("update_id"), False)
+                self.replayed += 1
+        
+        await asyncio.gather(*(run(update) for update in accepted))
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "unfinished": len(self._live),
+            "records": self.records,
+            "commits": self.commits,
+            "records_per_commit": round(self.records / self.commits, 2) if self.commits else 0.0,
+            "replayed": self.replayed
+        }
+
+
+def journal_name(workers: int, worker_id: int) -> str:
+    """Имя журнала процесса: ingest.jsonl или ingest.w{worker_id}.jsonl в режиме --workers"""
+    if workers > 1:
+        return f"ingest.w{worker_id}.jsonl"
+    return "ingest.jsonl"
+
+
+def create_ingest_journal(config: dict, codec: JsonCodec) -> IngestJournal:
+    """
+    Фабричная функция для создания IngestJournal
+    
+    Args:
+        config: Конфигурация приложения
+        codec: JSON кодек
+    
+    Returns:
+        Экземпляр IngestJournal
+    """
+    return IngestJournal(config, codec)
@@ -0,0 +1,161 @@
+"""
+SOLAR PhotoSync v1.2.0 - Job Queue Module
+Фоновая очередь обработки updates с ограниченным числом воркеров
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+from logger import get_logger
+from metrics import StageTimings
+
+
+class JobQueue:
+    """In-process очередь asyncio: webhook ставит update в очередь и сразу отвечает Telegram"""
+    
+    def __init__(
+        self,
+        config: dict,
+        handler: Callable[[dict], Awaitable[Any]],
+        timings: Optional[StageTimings] = None
+    ):
+        """
+        Инициализация очереди
+        
+        Args:
+            config: Конфигурация приложения
+            handler: Корутина обработки одного update (WebhookHandler.handle_update)
+            timings: Общие счётчики этапов (сюда пишется queue_wait)
+        """
+        self.logger = get_logger()
+        self.handler = handler
+        self.timings = timings or StageTimings()
+        
+        queue_config = config.get("queue", {})
+        self.enabled = queue_config.get("enabled", True)
+        self.workers = max(1, queue_config.get("workers", 4))
+        self.max_size = queue_config.get("max_size", 1000)
+        self.drain_timeout = queue_config.get("drain_timeout", 30)
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        
+        # Счётчики
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+    
+    async def start(self) -> None:
+        """Запустить воркеры"""
+        if self._tasks:
+            return
+        
+        # Очередь создаётся внутри работающего event loop
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"photosync-worker-{n}")
+            for n in range(self.workers)
+        ]
+        self.logger.info(f"Job queue started: {self.workers} workers, max size {self.max_size}")
+    
+    async def stop(self) -> None:
+        """Дождаться обработки очереди (не дольше drain_timeout) и остановить воркеры"""
+        if not self._tasks:
+            return
+        
+        pending = self._queue.qsize() + self.in_flight
+        if pending:
+            self.logger.info(f"Draining job queue: {pending} pending")
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning(
+                    f"Job queue drain timeout, dropping {self._queue.qsize()} queued updates"
+                )
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.logger.info("Job queue stopped")
+    
+    def submit(self, update: dict) -> bool:
+        """
+        Поставить update в очередь без ожидания
+        
+        Args:
+            update: JSON объект update от Telegram
+        
+        Returns:
+            False если очередь заполнена (Telegram повторит доставку позже)
+        """
+        try:
+            self._queue.put_nowait((time.perf_counter(), update))
+            return True
+        except asyncio.QueueFull:
+            self.rejected += 1
+            self.logger.warning(f"Job queue full ({self.max_size}), update {update.get('update_id')} rejected")
+            return False
+    
+    async def put(self, update: dict) -> None:
+        """
+        Поставить update в очередь, дождавшись места (для polling: backpressure на getUpdates)
+        
+        Args:
+            update: JSON объект update от Telegram
+        """
+        await self._queue.put((time.perf_counter(), update))
+    
+    async def _worker(self, number: int) -> None:
+        """Цикл воркера: берёт update из очереди и обрабатывает"""
+        while True:
+            enqueued_at, update = await self._queue.get()
+            # Новая трассировка на каждый update (воркер - одна долгая задача)
+            self.logger.start_trace()
+            self.timings.record("queue_wait", time.perf_counter() - enqueued_at, update_id=update.get("update_id"))
+            self.in_flight += 1
+            
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"Worker {number} failed on update {update.get('update_id')}: {e}")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+    
+    def get_stats(self) -> dict:
+        """Статистика очереди для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "max_size": self.max_size,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+
+def create_job_queue(
+    config: dict,
+    handler: Callable[[dict], Awaitable[Any]],
+    timings: Optional[StageTimings] = None
+) -> JobQueue:
+    """
+    Фабричная функция для создания JobQueue
+    
+    Args:
+        config: Конфигурация приложения
+        handler: Корутина обработки одного update
+        timings: Общие счётчики этапов
+    
+    Returns:
+        Экземпляр JobQueue
+    """
+    return JobQueue(config, handler, timings)
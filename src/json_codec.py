@@ -0,0 +1,207 @@
+"""
+SOLAR PhotoSync v1.2.0 - JSON Codec Module
+JSON из байтов без промежуточной str: msgspec / orjson, если установлены, иначе stdlib json
+"""
+
+import json
+from typing import Any, List, TypedDict
+from aiohttp import web
+from logger import get_logger
+
+
+# --- Схема: только поля Update, которые читает models.Message.from_dict ---
+# msgspec декодирует прямо в эти TypedDict (обычные dict) и пропускает всё
+# остальное (entities, reply_to_message, sender_chat, ...), не создавая для
+# него объектов. Новое поле, которое начинает читать models, нужно добавить сюда.
+
+class MediaFile(TypedDict, total=False):
+    file_id: str
+    file_unique_id: str
+    file_name: str
+    file_size: int
+    mime_type: str
+
+
+class Chat(TypedDict, total=False):
+    id: int
+    title: str
+    type: str
+
+
+class User(TypedDict, total=False):
+    id: int
+    username: str
+
+
+Message = TypedDict("Message", {
+    "message_id": int,
+    "date": int,
+    "chat": Chat,
+    "from": User,
+    "text": str,
+    "caption": str,
+    "media_group_id": str,
+    "photo": List[MediaFile],
+    "document": MediaFile,
+    "video": MediaFile,
+    "animation": MediaFile,
+    "audio": MediaFile,
+    "voice": MediaFile,
+    "video_note": MediaFile,
+}, total=False)
+
+
+class Update(TypedDict, total=False):
+    update_id: int
+    message: Message
+
+
+class ResponseParameters(TypedDict, total=False):
+    retry_after: int
+
+
+class GetUpdatesResponse(TypedDict, total=False):
+    ok: bool
+    result: List[Update]
+    description: str
+    parameters: ResponseParameters
+
+
+def available_backends() -> List[str]:
+    """Установленные бэкенды в порядке предпочтения"""
+    backends = []
+    try:
+        import msgspec
+        backends.append("msgspec")
+    except ImportError:
+        pass
+    try:
+        import orjson
+        backends.append("orjson")
+    except ImportError:
+        pass
+    backends.append("json")
+    return backends
+
+
+class JsonCodec:
+    """Декодирование тел webhook / ответов Bot API и кодирование ответов"""
+    
+    BACKENDS = ("msgspec", "orjson", "json")
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация кодека
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        json_config = config.get("json", {})
+        requested = json_config.get("backend", "auto")
+        self.typed_updates = json_config.get("typed_updates", True)
+        
+        backends = available_backends()
+        if requested == "auto":
+            self.backend = backends[0]
+        elif requested in backends:
+            self.backend = requested
+        else:
+            if requested not in self.BACKENDS:
+                self.logger.warning(f"Unknown JSON backend '{requested}', using {backends[0]}")
+            else:
+                self.logger.warning(f"JSON backend '{requested}' is not installed, using {backends[0]}")
+            self.backend = backends[0]
+        
+        self._update_decoder = None
+        self._updates_decoder = None
+        self._validation_error = None
+        
+        if self.backend == "msgspec":
+            import msgspec
+            self.loads = msgspec.json.decode
+            self.dumps = msgspec.json.encode
+            if self.typed_updates:
+                self._update_decoder = msgspec.json.Decoder(Update)
+                self._updates_decoder = msgspec.json.Decoder(GetUpdatesResponse)
+                self._validation_error = msgspec.ValidationError
+        elif self.backend == "orjson":
+            import orjson
+            self.loads = orjson.loads
+            self.dumps = lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            self.loads = json.loads
+            self.dumps = lambda obj: json.dumps(obj).encode("utf-8")
+        
+        # Обновления, не прошедшие схему (разобраны целиком)
+        self.schema_fallbacks = 0
+        
+        self.logger.info(f"JSON backend: {self.backend} (typed updates: {self._update_decoder is not None})")
+    
+    def dumps_str(self, obj: Any) -> str:
+        """Сериализация в str (для json_serialize aiohttp.ClientSession)"""
+        return self.dumps(obj).decode("utf-8")
+    
+    def decode_update(self, body: bytes) -> dict:
+        """
+        Разобрать тело webhook
+        
+        Args:
+            body: Сырые байты запроса
+        
+        Returns:
+            Update (с msgspec - только поля схемы)
+        
+        Raises:
+            ValueError: Невалидный JSON
+        """
+        return self._decode(self._update_decoder, body)
+    
+    def decode_updates(self, body: bytes) -> dict:
+        """Разобрать ответ getUpdates"""
+        return self._decode(self._updates_decoder, body)
+    
+    def _decode(self, decoder, body: bytes) -> Any:
+        """Декодирование по схеме с откатом на полный разбор при несовпадении типов"""
+        if decoder is not None:
+            try:
+                return decoder.decode(body)
+            except self._validation_error:
+                # Telegram изменил тип поля - лучше разобрать всё, чем потерять update
+                self.schema_fallbacks += 1
+        return self.loads(body)
+    
+    def response(self, data: Any, status: int = 200) -> web.Response:
+        """
+        JSON ответ aiohttp без промежуточной str
+        
+        Args:
+            data: Сериализуемый объект
+            status: HTTP статус
+        
+        Returns:
+            web.Response
+        """
+        return web.Response(body=self.dumps(data), status=status, content_type="application/json")
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "backend": self.backend,
+            "typed_updates": self._update_decoder is not None,
+            "schema_fallbacks": self.schema_fallbacks
+        }
+
+
+def create_json_codec(config: dict) -> JsonCodec:
+    """
+    Фабричная функция для создания JsonCodec
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр JsonCodec
+    """
+    return JsonCodec(config)
@@ -3,11 +3,18 @@ SOLAR PhotoSync v1.2.0 - Logger Module (Command Routing Edition)
 Модуль логирования для отслеживания всех операций
 """
 
+import atexit
+import json
 import logging
 import os
+import queue
+import random
+from contextvars import ContextVar
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional, Tuple
+from models import MediaFile
 
 
 # Глобальная переменная для отслеживания последнего сохранения
@@ -25,6 +32,42 @@ def get_last_saved() -> datetime:
     return LAST_SAVED_TIMESTAMP
 
 
+# Трассировка текущего update: (trace_id, пишутся ли debug-события).
+# ContextVar - своя у каждой задачи asyncio, наследуется дочерними задачами
+_trace: ContextVar[Optional[Tuple[str, bool]]] = ContextVar("photosync_trace", default=None)
+
+
+class _EventFormatter(logging.Formatter):
+    """Одно событие - одна строка JSON (сериализация в потоке QueueListener)"""
+    
+    def __init__(self, worker_id: Optional[int] = None):
+        super().__init__()
+        self.worker_id = worker_id
+    
+    def format(self, record: logging.LogRecord) -> str:
+        event = {"ts": round(record.created, 3)}
+        if self.worker_id is not None:
+            event["worker"] = self.worker_id
+        event.update(record.msg)
+        return json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке.
+    
+    Стандартный prepare() собирает строку сообщения (msg % args) до постановки
+    в очередь, то есть в event loop. Наши аргументы - str / int / float, их
+    безопасно передать в поток как есть: сообщение соберёт уже форматтер
+    хендлера. Записи с exc_info готовятся стандартно (traceback держит кадры).
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+
 class PhotoSyncLogger:
     """Централизованный логгер для PhotoSync"""
     
@@ -42,7 +85,16 @@ class PhotoSyncLogger:
         
         self.logger = logging.getLogger("PhotoSync")
         self.logger.setLevel(logging.DEBUG)
+        self._listeners = []
+        
+        # Структурные события (JSON Lines) - отдельный логгер и файл
+        self.events = logging.getLogger("PhotoSync.events")
+        self.events.propagate = False
+        self.events.setLevel(logging.INFO)
+        self.events_enabled = False
+        self.debug_sample_rate = 0.0
         PhotoSyncLogger._initialized = True
+        atexit.register(self.stop)
     
     def setup(self, config: dict):
         """Настройка логгера из конфигурации"""
@@ -56,15 +108,19 @@ class PhotoSyncLogger:
         log_path.mkdir(parents=True, exist_ok=True)
         
         log_file = log_path / log_config.get("log_file", "photosync.log")
+        
+        # В режиме --workers у каждого процесса свой файл: RotatingFileHandler
+        # не умеет ротировать один файл из нескольких процессов
+        server_config = config.get("server", {})
+        worker_id = server_config.get("worker_id") if server_config.get("workers", 1) > 1 else None
+        if worker_id is not None:
+            log_file = log_file.with_name(f"{log_file.stem}.w{worker_id}{log_file.suffix}")
         max_size = log_config.get("max_log_size_mb", 10) * 1024 * 1024
         backup_count = log_config.get("backup_count", 5)
         log_level = getattr(logging, log_config.get("log_level", "INFO").upper())
+        use_queue = log_config.get("async", True)
         
-        # Формат лога
-        formatter = logging.Formatter(
-            '[%(asctime)s] [%(levelname)s] %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+        formatter = self._formatter(worker_id)
         
         # Файловый хендлер с ротацией
         file_handler = RotatingFileHandler(
@@ -82,52 +138,180 @@ class PhotoSyncLogger:
         console_handler.setFormatter(formatter)
         
         # Очистка старых хендлеров и добавление новых
+        self.stop()
+        # Отключённые уровни отсекаются до создания записи
+        self.logger.setLevel(log_level)
+        self._attach(self.logger, [file_handler, console_handler], use_queue)
+        
+        # Структурные события: одна строка JSON на этап обработки update
+        events_config = log_config.get("events", {})
+        self.events_enabled = events_config.get("enabled", False)
+        self.debug_sample_rate = events_config.get("debug_sample_rate", 0.0)
+        events_file = None
+        if self.events_enabled:
+            events_file = log_path / events_config.get("file", "photosync.events.jsonl")
+            if worker_id is not None:
+                events_file = events_file.with_name(f"{events_file.stem}.w{worker_id}{events_file.suffix}")
+            events_handler = RotatingFileHandler(
+                events_file,
+                maxBytes=max_size,
+                backupCount=backup_count,
+                encoding='utf-8'
+            )
+            events_handler.setFormatter(_EventFormatter(worker_id))
+            self._attach(self.events, [events_handler], use_queue)
+        
+        self.info("Logger initialized. Log file: %s (async: %s, events: %s)", log_file, use_queue, events_file)
+    
+    def _attach(self, target: logging.Logger, handlers: list, use_queue: bool):
+        """Подключить хендлеры напрямую или через очередь и фоновый поток"""
+        target.handlers.clear()
+        if not use_queue:
+            for handler in handlers:
+                target.addHandler(handler)
+            return
+        
+        # Запись в файл / консоль и ротация - в фоновом потоке, event loop только кладёт в очередь
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        self._listeners.append(listener)
+        target.addHandler(_DeferredQueueHandler(log_queue))
+    
+    def stop(self):
+        """Дописать очереди и остановить фоновые потоки логирования"""
+        while self._listeners:
+            self._listeners.pop().stop()
+    
+    def setup_console(self):
+        """Только консольный вывод (супервизор --workers, который сам ничего не обрабатывает)"""
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(self._formatter())
+        
+        self.stop()
         self.logger.handlers.clear()
-        self.logger.addHandler(file_handler)
+        self.logger.setLevel(logging.INFO)
         self.logger.addHandler(console_handler)
-        
-        self.info(f"Logger initialized. Log file: {log_file}")
+        self.events.handlers.clear()
+        self.events_enabled = False
+    
+    @staticmethod
+    def _formatter(worker_id: int = None) -> logging.Formatter:
+        """Формат лога (с номером воркера в режиме --workers)"""
+        worker = f"[w{worker_id}] " if worker_id is not None else ""
+        return logging.Formatter(
+            f'[%(asctime)s] [%(levelname)s] {worker}%(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
+    # Аргументы форматируются (message % args) только если уровень включён,
+    # а в режиме async - в фоновом потоке
     
-    def info(self, message: str):
+    def info(self, message: str, *args):
         """Информационное сообщение"""
-        self.logger.info(message)
+        self.logger.info(message, *args)
     
-    def error(self, message: str):
+    def error(self, message: str, *args):
         """Сообщение об ошибке"""
-        self.logger.error(message)
+        self.logger.error(message, *args)
     
-    def warning(self, message: str):
+    def warning(self, message: str, *args):
         """Предупреждение"""
-        self.logger.warning(message)
+        self.logger.warning(message, *args)
     
-    def debug(self, message: str):
+    def debug(self, message: str, *args):
         """Отладочное сообщение"""
-        self.logger.debug(message)
+        self.logger.debug(message, *args)
+    
+    def is_debug(self) -> bool:
+        """Включён ли DEBUG (чтобы не собирать дорогие отладочные сообщения)"""
+        return self.logger.isEnabledFor(logging.DEBUG)
     
-    def file_received(self, filename: str, file_type: str, size: int):
+    def file_received(self, media: MediaFile):
         """Лог получения файла"""
-        size_kb = size / 1024
-        self.info(f"Received {file_type}: {filename} ({size_kb:.1f} KB)")
+        self.logger.info("Received %s: %s (%.1f KB)", media.type, media.file_name, media.file_size / 1024)
     
     def file_saved(self, original_name: str, saved_path: str, category: str):
         """Лог сохранения файла"""
-        self.info(f"Saved: {original_name} -> {saved_path} [Category: {category}]")
+        self.logger.info("Saved: %s -> %s [Category: %s]", original_name, saved_path, category)
     
     def file_converted(self, original_name: str, new_name: str, format_from: str, format_to: str):
         """Лог конвертации файла"""
-        self.info(f"Converted: {original_name} ({format_from}) -> {new_name} ({format_to})")
+        self.logger.info("Converted: %s (%s) -> %s (%s)", original_name, format_from, new_name, format_to)
     
     def classification_result(self, filename: str, category: str, reason: str):
         """Лог результата классификации"""
-        self.info(f"Classified: {filename} -> {category} (reason: {reason})")
+        self.logger.info("Classified: %s -> %s (reason: %s)", filename, category, reason)
     
     def webhook_received(self, update_id: int, chat_id: int):
         """Лог получения webhook"""
-        self.debug(f"Webhook received: update_id={update_id}, chat_id={chat_id}")
+        self.logger.debug("Webhook received: update_id=%s, chat_id=%s", update_id, chat_id)
     
     def error_processing(self, filename: str, error: str):
         """Лог ошибки обработки"""
-        self.error(f"Error processing {filename}: {error}")
+        self.logger.error("Error processing %s: %s", filename, error)
+    
+    # --- Структурные события ---
+    
+    def start_trace(self) -> str:
+        """
+        Начать трассировку update в текущей задаче asyncio
+        
+        Решение о записи debug-событий принимается один раз на update,
+        поэтому в выборку попадают все этапы update или ни одного.
+        
+        Returns:
+            Trace ID
+        """
+        trace_id = "%016x" % random.getrandbits(64)
+        sampled = self.debug_sample_rate > 0 and random.random() < self.debug_sample_rate
+        _trace.set((trace_id, sampled))
+        return trace_id
+    
+    def get_trace(self) -> Optional[Tuple[str, bool]]:
+        """Текущая трассировка (чтобы продолжить её в другой задаче через set_trace)"""
+        return _trace.get()
+    
+    def set_trace(self, trace: Optional[Tuple[str, bool]]):
+        """Продолжить трассировку в текущей задаче"""
+        _trace.set(trace)
+    
+    def event(
+        self,
+        stage: str,
+        seconds: Optional[float] = None,
+        result: str = "ok",
+        size: Optional[int] = None,
+        debug: bool = False,
+        **fields
+    ):
+        """
+        Записать событие этапа обработки строкой JSON
+        
+        Args:
+            stage: Этап (get_file, download, heic_convert, disk_write, ...)
+            seconds: Длительность этапа
+            result: ok / failed / ...
+            size: Байт обработано на этапе
+            debug: Подробное событие - пишется только для доли updates (debug_sample_rate)
+            **fields: Дополнительные поля
+        """
+        if not self.events_enabled:
+            return
+        
+        trace = _trace.get()
+        if debug and not (trace and trace[1]):
+            return
+        
+        event = {"trace": trace[0] if trace else None, "stage": stage, "result": result}
+        if seconds is not None:
+            event["ms"] = round(seconds * 1000, 3)
+        if size is not None:
+            event["bytes"] = size
+        if fields:
+            event.update(fields)
+        self.events.info(event)
 
 
 # Глобальный экземпляр логгера
@@ -141,4 +325,4 @@ def get_logger() -> PhotoSyncLogger:
 
 def root_path_created(path: str):
     """Лог создания корневой директории"""
-    logger.info(f"Root path not found, created: {path}")
+    logger.info("Root path not found, created: %s", path)
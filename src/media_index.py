@@ -0,0 +1,509 @@
+"""
+SOLAR PhotoSync v1.2.0 - Media Index Module
+Метаданные сохранённых файлов в SQLite: поиск и постраничный просмотр без обхода дерева
+"""
+
+import re
+import time
+import base64
+import asyncio
+import threading
+from datetime import datetime, date
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from logger import get_logger
+from state_store import connect
+from dedup_index import iter_media_files
+from stats_index import file_kind
+from exif_reader import ExifInfo, create_exif_reader
+
+
+# Колонки files в порядке SELECT (выдача API)
+COLUMNS = (
+    "id", "path", "day", "category", "media_type", "size", "saved_at",
+    "chat_id", "user_id", "file_name", "caption", "taken_at", "latitude", "longitude"
+)
+
+# Фильтры с равенством: у каждого свой индекс (rowid в индексе SQLite идёт последним)
+EQUALITY_FILTERS = ("category", "media_type", "chat_id", "user_id")
+
+# id = (дней от EPOCH << DAY_SHIFT) | номер файла за день: порядок id = порядок (day, номер)
+EPOCH = date(1970, 1, 1)
+DAY_SHIFT = 32
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# Диапазон INTEGER SQLite: курсор за его пределами - OverflowError в sqlite3
+MAX_ID = (1 << 63) - 1
+
+# id - следующий в дне (?1 - первый id дня); считается внутри INSERT, под блокировкой
+# записи SQLite, поэтому воркеры --workers не выдают один id дважды
+INSERT = (
+    "INSERT OR IGNORE INTO files"
+    " (id, path, day, category, media_type, size, saved_at, chat_id, user_id, file_name, caption,"
+    "  taken_at, latitude, longitude)"
+    " VALUES ("
+    f"  (SELECT COALESCE(MAX(id) + 1, ?1) FROM files WHERE id >= ?1 AND id < ?1 + (1 << {DAY_SHIFT})),"
+    "  ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14"
+    " )"
+)
+
+
+class InvalidQuery(ValueError):
+    """Неверный параметр поиска (дата, курсор, limit)"""
+
+
+class MediaIndex:
+    """
+    Индекс файлов хранилища: путь, категория, дата, тип, размер, чат,
+    пользователь, имя, подпись, дата съёмки и координаты из EXIF. Пишется
+    при каждом сохранении.
+    
+    В старших битах id - дата папки, поэтому выдача от новых к старым - это
+    ORDER BY id DESC, диапазон дат - диапазон id, а курсор - последний
+    выданный id: страница N стоит столько же, сколько первая (keyset, без
+    OFFSET). Индекс фильтра (колонка, rowid) отдаёт строки уже в порядке
+    выдачи. Подпись и имя файла ищутся через FTS5, который тоже умеет
+    отдавать rowid по убыванию с границей - поиск по частому слову читает
+    только первые совпадения, а не все.
+    """
+    
+    DB_NAME = "media_index.sqlite3"
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация индекса
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        self.root_path = Path(config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync"))
+        
+        index_config = config.get("media_index", {})
+        self.enabled = index_config.get("enabled", True)
+        self.page_size = index_config.get("page_size", 50)
+        self.max_page_size = index_config.get("max_page_size", 500)
+        
+        self.exif_reader = create_exif_reader(config)
+        self.conn = None
+        self.reader = None
+        self.fts = False
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+        if not self.enabled:
+            return
+        
+        self.conn = connect(config, self.DB_NAME)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " id INTEGER PRIMARY KEY,"
+            " path TEXT NOT NULL UNIQUE,"
+            " day TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " media_type TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " saved_at REAL NOT NULL,"
+            " chat_id INTEGER,"
+            " user_id INTEGER,"
+            " file_name TEXT,"
+            " caption TEXT,"
+            " taken_at REAL,"
+            " latitude REAL,"
+            " longitude REAL"
+            ")"
+        )
+        for column in EQUALITY_FILTERS:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS files_{column} ON files ({column})")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('files', 0)")
+        self._create_counter()
+        self._create_fts()
+        self.conn.commit()
+        
+        # Поиск идёт в потоке: отдельное соединение, чтобы долгий запрос не держал
+        # блокировку записи из event loop (WAL - читатели не мешают писателю)
+        self.reader = connect(config, self.DB_NAME)
+    
+    def _create_counter(self) -> None:
+        """
+        Число файлов в meta: обновляется триггерами в той же транзакции, что и
+        files (и из других процессов --workers), /stats не считает COUNT(*)
+        """
+        self.conn.executescript(
+            "CREATE TRIGGER IF NOT EXISTS files_count_ai AFTER INSERT ON files BEGIN"
+            "  UPDATE meta SET value = value + 1 WHERE key = 'files';"
+            " END;"
+            "CREATE TRIGGER IF NOT EXISTS files_count_ad AFTER DELETE ON files BEGIN"
+            "  UPDATE meta SET value = value - 1 WHERE key = 'files';"
+            " END;"
+        )
+    
+    def _create_fts(self) -> None:
+        """FTS5 по подписи и имени файла (external content - текст хранится только в files)"""
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5("
+                " caption, file_name, content='files', content_rowid='id',"
+                " tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+                ")"
+            )
+        except Exception as e:
+            # SQLite без FTS5 - поиск по тексту через LIKE (полный просмотр)
+            self.logger.warning(f"SQLite FTS5 unavailable, caption search will scan: {e}")
+            return
+        
+        self.conn.executescript(
+            "CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN"
+            "  INSERT INTO files_fts (rowid, caption, file_name) VALUES (new.id, new.caption, new.file_name);"
+            " END;"
+            "CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN"
+            "  INSERT INTO files_fts (files_fts, rowid, caption, file_name)"
+            "  VALUES ('delete', old.id, old.caption, old.file_name);"
+            " END;"
+        )
+        self.fts = True
+    
+    async def start(self) -> None:
+        """
+        Первичное заполнение из дерева, если индекс ещё не строился
+        
+        В режиме --workers вызывается только в воркере 0.
+        """
+        if not self.enabled or self.synced_at() is not None:
+            return
+        self.logger.info("Media index is empty, indexing existing files in background")
+        self._sync_task = asyncio.create_task(self._run_sync())
+    
+    async def stop(self) -> None:
+        """Дождаться первичного заполнения (оно идёт в потоке и не прерывается)"""
+        if self._sync_task is not None:
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+    
+    async def _run_sync(self) -> None:
+        try:
+            await asyncio.to_thread(self.sync)
+        except Exception as e:
+            self.logger.error(f"Media index sync failed: {e}")
+    
+    def add(
+        self,
+        path: Path,
+        size: int,
+        media_type: str,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        file_name: str = "",
+        caption: str = "",
+        saved_at: Optional[float] = None,
+        exif: Optional[ExifInfo] = None
+    ) -> None:
+        """
+        Записать сохранённый файл
+        
+        Args:
+            path: Путь вида root/YYYY-MM-DD/Category/file
+            size: Размер в байтах
+            media_type: Тип медиа Telegram (photo, document, video, ...)
+            chat_id: Чат, из которого пришёл файл
+            user_id: Отправитель
+            file_name: Исходное имя файла
+            caption: Подпись сообщения
+            saved_at: Время сохранения (unix, по умолчанию - сейчас)
+            exif: Дата съёмки и координаты
+        """
+        if not self.enabled:
+            return
+        row = self._row(Path(path), size, media_type, chat_id, user_id, file_name, caption, saved_at, exif)
+        if row is None:
+            return
+        
+        with self._lock:
+            self.conn.execute(INSERT, row)
+            self.conn.commit()
+    
+    def add_many(self, rows: Iterable[tuple]) -> int:
+        """
+        Записать пачку файлов одной транзакцией (backfill, бенчмарк)
+        
+        Args:
+            rows: Кортежи аргументов add: (path, size, media_type, chat_id, user_id, file_name, caption, saved_at, exif)
+        
+        Returns:
+            Сколько строк добавлено
+        """
+        prepared = [row for row in (self._row(Path(args[0]), *args[1:]) for args in rows) if row is not None]
+        with self._lock:
+            cursor = self.conn.executemany(INSERT, prepared)
+            self.conn.commit()
+            return cursor.rowcount
+    
+    def _row(
+        self,
+        path: Path,
+        size: int,
+        media_type: str,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        file_name: str = "",
+        caption: str = "",
+        saved_at: Optional[float] = None,
+        exif: Optional[ExifInfo] = None
+    ) -> Optional[tuple]:
+        """Параметры INSERT для пути внутри root_path (None - путь не из хранилища)"""
+        try:
+            relative = path.relative_to(self.root_path)
+            day, category, _ = relative.parts
+            first_id = day_to_id(day)
+        except ValueError:
+            return None
+        return (
+            first_id, relative.as_posix(), day, category, media_type, size,
+            saved_at if saved_at is not None else time.time(),
+            chat_id, user_id, file_name or path.name, caption or None,
+            exif.taken_at.timestamp() if exif and exif.taken_at else None,
+            exif.latitude if exif else None,
+            exif.longitude if exif else None
+        )
+    
+    def sync(self, progress=None) -> Tuple[int, int]:
+        """
+        Сверить индекс с деревом: добавить файлы, которых в нём нет (без чата,
+        пользователя и подписи; EXIF - из заголовка файла), и удалить записи
+        исчезнувших файлов
+        
+        Args:
+            progress: callback(added, removed) для CLI
+        
+        Returns:
+            Tuple[добавлено, удалено]
+        """
+        with self._lock:
+            known = {path for (path,) in self.conn.execute("SELECT path FROM files")}
+        
+        added = 0
+        batch = []
+        seen = set()
+        for file_path in iter_media_files(self.root_path):
+            relative = file_path.relative_to(self.root_path).as_posix()
+            seen.add(relative)
+            if relative in known:
+                continue
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            batch.append((
+                file_path, stat.st_size, file_kind(file_path), None, None, "", "", stat.st_mtime,
+                self.exif_reader.read_file(file_path)
+            ))
+            if len(batch) >= 1000:
+                added += self.add_many(batch)
+                batch = []
+                if progress:
+                    progress(added, 0)
+        if batch:
+            added += self.add_many(batch)
+        
+        # Записи, появившиеся во время обхода, в known нет - их не трогаем
+        vanished = [(path,) for path in known - seen]
+        with self._lock:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", vanished)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)",
+                (datetime.now().isoformat(timespec="seconds"),)
+            )
+            self.conn.commit()
+        
+        if progress:
+            progress(added, len(vanished))
+        self.logger.info(f"Media index synced: {added} added, {len(vanished)} removed")
+        return added, len(vanished)
+    
+    def synced_at(self) -> Optional[str]:
+        """Время последней сверки с деревом (ISO) или None"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return row[0] if row else None
+    
+    def search(
+        self,
+        category: Optional[str] = None,
+        media_type: Optional[str] = None,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        text: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Страница файлов от новых к старым
+        
+        Args:
+            category, media_type, chat_id, user_id: Точное совпадение
+            date_from, date_to: Диапазон дат YYYY-MM-DD (включительно)
+            text: Слова из подписи или имени файла (по префиксу)
+            cursor: next_cursor предыдущей страницы
+            limit: Размер страницы (не больше max_page_size)
+        
+        Returns:
+            Tuple[файлы, next_cursor или None на последней странице]
+        
+        Raises:
+            InvalidQuery: Неверная дата, курсор или limit
+        """
+        limit = self.page_size if limit is None else limit
+        if limit < 1 or limit > self.max_page_size:
+            raise InvalidQuery(f"limit must be 1..{self.max_page_size}")
+        
+        clauses = []
+        params = []
+        for column, value in zip(EQUALITY_FILTERS, (category, media_type, chat_id, user_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        
+        # Границы id: даты и курсор (id < последнего выданного)
+        id_from = day_to_id(_check_date(date_from)) if date_from else None
+        id_to = None
+        if date_to:
+            id_to = day_to_id(_check_date(date_to)) + (1 << DAY_SHIFT)
+        if cursor:
+            after = decode_cursor(cursor)
+            id_to = after if id_to is None else min(id_to, after)
+        
+        words = WORD.findall(text) if text else []
+        if words and not self.fts:
+            for word in words:
+                clauses.append("(caption LIKE ? OR file_name LIKE ?)")
+                params.extend([f"%{word}%"] * 2)
+        
+        if words and self.fts:
+            # FTS5 ведёт: rowid по убыванию с границами, files - поиск по первичному
+            # ключу (CROSS JOIN запрещает планировщику перевернуть соединение)
+            key = "files_fts.rowid"
+            source = "files_fts CROSS JOIN files ON files.id = files_fts.rowid"
+            # Каждое слово - в кавычках (без синтаксиса FTS5) и по префиксу
+            clauses.insert(0, "files_fts MATCH ?")
+            params.insert(0, " ".join(f'"{word}"*' for word in words))
+        else:
+            key = "files.id"
+            source = "files"
+        
+        if id_from is not None:
+            clauses.append(f"{key} >= ?")
+            params.append(id_from)
+        if id_to is not None:
+            clauses.append(f"{key} < ?")
+            params.append(id_to)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = ", ".join(f"files.{column}" for column in COLUMNS)
+        with self._read_lock:
+            rows = self.reader.execute(
+                f"SELECT {columns} FROM {source} {where} ORDER BY {key} DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0])
+        return [_to_dict(row) for row in rows], next_cursor
+    
+    def get(self, file_id: int) -> Optional[dict]:
+        """Запись файла по id"""
+        with self._read_lock:
+            row = self.reader.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM files WHERE id = ?", (file_id,)
+            ).fetchone()
+        return _to_dict(row) if row else None
+    
+    def resolve(self, item: dict) -> Optional[Path]:
+        """Абсолютный путь файла записи (None, если путь выходит за root_path)"""
+        path = (self.root_path / item["path"]).resolve()
+        if not path.is_relative_to(self.root_path.resolve()):
+            return None
+        return path
+    
+    def count(self) -> int:
+        """Число файлов в индексе (счётчик в meta)"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'files'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "files": self.count(),
+            "fts": self.fts,
+            "synced_at": self.synced_at()
+        }
+    
+    def close(self) -> None:
+        """Обновить статистику планировщика и закрыть базу"""
+        if self.conn is None:
+            return
+        with self._read_lock:
+            self.reader.close()
+            self.reader = None
+        with self._lock:
+            self.conn.execute("PRAGMA optimize")
+            self.conn.close()
+            self.conn = None
+
+
+def _check_date(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise InvalidQuery(f"Invalid date: {value} (expected YYYY-MM-DD)")
+
+
+def day_to_id(day: str) -> int:
+    """Первый id дня YYYY-MM-DD (ValueError - не дата)"""
+    return (date.fromisoformat(day) - EPOCH).days << DAY_SHIFT
+
+
+def encode_cursor(file_id: int) -> str:
+    """Курсор страницы: последний выданный id"""
+    return base64.urlsafe_b64encode(str(file_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        file_id = int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidQuery("Invalid cursor")
+    if not 0 <= file_id <= MAX_ID:
+        raise InvalidQuery("Invalid cursor")
+    return file_id
+
+
+def _to_dict(row: tuple) -> dict:
+    item = dict(zip(COLUMNS, row))
+    item["saved_at"] = datetime.fromtimestamp(item["saved_at"]).isoformat(timespec="seconds")
+    if item["taken_at"] is not None:
+        item["taken_at"] = datetime.fromtimestamp(item["taken_at"]).isoformat(timespec="seconds")
+    return item
+
+
+def create_media_index(config: dict) -> MediaIndex:
+    """
+    Фабричная функция для создания MediaIndex
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр MediaIndex
+    """
+    return MediaIndex(config)
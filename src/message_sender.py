@@ -0,0 +1,450 @@
+"""
+SOLAR PhotoSync v1.2.0 - Message Sender Module
+Исходящие сообщения: очередь по чатам, token bucket лимиты Telegram, склейка подтверждений
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, List, Optional, Set, Tuple, Union
+import aiohttp
+from logger import get_logger
+from metrics import StageTimings
+from telegram_api import TelegramApiClient
+
+
+# Исход sendMessage
+DELIVERED = "delivered"
+RETRY = "retry"
+FAILED = "failed"
+
+# Пауза перед повтором после сетевой ошибки / 5xx: 1, 2, 4 ... секунд, не больше
+MAX_BACKOFF = 30
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе"""
+    
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+    
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится токен (0 - уже есть)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self, now: float) -> None:
+        """Забрать токен (после delay() == 0)"""
+        self._refill(now)
+        self.tokens -= 1
+
+
+class Confirmation:
+    """Подтверждение сохранения; пока не отправлено, к нему добавляются следующие"""
+    
+    __slots__ = (
+        "category", "date", "saved", "duplicates", "failed", "update_ids", "queued_at", "attempts", "trace"
+    )
+    
+    def __init__(self, category: str, date: str, saved: int, duplicates: int, failed: int, update_ids: List[int]):
+        self.category = category
+        self.date = date
+        self.saved = saved
+        self.duplicates = duplicates
+        self.failed = failed
+        # updates, которые закрывает это подтверждение (журнал приёма)
+        self.update_ids = update_ids
+        self.queued_at = time.perf_counter()
+        self.attempts = 0
+        # Трассировка update, поставившего сообщение (при склейке - первого)
+        self.trace = get_logger().get_trace()
+    
+    def render(self) -> str:
+        """Текст сообщения (одиночный файл - прежний формат)"""
+        target = f"{self.category} / {self.date}"
+        if self.saved == 0 and self.failed == 0:
+            if self.duplicates == 1:
+                return f"☀️ Already saved → {target}"
+            return f"☀️ Already saved {self.duplicates} files → {target}"
+        
+        text = f"☀️ Saved → {target}" if self.saved == 1 else f"☀️ Saved {self.saved} files → {target}"
+        if self.duplicates:
+            text += f"\n♻️ Already saved: {self.duplicates}"
+        if self.failed:
+            text += f"\n❗ Failed: {self.failed}"
+        return text
+
+
+class _Text:
+    """Обычное сообщение (ответ на команду) - не склеивается"""
+    
+    __slots__ = ("text", "queued_at", "attempts", "trace")
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.queued_at = time.perf_counter()
+        self.attempts = 0
+        self.trace = get_logger().get_trace()
+    
+    def render(self) -> str:
+        return self.text
+
+
+class _Chat:
+    """Очередь и лимит одного чата"""
+    
+    __slots__ = ("pending", "bucket", "blocked_until", "busy")
+    
+    def __init__(self, bucket: TokenBucket):
+        self.pending: Deque[Union[Confirmation, _Text]] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+
+
+class MessageSender:
+    """
+    Планировщик sendMessage
+    
+    Вызовы send()/confirm() только ставят сообщение в очередь чата и сразу
+    возвращаются. Отдельная задача отправляет сообщения с учётом лимитов
+    Telegram (глобальный и на чат). Пока подтверждение ждёт своей очереди,
+    следующие подтверждения того же чата и категории добавляются к нему:
+    "Saved 14 files → Sprinter / 2026-10-17". На 429 выдерживается retry_after,
+    после сетевой ошибки или 5xx - пауза с удвоением (не больше max_retries раз).
+    """
+    
+    def __init__(
+        self,
+        config: dict,
+        api_client: TelegramApiClient,
+        timings: Optional[StageTimings] = None
+    ):
+        """
+        Инициализация отправителя
+        
+        Args:
+            config: Конфигурация приложения
+            api_client: Общий клиент Telegram API
+            timings: Счётчики этапов (сюда пишется confirm - от постановки до доставки)
+        """
+        self.logger = get_logger()
+        self.api = api_client
+        self.timings = timings or StageTimings()
+        
+        sender_config = config.get("sender", {})
+        self.global_rate = sender_config.get("global_rate", 30)
+        # --workers N: лимит бота общий, каждый процесс получает свою долю
+        self.global_rate /= max(1, config.get("server", {}).get("workers", 1))
+        self.chat_rate = sender_config.get("chat_rate", 1)
+        self.max_in_flight = max(1, sender_config.get("max_in_flight", 8))
+        self.max_pending = sender_config.get("max_pending", 10000)
+        self.max_retries = sender_config.get("max_retries", 5)
+        self.drain_timeout = sender_config.get("drain_timeout", 10)
+        
+        self._chats: "OrderedDict[int, _Chat]" = OrderedDict()
+        self._global: Optional[TokenBucket] = None
+        self._global_blocked_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        
+        # Вызывается с update_ids подтверждения, когда оно доставлено (или брошено)
+        self.on_delivered: Optional[Callable[[List[int]], None]] = None
+        
+        # Счётчики
+        self.pending = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.failed = 0
+    
+    async def start(self) -> None:
+        """Запустить задачу отправки"""
+        if self._task is not None:
+            return
+        
+        loop = asyncio.get_running_loop()
+        # Без запаса: равномерно, иначе за скользящую секунду выходит до 2x global_rate
+        self._global = TokenBucket(self.global_rate, 1, loop.time())
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="photosync-sender")
+    
+    async def stop(self) -> None:
+        """Дослать очередь (не дольше drain_timeout) и остановить отправку"""
+        if self._task is None:
+            return
+        
+        deadline = time.monotonic() + self.drain_timeout
+        while (self.pending or self._deliveries) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.pending:
+            self.logger.warning(f"Message sender stopped with {self.pending} unsent messages")
+        
+        self._task.cancel()
+        await asyncio.gather(self._task, *self._deliveries, return_exceptions=True)
+        self._task = None
+    
+    def send(self, chat_id: int, text: str) -> None:
+        """Поставить обычное сообщение в очередь чата"""
+        self._enqueue(chat_id, _Text(text))
+    
+    def confirm(
+        self,
+        chat_id: int,
+        category: str,
+        date: str,
+        saved: int = 1,
+        duplicates: int = 0,
+        failed: int = 0,
+        update_ids: Optional[List[int]] = None
+    ) -> None:
+        """
+        Поставить подтверждение сохранения (склеивается с ещё не отправленным)
+        
+        Args:
+            chat_id: ID чата
+            category: Категория
+            date: Дата (папка YYYY-MM-DD)
+            saved: Сохранено файлов
+            duplicates: Уже были сохранены
+            failed: Не удалось сохранить
+            update_ids: updates, которые закрывает подтверждение
+        """
+        chat = self._chats.get(chat_id)
+        if chat is not None and chat.pending:
+            last = chat.pending[-1]
+            if isinstance(last, Confirmation) and last.category == category and last.date == date:
+                last.saved += saved
+                last.duplicates += duplicates
+                last.failed += failed
+                if update_ids:
+                    last.update_ids.extend(update_ids)
+                self.coalesced += 1
+                return
+        
+        self._enqueue(chat_id, Confirmation(category, date, saved, duplicates, failed, list(update_ids or ())))
+    
+    def _enqueue(self, chat_id: int, item: Union[Confirmation, _Text]) -> None:
+        """Добавить сообщение в очередь чата и разбудить отправку"""
+        if self.pending >= self.max_pending:
+            self.dropped += 1
+            self.logger.warning(f"Outgoing queue full ({self.max_pending}), message to {chat_id} dropped")
+            # Брошенное подтверждение тоже закрывает updates, иначе их доиграет рестарт
+            self._finished(item)
+            return
+        
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            now = asyncio.get_running_loop().time()
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, 1, now))
+        
+        chat.pending.append(item)
+        self.pending += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def _next_chat(self, now: float):
+        """
+        Следующий чат, которому можно отправить (по кругу)
+        
+        Returns:
+            Tuple[chat_id или None, через сколько секунд проверить снова или None]
+        """
+        wait = None
+        idle = []
+        found = None
+        
+        for chat_id, chat in self._chats.items():
+            if chat.busy:
+                continue
+            ready_in = max(chat.bucket.delay(now), chat.blocked_until - now)
+            if not chat.pending:
+                # Лимит чата восстановился полностью - запись больше не нужна
+                if ready_in <= 0:
+                    idle.append(chat_id)
+                continue
+            if ready_in <= 0:
+                found = chat_id
+                break
+            wait = ready_in if wait is None else min(wait, ready_in)
+        
+        for chat_id in idle:
+            del self._chats[chat_id]
+        
+        if found is not None:
+            return found, None
+        if wait is None and self._chats:
+            # Остались только чаты, ожидающие восстановления лимита
+            wait = 1 / self.chat_rate
+        return None, wait
+    
+    async def _run(self) -> None:
+        """Цикл отправки"""
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        
+        while True:
+            now = loop.time()
+            
+            # Глобальный flood wait или нет глобального токена
+            global_wait = max(self._global.delay(now), self._global_blocked_until - now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            
+            chat_id, wait = self._next_chat(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await in_flight.acquire()
+            now = loop.time()
+            chat = self._chats[chat_id]
+            self._chats.move_to_end(chat_id)
+            self._global.consume(now)
+            chat.bucket.consume(now)
+            chat.busy = True
+            
+            item = chat.pending.popleft()
+            self.pending -= 1
+            task = asyncio.create_task(self._deliver(chat_id, chat, item, in_flight))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+    
+    async def _deliver(
+        self,
+        chat_id: int,
+        chat: _Chat,
+        item: Union[Confirmation, _Text],
+        in_flight: asyncio.Semaphore
+    ) -> None:
+        """Отправить одно сообщение; при 429 и временной ошибке вернуть его в начало очереди чата"""
+        # Своя задача - трассировку можно продолжить, не затрагивая другие
+        self.logger.set_trace(item.trace)
+        try:
+            posted_at = time.perf_counter()
+            outcome, retry_after = await self._post(chat_id, item.render())
+            
+            if outcome == DELIVERED:
+                self.sent += 1
+                # confirm - от постановки в очередь, send_message - сам вызов Bot API
+                self.timings.record("confirm", time.perf_counter() - item.queued_at)
+                self.timings.record("send_message", time.perf_counter() - posted_at)
+            elif outcome == RETRY and item.attempts < self.max_retries:
+                if retry_after is None:
+                    retry_after = min(2 ** item.attempts, MAX_BACKOFF)
+                item.attempts += 1
+                chat.pending.appendleft(item)
+                self.pending += 1
+                chat.blocked_until = asyncio.get_running_loop().time() + retry_after
+                return
+            else:
+                self.failed += 1
+                if outcome == RETRY:
+                    self.logger.warning(f"Message to {chat_id} dropped after {item.attempts} retries")
+                self.logger.event("confirm", result="failed", attempts=item.attempts)
+            
+            self._finished(item)
+        finally:
+            chat.busy = False
+            in_flight.release()
+            self._wakeup.set()
+    
+    def _finished(self, item: Union[Confirmation, _Text]) -> None:
+        """Подтверждение доставлено или брошено: on_delivered с его updates"""
+        if self.on_delivered is not None and isinstance(item, Confirmation) and item.update_ids:
+            self.on_delivered(item.update_ids)
+    
+    async def _post(self, chat_id: int, text: str) -> Tuple[str, Optional[float]]:
+        """
+        POST sendMessage
+        
+        Returns:
+            Tuple[DELIVERED / RETRY / FAILED, retry_after в секундах (429) или None]
+        """
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML"
+        }
+        
+        try:
+            async with self.api.session.post(self.api.method_url("sendMessage"), json=payload) as resp:
+                if resp.status == 200:
+                    return DELIVERED, None
+                
+                if resp.status == 429:
+                    try:
+                        data = self.api.codec.loads(await resp.read())
+                        retry_after = float(data.get("parameters", {}).get("retry_after", 1))
+                    except (ValueError, TypeError, AttributeError):
+                        # Ответ не JSON (прокси, балансировщик) - всё равно flood wait
+                        retry_after = 1.0
+                    self.rate_limited += 1
+                    self.logger.warning(f"sendMessage rate limited for chat {chat_id}, retry after {retry_after}s")
+                    
+                    # Flood wait касается всего бота: придерживаем и остальные чаты
+                    self._global_blocked_until = asyncio.get_running_loop().time() + retry_after
+                    return RETRY, retry_after
+                
+                self.logger.warning(f"Failed to send message: {resp.status}")
+                # 5xx - сбой на стороне Telegram, 4xx (чат не найден, бот заблокирован) повтор не исправит
+                return (RETRY if resp.status >= 500 else FAILED), None
+                
+        except asyncio.CancelledError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Send message error (will retry): {e!r}")
+            return RETRY, None
+        except Exception as e:
+            self.logger.warning(f"Send message error: {e}")
+            return FAILED, None
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "pending": self.pending,
+            "chats": len(self._chats),
+            "in_flight": len(self._deliveries),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+def create_message_sender(
+    config: dict,
+    api_client: TelegramApiClient,
+    timings: Optional[StageTimings] = None
+) -> MessageSender:
+    """
+    Фабричная функция для создания MessageSender
+    
+    Args:
+        config: Конфигурация приложения
+        api_client: Общий клиент Telegram API
+        timings: Счётчики этапов
+    
+    Returns:
+        Экземпляр MessageSender
+    """
+    return MessageSender(config, api_client, timings)
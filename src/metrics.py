@@ -0,0 +1,307 @@
+"""
+SOLAR PhotoSync v1.2.0 - Metrics Module
+Лёгкие счётчики времени выполнения этапов обработки и экспорт в формате Prometheus
+"""
+
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+from logger import get_logger
+
+
+# Границы бакетов гистограмм (секунды / байт в секунду)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = tuple(float(64 * 1024 * 4 ** i) for i in range(8))  # 64 KB/s .. 1 GB/s
+
+
+class LatencyWindow:
+    """Скользящее окно последних замеров для расчёта перцентилей"""
+    
+    def __init__(self, size: int = 1024):
+        """
+        Args:
+            size: Сколько последних замеров хранить для перцентилей
+        """
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds: float) -> None:
+        """Добавить замер (в секундах)"""
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, q: float) -> float:
+        """
+        Перцентиль по окну последних замеров
+        
+        Args:
+            q: Доля от 0 до 1 (0.95 = p95)
+        
+        Returns:
+            Значение в секундах (0.0 если замеров нет)
+        """
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+    
+    def snapshot(self) -> dict:
+        """Сводка в миллисекундах для /stats"""
+        if not self._samples:
+            return {"count": self.count}
+        
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        
+        def pick(q: float) -> float:
+            return round(ordered[min(last, int(q * len(ordered)))] * 1000, 2)
+        
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2),
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(self.max * 1000, 2)
+        }
+
+
+class Counter:
+    """Счётчик одной серии (только растёт)"""
+    
+    __slots__ = ("value",)
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """
+    Гистограмма одной серии: бакеты выделяются при создании, observe - один
+    bisect и одно сложение. Блокировок нет: всё пишется из одного event loop.
+    """
+    
+    __slots__ = ("bounds", "counts", "sum", "count")
+    
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        # Последний бакет - +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricFamily:
+    """Метрика с метками: серии создаются один раз на набор значений меток"""
+    
+    def __init__(self, name: str, help_text: str, kind: str, labels: Sequence[str], factory: Callable):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(labels)
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+    
+    def labels(self, *values: str):
+        """Серия для значений меток (в порядке label_names)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._factory()
+        return child
+    
+    def series(self) -> Iterable[Tuple[Tuple[str, ...], object]]:
+        return list(self._children.items())
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса и рендер в текстовый формат Prometheus (0.0.4).
+    
+    Счётчики и гистограммы обновляются на горячем пути; gauge вычисляются
+    функциями в момент запроса /metrics.
+    """
+    
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._gauges: Dict[str, Tuple[str, Tuple[str, ...], Callable]] = {}
+        self._const_labels = ""
+    
+    def set_const_labels(self, labels: Dict[str, str]) -> None:
+        """Метки, добавляемые ко всем сериям (например номер воркера)"""
+        self._const_labels = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> MetricFamily:
+        """Зарегистрировать счётчик (имя с суффиксом _total) или вернуть уже зарегистрированный"""
+        return self._family(name, help_text, "counter", labels, Counter)
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> MetricFamily:
+        """Зарегистрировать гистограмму (или вернуть уже зарегистрированную)"""
+        return self._family(name, help_text, "histogram", labels, lambda: Histogram(buckets))
+    
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+        labels: Sequence[str] = ()
+    ) -> None:
+        """
+        Зарегистрировать gauge, значения которого читаются при запросе
+        
+        Args:
+            name: Имя метрики
+            help_text: Описание
+            collect: Функция, возвращающая [(значения меток, значение), ...]
+            labels: Имена меток
+        """
+        self._gauges[name] = (help_text, tuple(labels), collect)
+    
+    def _family(self, name: str, help_text: str, kind: str, labels: Sequence[str], factory: Callable) -> MetricFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = MetricFamily(name, help_text, kind, labels, factory)
+        return family
+    
+    def _labels(self, names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+        parts = [f'{key}="{_escape(value)}"' for key, value in zip(names, values)]
+        if self._const_labels:
+            parts.append(self._const_labels)
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+    
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines: List[str] = []
+        
+        for family in self._families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, child in family.series():
+                if family.kind == "counter":
+                    lines.append(f"{family.name}{self._labels(family.label_names, values)} {child.value}")
+                    continue
+                
+                cumulative = 0
+                for bound, count in zip(child.bounds, child.counts):
+                    cumulative += count
+                    le = self._labels(family.label_names, values, f'le="{bound}"')
+                    lines.append(f"{family.name}_bucket{le} {cumulative}")
+                le = self._labels(family.label_names, values, 'le="+Inf"')
+                lines.append(f"{family.name}_bucket{le} {child.count}")
+                labels = self._labels(family.label_names, values)
+                lines.append(f"{family.name}_sum{labels} {child.sum}")
+                lines.append(f"{family.name}_count{labels} {child.count}")
+        
+        for name, (help_text, label_names, collect) in self._gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for values, value in collect():
+                lines.append(f"{name}{self._labels(label_names, values)} {float(value)}")
+        
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _escape(value) -> str:
+    """Экранирование значения метки"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Глобальный реестр процесса (в режиме --workers у каждого воркера свой)
+registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """Получить реестр метрик"""
+    return registry
+
+
+def stage_histogram(stage: str) -> Histogram:
+    """Серия photosync_stage_duration_seconds{stage=...}"""
+    return registry.histogram(
+        "photosync_stage_duration_seconds",
+        "Duration of processing stages",
+        ("stage",)
+    ).labels(stage)
+
+
+class StageTimings:
+    """
+    Время выполнения по этапам обработки (download, classify, save, ...):
+    окно последних замеров для /stats, гистограмма для /metrics и событие
+    в структурный лог (с trace ID текущего update)
+    """
+    
+    # Этапы, события которых пишутся только для выборки updates (debug_sample_rate)
+    DEBUG_STAGES = {"queue_wait", "classify", "send_message"}
+    
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.logger = get_logger()
+        self._stages: Dict[str, Tuple[LatencyWindow, Histogram]] = {}
+    
+    def record(self, stage: str, seconds: float, **fields) -> None:
+        """
+        Записать длительность этапа
+        
+        Args:
+            stage: Этап
+            seconds: Длительность
+            **fields: Поля события (result, size, ...)
+        """
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages[stage] = (LatencyWindow(self.window), stage_histogram(stage))
+        stats[0].observe(seconds)
+        stats[1].observe(seconds)
+        self.logger.event(stage, seconds, debug=stage in self.DEBUG_STAGES, **fields)
+    
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        Замерить блок кода
+        
+        Блок получает словарь полей события: результат и размер можно
+        дописать внутри. Исключение записывается как result=error.
+        
+        Example:
+            with timings.measure("download") as span:
+                saved = await download()
+                span["size"] = saved["size"]
+        """
+        started = time.perf_counter()
+        span = {}
+        try:
+            yield span
+        except BaseException:
+            span["result"] = "error"
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, **span)
+    
+    def snapshot(self) -> dict:
+        """Сводка по всем этапам"""
+        return {stage: stats[0].snapshot() for stage, stats in self._stages.items()}
@@ -0,0 +1,190 @@
+"""
+SOLAR PhotoSync v1.2.0 - Models Module
+Компактные модели update / сообщения / медиафайла (__slots__), разбираются один раз на update
+"""
+
+from datetime import datetime
+from typing import Optional
+
+
+class MediaFile:
+    """Медиафайл сообщения (самый большой размер для фото)"""
+    
+    __slots__ = ("file_id", "file_unique_id", "file_name", "type", "file_size", "mime_type")
+    
+    def __init__(
+        self,
+        file_id: str,
+        file_unique_id: Optional[str],
+        file_name: str,
+        type: str,
+        file_size: int = 0,
+        mime_type: str = ""
+    ):
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.file_name = file_name
+        self.type = type
+        self.file_size = file_size
+        self.mime_type = mime_type
+
+
+# Поля медиа в порядке проверки: (поле, тип, имя по умолчанию или None - всегда по умолчанию).
+# {stamp} - время получения update. Анимация приходит и с полем document,
+# поэтому document проверяется раньше (как и раньше сохраняется документом).
+MEDIA_FIELDS = (
+    ("document", "document", "document"),
+    ("video", "video", "video_{stamp}.mp4"),
+    ("animation", "animation", "animation_{stamp}.gif"),
+    ("audio", "audio", "audio_{stamp}.mp3"),
+    ("voice", "voice", None),
+    ("video_note", "video_note", None),
+)
+
+# Имена, которые Telegram не передаёт
+FIXED_NAMES = {
+    "photo": "photo_{stamp}.jpg",
+    "voice": "voice_{stamp}.ogg",
+    "video_note": "video_note_{stamp}.mp4",
+}
+
+
+class Message:
+    """Сообщение Telegram: только поля, которые нужны маршрутизации и сохранению"""
+    
+    __slots__ = (
+        "message_id", "chat_id", "chat_title", "user_id", "text", "caption",
+        "media_group_id", "date", "media", "received_at", "update_id", "_stamp"
+    )
+    
+    def __init__(
+        self,
+        message_id: int,
+        chat_id: Optional[int],
+        chat_title: str,
+        user_id: Optional[int],
+        text: str,
+        caption: str,
+        media_group_id: Optional[str],
+        date: int,
+        received_at: datetime
+    ):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.chat_title = chat_title
+        self.user_id = user_id
+        self.text = text
+        self.caption = caption
+        self.media_group_id = media_group_id
+        self.date = date
+        self.media: Optional[MediaFile] = None
+        self.received_at = received_at
+        # update, в котором пришло сообщение (участники альбома закрываются в журнале приёма)
+        self.update_id: Optional[int] = None
+        self._stamp: Optional[str] = None
+    
+    @property
+    def stamp(self) -> str:
+        """Время получения для имён по умолчанию (форматируется один раз)"""
+        if self._stamp is None:
+            self._stamp = self.received_at.strftime("%Y%m%d_%H%M%S")
+        return self._stamp
+    
+    @property
+    def save_date(self) -> datetime:
+        """Дата сохранения: одна и та же для имени файла, папки даты и подтверждения"""
+        return self.received_at
+    
+    @classmethod
+    def from_dict(cls, data: dict, received_at: datetime) -> "Message":
+        """
+        Разобрать объект сообщения Telegram
+        
+        Args:
+            data: message из update
+            received_at: Время получения update
+        
+        Returns:
+            Message (media - None, если файла нет)
+        """
+        chat = data.get("chat") or {}
+        sender = data.get("from") or {}
+        chat_id = chat.get("id")
+        
+        message = cls(
+            message_id=data.get("message_id", 0),
+            chat_id=chat_id,
+            chat_title=chat.get("title", ""),
+            user_id=sender.get("id", chat_id),
+            text=data.get("text", ""),
+            caption=data.get("caption", ""),
+            media_group_id=data.get("media_group_id"),
+            date=data.get("date", 0),
+            received_at=received_at
+        )
+        message.media = message._extract_media(data)
+        return message
+    
+    def _extract_media(self, data: dict) -> Optional[MediaFile]:
+        """Найти медиафайл сообщения"""
+        photos = data.get("photo")
+        if photos:
+            photo = photos[-1]
+            return MediaFile(
+                photo["file_id"],
+                photo.get("file_unique_id"),
+                FIXED_NAMES["photo"].format(stamp=self.stamp),
+                "photo",
+                photo.get("file_size", 0)
+            )
+        
+        for field, media_type, default_name in MEDIA_FIELDS:
+            media = data.get(field)
+            if media is None:
+                continue
+            
+            if default_name is None:
+                file_name = FIXED_NAMES[media_type].format(stamp=self.stamp)
+            else:
+                file_name = media.get("file_name") or default_name.format(stamp=self.stamp)
+            
+            return MediaFile(
+                media["file_id"],
+                media.get("file_unique_id"),
+                file_name,
+                media_type,
+                media.get("file_size", 0),
+                media.get("mime_type", "")
+            )
+        
+        return None
+
+
+class Update:
+    """Update Telegram с разобранным сообщением"""
+    
+    __slots__ = ("update_id", "message")
+    
+    def __init__(self, update_id: int, message: Optional[Message]):
+        self.update_id = update_id
+        self.message = message
+    
+    @classmethod
+    def from_dict(cls, data: dict, received_at: Optional[datetime] = None) -> "Update":
+        """
+        Разобрать update (один datetime.now() на update)
+        
+        Args:
+            data: JSON объект update
+            received_at: Время получения (по умолчанию - сейчас)
+        
+        Returns:
+            Update (message - None для пустых updates)
+        """
+        update_id = data.get("update_id", 0)
+        message = data.get("message")
+        if not message:
+            return cls(update_id, None)
+        parsed = Message.from_dict(message, received_at or datetime.now())
+        parsed.update_id = update_id
+        return cls(update_id, parsed)
@@ -0,0 +1,300 @@
+"""
+SOLAR PhotoSync v1.2.0 - Update Poller Module
+Long polling getUpdates (режим --mode polling): для серверов за NAT и догонки после простоя
+"""
+
+import os
+import json
+import time
+import asyncio
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from logger import get_logger
+from metrics import StageTimings
+from job_queue import JobQueue
+from state_store import get_state_path
+from telegram_api import TelegramApiClient
+
+
+class UpdatePoller:
+    """
+    Цикл getUpdates с конвейером: следующая пачка запрашивается, пока
+    воркеры обрабатывают текущую.
+    
+    getUpdates с offset=N подтверждает Telegram все updates < N, поэтому
+    перед запросом следующей пачки полученные, но ещё не обработанные updates
+    записываются в poll_state.json. После рестарта они обрабатываются первыми,
+    затем опрос продолжается с сохранённого offset. Участники альбома
+    считаются необработанными, пока альбом не сохранён (finished).
+    """
+    
+    STATE_FILE = "poll_state.json"
+    
+    def __init__(
+        self,
+        config: dict,
+        api_client: TelegramApiClient,
+        handler: Callable[[dict], Awaitable[Any]],
+        timings: Optional[StageTimings] = None
+    ):
+        """
+        Инициализация поллера
+        
+        Args:
+            config: Конфигурация приложения
+            api_client: Общий клиент Telegram API
+            handler: Корутина обработки одного update (WebhookHandler.handle_update)
+            timings: Общие счётчики этапов
+        """
+        self.logger = get_logger()
+        self.api = api_client
+        self.handler = handler
+        
+        polling_config = config.get("polling", {})
+        self.timeout = polling_config.get("timeout", 30)
+        self.limit = polling_config.get("limit", 100)
+        self.allowed_updates = polling_config.get("allowed_updates", ["message"])
+        self.delete_webhook = polling_config.get("delete_webhook", True)
+        self.state_interval = polling_config.get("state_interval", 1.0)
+        
+        # Пул воркеров - та же очередь, что и у webhook (ограниченная, с backpressure)
+        self.queue = JobQueue(config, self._process, timings)
+        
+        self.state_path = get_state_path(config) / self.STATE_FILE
+        self.offset = 0
+        self._in_flight: Dict[int, dict] = {}
+        self._last_save = 0.0
+        self._task: Optional[asyncio.Task] = None
+        
+        # Запись состояния идёт в потоке; замок держит порядок снимков на диске
+        self._save_lock = asyncio.Lock()
+        self._save_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        
+        # Счётчики
+        self.fetched = 0
+        self.batches = 0
+        self.errors = 0
+    
+    async def start(self) -> None:
+        """Запустить воркеры и цикл опроса"""
+        if self._task is not None:
+            return
+        
+        pending = self._load_state()
+        await self.queue.start()
+        
+        if self.delete_webhook:
+            await self._call("deleteWebhook", {"drop_pending_updates": False})
+        
+        # Недообработанные до остановки updates - первыми
+        if pending:
+            self.logger.info(f"Resuming {len(pending)} unprocessed updates from {self.state_path.name}")
+            for update in pending:
+                await self.queue.put(update)
+        
+        self._task = asyncio.create_task(self._run(), name="photosync-poller")
+        self.logger.info(f"Polling started (offset {self.offset}, timeout {self.timeout}s)")
+    
+    async def stop(self) -> None:
+        """Остановить опрос, дообработать очередь и сохранить состояние"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        await self.queue.stop()
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+        await self._save_state()
+        self.logger.info(f"Polling stopped (offset {self.offset}, unprocessed {len(self._in_flight)})")
+    
+    async def _run(self) -> None:
+        """Цикл getUpdates"""
+        backoff = 1
+        
+        while True:
+            updates = await self._fetch()
+            if updates is None:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            
+            if not updates:
+                continue
+            
+            self.batches += 1
+            self.fetched += len(updates)
+            for update in updates:
+                self._in_flight[update["update_id"]] = update
+            self.offset = updates[-1]["update_id"] + 1
+            
+            # Сначала на диск, потом следующий getUpdates подтвердит пачку Telegram
+            await self._save_state()
+            
+            # put ждёт места в очереди: при перегрузке воркеров опрос притормаживает
+            for update in updates:
+                await self.queue.put(update)
+    
+    async def _fetch(self) -> Optional[List[dict]]:
+        """
+        Один long polling запрос
+        
+        Returns:
+            Список updates (может быть пустым) или None при ошибке
+        """
+        data = await self._call("getUpdates", {
+            "offset": self.offset,
+            "limit": self.limit,
+            "timeout": self.timeout,
+            "allowed_updates": self.allowed_updates
+        })
+        if data is None:
+            return None
+        return data.get("result", [])
+    
+    async def _call(self, method: str, payload: dict) -> Optional[dict]:
+        """Вызов метода Bot API (ошибки логируются, результат None)"""
+        try:
+            async with self.api.session.post(self.api.method_url(method), json=payload) as resp:
+                body = await resp.read()
+                if method == "getUpdates":
+                    data = self.api.codec.decode_updates(body)
+                else:
+                    data = self.api.codec.loads(body)
+                
+                if resp.status == 429:
+                    retry_after = data.get("parameters", {}).get("retry_after", 1)
+                    self.logger.warning(f"{method} rate limited, retry after {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    return {"ok": True, "result": []}
+                
+                if resp.status != 200 or not data.get("ok"):
+                    self.errors += 1
+                    self.logger.error(f"{method} failed: {resp.status} {data.get('description', '')}")
+                    return None
+                
+                return data
+                
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"{method} error: {e}")
+            return None
+    
+    async def _process(self, update: dict) -> None:
+        """Обработка update воркером и отметка о завершении"""
+        result = None
+        try:
+            result = await self.handler(update)
+        finally:
+            # Участник альбома только поставлен в очередь - его отпустит finished
+            if not (isinstance(result, dict) and result.get("message") == "album_member"):
+                self.finished([update.get("update_id")])
+    
+    def finished(self, update_ids: List[int]) -> None:
+        """
+        Updates обработаны: убрать из необработанных (WebhookHandler.on_album_done)
+        
+        Состояние записывается в фоне не чаще раза в state_interval.
+        
+        Args:
+            update_ids: ID updates
+        """
+        for update_id in update_ids:
+            self._in_flight.pop(update_id, None)
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+    
+    async def _save_later(self) -> None:
+        """Записать состояние, выдержав state_interval с прошлой записи"""
+        while self._dirty:
+            delay = self._last_save + self.state_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._save_state()
+    
+    def _load_state(self) -> List[dict]:
+        """Прочитать offset и необработанные updates"""
+        if not self.state_path.exists():
+            return []
+        
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to read {self.state_path}: {e}")
+            return []
+        
+        self.offset = state.get("offset", 0)
+        pending = state.get("pending", [])
+        for update in pending:
+            self._in_flight[update["update_id"]] = update
+        return pending
+    
+    async def _save_state(self) -> None:
+        """Снимок offset и необработанных updates в event loop, запись - в потоке"""
+        async with self._save_lock:
+            self._dirty = False
+            self._last_save = time.monotonic()
+            state = {
+                "offset": self.offset,
+                "pending": sorted(self._in_flight.values(), key=lambda u: u["update_id"])
+            }
+            write = asyncio.ensure_future(asyncio.to_thread(self._write_state, state))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # Поток всё равно допишет файл: замок отпускаем только после него
+                await write
+                raise
+    
+    def _write_state(self, state: dict) -> None:
+        """Атомарно записать состояние (tmp + fsync + rename)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            self.logger.error(f"Failed to save poll state: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "offset": self.offset,
+            "fetched": self.fetched,
+            "batches": self.batches,
+            "unprocessed": len(self._in_flight),
+            "errors": self.errors,
+            "queue": self.queue.get_stats()
+        }
+
+
+def create_poller(
+    config: dict,
+    api_client: TelegramApiClient,
+    handler: Callable[[dict], Awaitable[Any]],
+    timings: Optional[StageTimings] = None
+) -> UpdatePoller:
+    """
+    Фабричная функция для создания UpdatePoller
+    
+    Args:
+        config: Конфигурация приложения
+        api_client: Общий клиент Telegram API
+        handler: Корутина обработки одного update
+        timings: Общие счётчики этапов
+    
+    Returns:
+        Экземпляр UpdatePoller
+    """
+    return UpdatePoller(config, api_client, handler, timings)
@@ -0,0 +1,52 @@
+"""
+SOLAR PhotoSync v1.2.0 - State Store Module
+Общее расположение и настройка SQLite баз состояния (индексы, кэши)
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+# Директория состояния по умолчанию (внутри root_path, скрыта от статистики)
+DEFAULT_STATE_DIR = ".photosync"
+
+
+def get_state_path(config: dict) -> Path:
+    """
+    Директория для файлов состояния
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        state.path из конфига или root_path/.photosync
+    """
+    state_path = config.get("state", {}).get("path")
+    if not state_path:
+        root_path = config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync")
+        state_path = Path(root_path) / DEFAULT_STATE_DIR
+    
+    state_path = Path(state_path)
+    state_path.mkdir(parents=True, exist_ok=True)
+    return state_path
+
+
+def connect(config: dict, name: str) -> sqlite3.Connection:
+    """
+    Открыть SQLite базу состояния в режиме WAL
+    
+    WAL + synchronous=NORMAL: коммит не делает fsync (только checkpoint),
+    читатели не блокируют писателя, базу можно открыть из нескольких процессов.
+    
+    Args:
+        config: Конфигурация приложения
+        name: Имя файла базы (например dedup.sqlite3)
+    
+    Returns:
+        Соединение sqlite3
+    """
+    db_path = get_state_path(config) / name
+    conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
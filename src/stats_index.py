@@ -0,0 +1,351 @@
+"""
+SOLAR PhotoSync v1.2.0 - Stats Index Module
+Инкрементальные счётчики хранилища (дата / категория / тип) вместо обхода дерева на /stats
+"""
+
+import os
+import asyncio
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from logger import get_logger
+from state_store import connect
+from dedup_index import iter_media_files
+
+
+# Тип файла по расширению (всё остальное - document)
+KINDS = {
+    "photo": {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif"},
+    "video": {".mp4", ".mov", ".avi", ".mkv"},
+    "audio": {".mp3", ".wav", ".ogg", ".oga", ".m4a"}
+}
+
+# Сколько последних дат отдаёт /stats (всего дат - в date_count)
+RECENT_DATES = 30
+
+
+def file_kind(path: Path) -> str:
+    """Тип файла по расширению: photo, video, audio или document"""
+    extension = path.suffix.lower()
+    for kind, extensions in KINDS.items():
+        if extension in extensions:
+            return kind
+    return "document"
+
+
+class StatsIndex:
+    """
+    Счётчики файлов и байт по (дата, категория, тип) в SQLite, обновляются при каждом сохранении.
+    
+    Рядом - итоги по (категория, тип) и таблица дат с их числом в meta:
+    /stats читает их, а не все даты.
+    """
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация индекса
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        self.root_path = Path(config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync"))
+        
+        stats_config = config.get("stats", {})
+        self.enabled = stats_config.get("enabled", True)
+        self.reconcile_interval = stats_config.get("reconcile_interval_hours", 24) * 3600
+        
+        # Соединение используется и из event loop, и из потока сверки
+        self._lock = threading.Lock()
+        self.conn = connect(config, "stats.sqlite3")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " date TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " files INTEGER NOT NULL,"
+            " bytes INTEGER NOT NULL,"
+            " PRIMARY KEY (date, category, kind)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals ("
+            " category TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " files INTEGER NOT NULL,"
+            " bytes INTEGER NOT NULL,"
+            " PRIMARY KEY (category, kind)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dates (date TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('date_count', 0)")
+        # Файлы, сохранённые во время сверки (любым процессом --workers):
+        # обход мог их не увидеть. Пишутся, только пока в meta есть 'reconciling'.
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recent (path TEXT PRIMARY KEY, size INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+    
+    async def start(self) -> None:
+        """
+        Первая сверка (если индекс ещё не строился) и периодическая сверка в фоне
+        
+        В режиме --workers вызывается только в воркере 0.
+        """
+        # Метка сверки, прерванной остановкой процесса
+        with self._lock:
+            self.conn.execute("DELETE FROM meta WHERE key = 'reconciling'")
+            self.conn.execute("DELETE FROM recent")
+            self.conn.commit()
+        
+        if self.reconciled_at() is None:
+            self.logger.info("Stats index is empty, reconciling in background")
+            self.reconcile_async()
+        
+        if self.reconcile_interval > 0:
+            self._loop_task = asyncio.create_task(self._reconcile_loop(), name="photosync-stats")
+    
+    async def stop(self) -> None:
+        """Остановить фоновую сверку"""
+        for task in (self._loop_task, self._reconcile_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._loop_task = None
+    
+    async def _reconcile_loop(self) -> None:
+        """Периодическая сверка с диском (ловит ручные удаления и перемещения)"""
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            self.reconcile_async()
+    
+    def record(self, path: Path, size: int) -> None:
+        """
+        Учесть новый файл хранилища
+        
+        Args:
+            path: Путь вида root/YYYY-MM-DD/Category/file
+            size: Размер в байтах
+        """
+        path = Path(path)
+        key = self._key(path)
+        if key is None:
+            return
+        
+        with self._lock:
+            self._add(key, 1, size)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recent (path, size)"
+                " SELECT ?, ? WHERE EXISTS (SELECT 1 FROM meta WHERE key = 'reconciling')",
+                (str(path), size)
+            )
+            self.conn.commit()
+    
+    def _key(self, path: Path) -> Optional[Tuple[str, str, str]]:
+        """(дата, категория, тип) для пути внутри root_path"""
+        try:
+            date, category, _ = path.relative_to(self.root_path).parts
+        except ValueError:
+            return None
+        return date, category, file_kind(path)
+    
+    def _add(self, key: Tuple[str, str, str], files: int, size: int) -> None:
+        """Прибавить к счётчику, итогу и дате (вызывается под self._lock)"""
+        self.conn.execute(
+            "INSERT INTO counters (date, category, kind, files, bytes) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (date, category, kind)"
+            " DO UPDATE SET files = files + excluded.files, bytes = bytes + excluded.bytes",
+            (*key, files, size)
+        )
+        self.conn.execute(
+            "INSERT INTO totals (category, kind, files, bytes) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (category, kind)"
+            " DO UPDATE SET files = files + excluded.files, bytes = bytes + excluded.bytes",
+            (*key[1:], files, size)
+        )
+        # Новую дату считает тот процесс, чья вставка прошла (запись сериализована)
+        if self.conn.execute("INSERT OR IGNORE INTO dates (date) VALUES (?)", (key[0],)).rowcount:
+            self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'date_count'")
+    
+    def reconcile_async(self) -> asyncio.Task:
+        """Запустить сверку в потоке (если она уже идёт - вернуть текущую)"""
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._run_reconcile())
+        return self._reconcile_task
+    
+    async def _run_reconcile(self) -> None:
+        """Сверка в потоке с логированием ошибок"""
+        try:
+            await asyncio.to_thread(self.reconcile)
+        except Exception as e:
+            self.logger.error(f"Stats index reconcile failed: {e}")
+    
+    def reconcile(self) -> Optional[Tuple[int, int]]:
+        """
+        Пересчитать счётчики обходом дерева и заменить ими текущие
+        
+        Обход идёт без блокировки; файлы, сохранённые во время обхода (таблица
+        recent) и не увиденные им, добавляются перед заменой. Сохранённые во
+        время обхода файлы узнаются по st_ctime (link и rename его обновляют).
+        
+        Returns:
+            Tuple[файлов, байт] или None, если сверку уже ведёт другой процесс
+        """
+        started = time.perf_counter()
+        walk_started = time.time() - 1
+        with self._lock:
+            claimed = self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('reconciling', ?)",
+                (str(os.getpid()),)
+            ).rowcount
+            self.conn.execute("DELETE FROM recent")
+            self.conn.commit()
+        
+        if not claimed:
+            self.logger.info("Stats index reconcile already running in another worker")
+            return None
+        
+        counters: Dict[Tuple[str, str, str], list] = {}
+        seen: Set[str] = set()
+        try:
+            if self.root_path.exists():
+                for file_path in iter_media_files(self.root_path):
+                    try:
+                        stat = file_path.stat()
+                    except OSError:
+                        continue
+                    key = self._key(file_path)
+                    if key is None:
+                        continue
+                    counter = counters.setdefault(key, [0, 0])
+                    counter[0] += 1
+                    counter[1] += stat.st_size
+                    if stat.st_ctime >= walk_started:
+                        seen.add(str(file_path))
+        except Exception:
+            with self._lock:
+                self.conn.execute("DELETE FROM meta WHERE key = 'reconciling'")
+                self.conn.commit()
+            raise
+        
+        with self._lock:
+            # Запись других процессов ждёт конца транзакции: recent не пополнится
+            # между чтением и заменой счётчиков
+            self.conn.execute("BEGIN IMMEDIATE")
+            for path, size in self.conn.execute("SELECT path, size FROM recent").fetchall():
+                if path not in seen:
+                    counter = counters.setdefault(self._key(Path(path)), [0, 0])
+                    counter[0] += 1
+                    counter[1] += size
+            
+            self.conn.execute("DELETE FROM recent")
+            self.conn.execute("DELETE FROM meta WHERE key = 'reconciling'")
+            self.conn.execute("DELETE FROM counters")
+            self.conn.executemany(
+                "INSERT INTO counters (date, category, kind, files, bytes) VALUES (?, ?, ?, ?, ?)",
+                [(*key, files, size) for key, (files, size) in counters.items()]
+            )
+            self.conn.execute("DELETE FROM totals")
+            self.conn.execute(
+                "INSERT INTO totals (category, kind, files, bytes)"
+                " SELECT category, kind, SUM(files), SUM(bytes) FROM counters GROUP BY category, kind"
+            )
+            self.conn.execute("DELETE FROM dates")
+            self.conn.execute("INSERT INTO dates (date) SELECT DISTINCT date FROM counters")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('date_count', (SELECT COUNT(*) FROM dates))"
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('reconciled_at', ?)",
+                (datetime.now().isoformat(timespec="seconds"),)
+            )
+            self.conn.commit()
+        
+        total_files = sum(files for files, _ in counters.values())
+        total_bytes = sum(size for _, size in counters.values())
+        self.logger.info(
+            f"Stats index reconciled: {total_files} files in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+        return total_files, total_bytes
+    
+    def reconciled_at(self) -> Optional[str]:
+        """Время последней сверки (ISO) или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'reconciled_at'"
+            ).fetchone()
+        return row[0] if row else None
+    
+    def snapshot(self) -> dict:
+        """
+        Статистика хранилища из итогов (формат FileSaver.get_storage_stats)
+        
+        Итоги - O(категорий × типов); из дат - последние RECENT_DATES, первая
+        (по первичному ключу) и их число из meta.
+        
+        Returns:
+            Словарь со статистикой
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT category, kind, files, bytes FROM totals").fetchall()
+            dates = [date for (date,) in self.conn.execute(
+                "SELECT date FROM dates ORDER BY date DESC LIMIT ?", (RECENT_DATES,)
+            )]
+            first_date = self.conn.execute("SELECT MIN(date) FROM dates").fetchone()[0]
+            meta = dict(self.conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('reconciled_at', 'reconciling', 'date_count')"
+            ).fetchall())
+        
+        stats = {
+            "root_path": str(self.root_path),
+            "total_files": 0,
+            "total_size_mb": 0,
+            "categories": {},
+            "kinds": {},
+            "dates": dates,
+            "date_count": int(meta.get("date_count", 0)),
+            "first_date": first_date
+        }
+        total_size = 0
+        
+        for category, kind, files, size in rows:
+            stats["total_files"] += files
+            stats["categories"][category] = stats["categories"].get(category, 0) + files
+            stats["kinds"][kind] = stats["kinds"].get(kind, 0) + files
+            total_size += size
+        
+        stats["total_size_mb"] = round(total_size / (1024 * 1024), 2)
+        stats["reconciled_at"] = meta.get("reconciled_at")
+        stats["reconciling"] = "reconciling" in meta
+        return stats
+    
+    def close(self) -> None:
+        """Закрыть соединение с базой"""
+        with self._lock:
+            self.conn.close()
+
+
+def create_stats_index(config: dict) -> StatsIndex:
+    """
+    Фабричная функция для создания StatsIndex
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр StatsIndex
+    """
+    return StatsIndex(config)
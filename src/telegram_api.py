@@ -0,0 +1,114 @@
+"""
+SOLAR PhotoSync v1.2.0 - Telegram API Client
+Общий HTTP-клиент Telegram Bot API с пулом соединений
+"""
+
+import aiohttp
+from typing import Optional
+from logger import get_logger
+from json_codec import JsonCodec
+
+
+class TelegramApiClient:
+    """Долгоживущая aiohttp-сессия для всего трафика к Telegram Bot API"""
+    
+    DEFAULT_API_URL = "https://api.telegram.org"
+    
+    def __init__(self, config: dict, codec: Optional[JsonCodec] = None):
+        """
+        Инициализация клиента
+        
+        Args:
+            config: Конфигурация приложения
+            codec: Общий JSON кодек (по умолчанию создаётся из конфига)
+        """
+        self.logger = get_logger()
+        self.codec = codec or JsonCodec(config)
+        
+        bot_config = config.get("bot", {})
+        self.bot_token = bot_config.get("token", "")
+        
+        # api_url можно переопределить (локальный Bot API сервер или заглушка для тестов)
+        api_url = (bot_config.get("api_url") or self.DEFAULT_API_URL).rstrip('/')
+        self.api_base = f"{api_url}/bot{self.bot_token}"
+        self.file_base = f"{api_url}/file/bot{self.bot_token}"
+        
+        # Параметры пула соединений
+        http_config = config.get("http", {})
+        self.pool_limit = http_config.get("pool_limit", 100)
+        self.limit_per_host = http_config.get("limit_per_host", 30)
+        self.keepalive_timeout = http_config.get("keepalive_timeout", 60)
+        self.dns_cache_ttl = http_config.get("dns_cache_ttl", 300)
+        self.request_timeout = http_config.get("request_timeout", 120)
+        self.verify_ssl = http_config.get("verify_ssl", True)
+        
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self) -> None:
+        """Создать сессию (вызывается при старте приложения)"""
+        if self._session is not None and not self._session.closed:
+            return
+        
+        self._session = self._create_session()
+        
+        self.logger.info(
+            f"Telegram API session started (pool: {self.pool_limit}, "
+            f"per host: {self.limit_per_host}, keep-alive: {self.keepalive_timeout}s)"
+        )
+    
+    async def close(self) -> None:
+        """Закрыть сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.logger.info("Telegram API session closed")
+        self._session = None
+    
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Общая сессия
+        
+        Если start() не вызывался (например, обработчик используется без веб-сервера),
+        сессия создаётся лениво при первом обращении.
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+    
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Создать сессию с настроенным пулом соединений"""
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            ssl=None if self.verify_ssl else False
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            json_serialize=self.codec.dumps_str
+        )
+    
+    def method_url(self, method: str) -> str:
+        """URL метода Bot API (getFile, sendMessage, ...)"""
+        return f"{self.api_base}/{method}"
+    
+    def file_url(self, file_path: str) -> str:
+        """URL для скачивания файла по file_path из getFile"""
+        return f"{self.file_base}/{file_path}"
+
+
+def create_api_client(config: dict, codec: Optional[JsonCodec] = None) -> TelegramApiClient:
+    """
+    Фабричная функция для создания TelegramApiClient
+    
+    Args:
+        config: Конфигурация приложения
+        codec: Общий JSON кодек
+    
+    Returns:
+        Экземпляр TelegramApiClient
+    """
+    return TelegramApiClient(config, codec)
@@ -0,0 +1,307 @@
+"""
+SOLAR PhotoSync v1.2.0 - Thumbnailer Module
+Миниатюры и превью сохранённых изображений в root_path/.thumbs (для просмотра архива из веб-интерфейса)
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+from logger import get_logger
+from metrics import LatencyWindow, stage_histogram
+
+
+def _init_thumbnail_worker():
+    """Инициализация процесса пула: HEIF opener, если установлен pillow-heif"""
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+    except ImportError:
+        pass
+
+
+def _is_fresh(path: str, mtime_ns: int) -> bool:
+    """Миниатюра есть и сделана из этой версии файла (mtime миниатюры = mtime исходника)"""
+    try:
+        return os.stat(path).st_mtime_ns == mtime_ns
+    except OSError:
+        return False
+
+
+def _render_thumbnails(source: str, targets: List[Tuple[int, str]], image_format: str, quality: int) -> Tuple[str, str]:
+    """
+    Сделать миниатюры одного файла (выполняется в процессе пула)
+    
+    Файл декодируется один раз: для JPEG draft() сразу декодирует в 1/2..1/8
+    размера (масштабирование DCT), затем миниатюры уменьшаются от большей к
+    меньшей. Миниатюре ставится mtime исходника - по нему проверяется кэш.
+    
+    Args:
+        source: Путь к изображению
+        targets: [(размер, путь миниатюры)]
+        image_format: WEBP или JPEG
+        quality: Качество сжатия
+    
+    Returns:
+        Tuple[status (generated / cached / failed), error_message]
+    """
+    try:
+        stat = os.stat(source)
+        missing = [(size, path) for size, path in targets if not _is_fresh(path, stat.st_mtime_ns)]
+        if not missing:
+            return "cached", ""
+        
+        from PIL import Image, ImageOps
+        
+        largest = max(size for size, _ in missing)
+        with Image.open(source) as img:
+            img.draft("RGB", (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            
+            if image_format == "JPEG" or not ("A" in img.mode or "transparency" in img.info):
+                mode = "RGB"
+            else:
+                mode = "RGBA"
+            if img.mode != mode:
+                img = img.convert(mode)
+            
+            for size, path in sorted(missing, reverse=True):
+                img.thumbnail((size, size), reducing_gap=2.0)
+                
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                try:
+                    img.save(tmp_path, image_format, quality=quality)
+                    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+        
+        return "generated", ""
+        
+    except Exception as e:
+        return "failed", str(e)
+
+
+class Thumbnailer:
+    """
+    Генерация миниатюр после сохранения файла.
+    
+    Миниатюры лежат в параллельном дереве: root/.thumbs/<размер>/YYYY-MM-DD/
+    Category/<имя файла>.webp. Работа идёт в пуле процессов; submit() не
+    блокирует вызывающего, а при переполнении очереди файл пропускается -
+    его догонит tools/build_thumbnails.py.
+    """
+    
+    THUMBS_DIR = ".thumbs"
+    IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+    HEIC_EXTENSIONS = {".heic", ".heif"}
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация генератора миниатюр
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        storage_config = config.get("storage", {})
+        self.root_path = Path(storage_config.get("root_path", "/SOLAR/PhotoSync"))
+        self.thumbs_path = self.root_path / self.THUMBS_DIR
+        
+        thumbs_config = config.get("thumbnails", {})
+        self.enabled = thumbs_config.get("enabled", True)
+        # Миниатюра для сетки и превью для просмотра (длинная сторона, px)
+        self.sizes = sorted(set(thumbs_config.get("sizes", [256, 1024])))
+        self.quality = thumbs_config.get("quality", 80)
+        self.workers = max(1, thumbs_config.get("workers", 2))
+        self.queue_limit = thumbs_config.get("queue_limit", 256)
+        image_format = thumbs_config.get("format", "webp").lower()
+        self.image_format = "WEBP"
+        self.suffix = ".webp"
+        self.content_type = "image/webp"
+        
+        self.extensions = set(self.IMAGE_EXTENSIONS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        
+        # Счётчики
+        self.generated = 0
+        self.cached = 0
+        self.failed = 0
+        self.rejected = 0
+        self.render_times = LatencyWindow()
+        self.render_histogram = stage_histogram("thumbnail")
+        
+        if not self.enabled:
+            return
+        
+        try:
+            from PIL import features
+        except ImportError:
+            self.logger.warning("Pillow is not installed, thumbnails disabled")
+            self.enabled = False
+            return
+        
+        if image_format == "webp" and not features.check("webp"):
+            self.logger.warning("Pillow is built without WebP, thumbnails will be JPEG")
+            image_format = "jpeg"
+        self.image_format = "WEBP" if image_format == "webp" else "JPEG"
+        self.suffix = ".webp" if image_format == "webp" else ".jpg"
+        self.content_type = "image/webp" if image_format == "webp" else "image/jpeg"
+        
+        try:
+            import pillow_heif
+            self.extensions |= self.HEIC_EXTENSIONS
+        except ImportError:
+            pass
+        
+        self.logger.info(f"Thumbnailer initialized. Sizes: {self.sizes}, format: {self.image_format}")
+    
+    def accepts(self, path: Path) -> bool:
+        """Делаются ли миниатюры для такого файла"""
+        return self.enabled and path.suffix.lower() in self.extensions
+    
+    def thumb_path(self, source: Path, size: int) -> Path:
+        """
+        Путь миниатюры файла хранилища
+        
+        Raises:
+            ValueError: Файл не внутри root_path
+        """
+        relative = Path(source).relative_to(self.root_path)
+        return self.thumbs_path / str(size) / relative.parent / (relative.name + self.suffix)
+    
+    def is_fresh(self, source: Path) -> bool:
+        """Все миниатюры файла уже сделаны из текущей версии (проверка без пула, для backfill)"""
+        try:
+            mtime_ns = os.stat(source).st_mtime_ns
+            return all(_is_fresh(str(self.thumb_path(source, size)), mtime_ns) for size in self.sizes)
+        except (OSError, ValueError):
+            return False
+    
+    def submit(self, source: Path) -> bool:
+        """
+        Поставить файл в очередь генерации (не блокирует)
+        
+        Args:
+            source: Сохранённый файл в root_path
+        
+        Returns:
+            False если файл не изображение или очередь переполнена
+        """
+        source = Path(source)
+        if not self.accepts(source):
+            return False
+        
+        try:
+            targets = [(size, str(self.thumb_path(source, size))) for size in self.sizes]
+        except ValueError:
+            return False
+        
+        with self._lock:
+            if self._in_flight >= self.queue_limit:
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+        
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(
+                _render_thumbnails, str(source), targets, self.image_format, self.quality
+            )
+        except Exception as e:
+            self._finish("failed", str(e), source, started)
+            return False
+        
+        future.add_done_callback(lambda f: self._done(f, source, started))
+        return True
+    
+    def _done(self, future: Future, source: Path, started: float) -> None:
+        """Результат из пула (вызывается в служебном потоке executor)"""
+        if future.cancelled():
+            # close() отбросил очередь
+            status, error = "cancelled", ""
+        else:
+            try:
+                status, error = future.result()
+            except Exception as e:
+                status, error = "failed", str(e) or type(e).__name__
+        self._finish(status, error, source, started)
+    
+    def _finish(self, status: str, error: str, source: Path, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._in_flight -= 1
+            if status == "generated":
+                self.generated += 1
+                self.render_times.observe(elapsed)
+                self.render_histogram.observe(elapsed)
+            elif status == "cached":
+                self.cached += 1
+            elif status == "failed":
+                self.failed += 1
+            self._idle.notify_all()
+        
+        if status == "failed":
+            self.logger.warning(f"Thumbnail failed for {source.name}: {error}")
+        elif status == "generated":
+            self.logger.event("thumbnail", elapsed, file=source.name, sizes=len(self.sizes))
+    
+    def wait(self, max_in_flight: int = 0) -> None:
+        """Дождаться, пока в очереди останется не больше max_in_flight файлов"""
+        with self._idle:
+            while self._in_flight > max_in_flight:
+                self._idle.wait()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Пул процессов (создаётся при первой миниатюре)"""
+        if self._executor is None:
+            # spawn: дочерние процессы не наследуют сокеты и event loop сервера
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_thumbnail_worker
+            )
+        return self._executor
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        stats = {
+            "enabled": self.enabled,
+            "sizes": self.sizes,
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "generated": self.generated,
+            "cached": self.cached,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+        stats.update(self.render_times.snapshot())
+        return stats
+    
+    def close(self) -> None:
+        """Остановить пул (очередь, не начатая к этому моменту, отбрасывается)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def create_thumbnailer(config: dict) -> Thumbnailer:
+    """
+    Фабричная функция для создания Thumbnailer
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр Thumbnailer
+    """
+    return Thumbnailer(config)
@@ -0,0 +1,377 @@
+"""
+SOLAR PhotoSync v1.2.0 - Update Journal Module
+Журнал обработанных update_id: повторная доставка Telegram не скачивает и не сохраняет файл заново
+"""
+
+import os
+import time
+import struct
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+from logger import get_logger
+from state_store import connect, get_state_path
+
+
+# Заголовок снимка: магия, размер окна, старший update_id
+SNAPSHOT_HEADER = struct.Struct("<4sIq")
+SNAPSHOT_MAGIC = b"PSUJ"
+
+
+class UpdateWindow:
+    """
+    Скользящее окно последних size update_id: кольцевой битовый массив.
+    
+    Бит update_id лежит в позиции update_id % size; когда старший id
+    растёт, позиции, которые переходят к новым id, обнуляются. Проверка и
+    отметка - O(1), память - size / 8 байт (64K updates = 8 KB). id ниже
+    окна не отмечаются и считаются неизвестными.
+    """
+    
+    __slots__ = ("size", "bits", "high")
+    
+    def __init__(self, size: int):
+        # Кратно 8: окно целиком в байтах
+        self.size = max(8, size - size % 8)
+        self.bits = bytearray(self.size // 8)
+        self.high = -1
+    
+    def __contains__(self, update_id: int) -> bool:
+        if update_id > self.high or update_id <= self.high - self.size:
+            return False
+        index = update_id % self.size
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+    
+    def add(self, update_id: int) -> None:
+        """Отметить update_id обработанным"""
+        if self.high < 0:
+            self.high = update_id
+        elif update_id > self.high:
+            # Скачок вперёд на size и больше (в т.ч. новая последовательность после
+            # недели без updates) обнуляет окно целиком
+            self._clear(self.high + 1, update_id)
+            self.high = update_id
+        elif update_id <= self.high - self.size:
+            # Ниже окна: его позицию занимает более новый id
+            return
+        
+        index = update_id % self.size
+        self.bits[index >> 3] |= 1 << (index & 7)
+    
+    def _clear(self, first: int, last: int) -> None:
+        """Обнулить позиции id first..last (их занимали id на size меньше)"""
+        if last - first + 1 >= self.size:
+            self.bits[:] = bytes(len(self.bits))
+            return
+        for update_id in range(first, last + 1):
+            index = update_id % self.size
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+    
+    def dump(self) -> bytes:
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.size, self.high) + bytes(self.bits)
+    
+    def load(self, data: bytes) -> bool:
+        """Восстановить из снимка (False - снимок другого размера или повреждён)"""
+        if len(data) != SNAPSHOT_HEADER.size + len(self.bits):
+            return False
+        magic, size, high = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or size != self.size:
+            return False
+        self.high = high
+        self.bits[:] = data[SNAPSHOT_HEADER.size:]
+        return True
+
+
+class UpdateJournal:
+    """
+    Идемпотентная обработка updates.
+    
+    - обработанные update_id хранятся в UpdateWindow, снимок пишется в
+      state/update_journal.bin не чаще snapshot_interval секунд;
+    - обрабатываемые сейчас - в словаре future: повторная доставка того же
+      update_id ждёт первую вместо второй загрузки;
+    - в режиме --workers повтор может прийти в другой процесс, поэтому
+      захват и отметка идут через общую SQLite базу, окно - локальный кэш.
+      Запросы к базе выполняет один поток журнала: event loop их не ждёт,
+      а порядок отметок и захватов сохраняется.
+    """
+    
+    SNAPSHOT_FILE = "update_journal.bin"
+    
+    def __init__(self, config: dict):
+        """
+        Инициализация журнала
+        
+        Args:
+            config: Конфигурация приложения
+        """
+        self.logger = get_logger()
+        
+        journal_config = config.get("update_journal", {})
+        self.enabled = journal_config.get("enabled", True)
+        self.snapshot_interval = journal_config.get("snapshot_interval", 5)
+        # Захват другого процесса старше этого считается брошенным (процесс упал)
+        self.stale_after = journal_config.get("stale_after_s", 600)
+        
+        self.window = UpdateWindow(journal_config.get("window", 65536))
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._dirty = False
+        self._last_snapshot = time.monotonic()
+        
+        # Счётчики
+        self.duplicates = 0
+        self.waited = 0
+        
+        self.snapshot_path: Optional[Path] = None
+        self.conn = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.shared = False
+        if not self.enabled:
+            return
+        
+        self.shared = config.get("server", {}).get("workers", 1) > 1
+        if self.shared:
+            self.conn = connect(config, "update_journal.sqlite3")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS updates ("
+                " update_id INTEGER PRIMARY KEY,"
+                " done INTEGER NOT NULL,"
+                " claimed_at REAL NOT NULL"
+                ")"
+            )
+            self.conn.commit()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="photosync-journal")
+        else:
+            self.snapshot_path = get_state_path(config) / self.SNAPSHOT_FILE
+            self._load()
+        
+        self.logger.info(f"Update journal: window {self.window.size} updates (shared: {self.shared})")
+    
+    def _load(self) -> None:
+        """Восстановить окно из снимка"""
+        try:
+            data = self.snapshot_path.read_bytes()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self.logger.warning(f"Update journal snapshot unreadable: {e}")
+            return
+        
+        if self.window.load(data):
+            self.logger.info(f"Update journal restored (last update_id {self.window.high})")
+        else:
+            self.logger.warning("Update journal snapshot does not match window size, starting empty")
+    
+    def is_done(self, update_id: Optional[int]) -> bool:
+        """
+        Уже обработан (O(1), без ожидания и без обращения к базе)
+        
+        Для быстрого ответа webhook на повторную доставку. Обрабатываемые
+        сейчас сюда не попадают: если первая обработка не удастся, повтор
+        должен обработать update сам, поэтому он ждёт в acquire.
+        """
+        if not self.enabled or update_id is None:
+            return False
+        return update_id in self.window
+    
+    async def acquire(self, update_id: Optional[int]) -> bool:
+        """
+        Захватить update для обработки
+        
+        Если тот же update_id сейчас обрабатывается, ждёт завершения: при
+        успехе это дубликат, при неудаче обработка достаётся ожидавшему.
+        
+        Args:
+            update_id: ID update
+        
+        Returns:
+            True - обрабатывать (после обработки вызвать release),
+            False - уже обработан
+        """
+        if not self.enabled or update_id is None:
+            return True
+        
+        while True:
+            if update_id in self.window:
+                self.duplicates += 1
+                return False
+            
+            pending = self._pending.get(update_id)
+            if pending is None:
+                break
+            
+            self.waited += 1
+            await asyncio.shield(pending)
+        
+        self._pending[update_id] = asyncio.get_running_loop().create_future()
+        
+        if self.shared:
+            try:
+                claimed = await self._claim_shared(update_id)
+            except BaseException:
+                self._resolve(update_id, False)
+                raise
+            if not claimed:
+                self.window.add(update_id)
+                self._resolve(update_id, True)
+                self.duplicates += 1
+                return False
+        
+        return True
+    
+    async def _claim_shared(self, update_id: int) -> bool:
+        """Захват в общей базе; ждёт, пока update обрабатывает другой процесс"""
+        loop = asyncio.get_running_loop()
+        waited = False
+        while True:
+            claimed = await loop.run_in_executor(self._executor, self._try_claim, update_id)
+            if claimed is not None:
+                return claimed
+            
+            if not waited:
+                waited = True
+                self.waited += 1
+            await asyncio.sleep(0.2)
+    
+    def _try_claim(self, update_id: int) -> Optional[bool]:
+        """
+        Одна попытка захвата (в потоке журнала)
+        
+        Returns:
+            True - захвачен, False - уже обработан, None - обрабатывается другим процессом
+        """
+        while True:
+            now = time.time()
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO updates (update_id, done, claimed_at) VALUES (?, 0, ?)",
+                (update_id, now)
+            )
+            self.conn.commit()
+            if cursor.rowcount:
+                return True
+            
+            row = self.conn.execute(
+                "SELECT done, claimed_at FROM updates WHERE update_id = ?", (update_id,)
+            ).fetchone()
+            if row is None:
+                # Другой процесс только что отпустил update без отметки
+                continue
+            if row[0]:
+                return False
+            if now - row[1] > self.stale_after:
+                cursor = self.conn.execute(
+                    "UPDATE updates SET claimed_at = ? WHERE update_id = ? AND done = 0 AND claimed_at = ?",
+                    (now, update_id, row[1])
+                )
+                self.conn.commit()
+                if cursor.rowcount:
+                    self.logger.warning(f"Update {update_id}: taking over stale claim")
+                    return True
+                continue
+            return None
+    
+    def release(self, update_id: Optional[int], done: bool) -> None:
+        """
+        Завершить обработку update
+        
+        Args:
+            update_id: ID update (захваченный через acquire)
+            done: Обработан окончательно (False - повторная доставка обработает заново)
+        """
+        if not self.enabled or update_id is None:
+            return
+        
+        if done:
+            self.window.add(update_id)
+            self._dirty = True
+        
+        if self.shared:
+            # Поток журнала выполнит это раньше любого следующего захвата
+            self._executor.submit(self._release_shared, update_id, done)
+        
+        self._resolve(update_id, done)
+        
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.flush()
+    
+    def _release_shared(self, update_id: int, done: bool) -> None:
+        """Отметка или снятие захвата в общей базе (в потоке журнала)"""
+        try:
+            if done:
+                self.conn.execute("UPDATE updates SET done = 1 WHERE update_id = ?", (update_id,))
+            else:
+                self.conn.execute("DELETE FROM updates WHERE update_id = ? AND done = 0", (update_id,))
+            self.conn.commit()
+        except Exception as e:
+            self.logger.error(f"Update journal release of {update_id} failed: {e}")
+    
+    def _resolve(self, update_id: int, done: bool) -> None:
+        """Разбудить повторные доставки, ждущие этот update"""
+        future = self._pending.pop(update_id, None)
+        if future is not None and not future.done():
+            future.set_result(done)
+    
+    def flush(self) -> None:
+        """Записать снимок окна (атомарно) / удалить из общей базы вышедшие из окна id"""
+        self._last_snapshot = time.monotonic()
+        if not self._dirty:
+            return
+        self._dirty = False
+        
+        if self.shared:
+            self._executor.submit(self._prune_shared, self.window.high - self.window.size)
+            return
+        
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        try:
+            tmp_path.write_bytes(self.window.dump())
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            self.logger.warning(f"Update journal snapshot failed: {e}")
+    
+    def _prune_shared(self, below: int) -> None:
+        """Удалить из общей базы id, вышедшие из окна (в потоке журнала)"""
+        try:
+            self.conn.execute("DELETE FROM updates WHERE update_id <= ?", (below,))
+            self.conn.commit()
+        except Exception as e:
+            self.logger.warning(f"Update journal prune failed: {e}")
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared,
+            "window": self.window.size,
+            "last_update_id": self.window.high,
+            "in_progress": len(self._pending),
+            "duplicates": self.duplicates,
+            "waited": self.waited
+        }
+    
+    def close(self) -> None:
+        """Записать снимок и закрыть базу"""
+        if not self.enabled:
+            return
+        self.flush()
+        if self._executor is not None:
+            # Дождаться отметок, ещё стоящих в очереди потока
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def create_update_journal(config: dict) -> UpdateJournal:
+    """
+    Фабричная функция для создания UpdateJournal
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр UpdateJournal
+    """
+    return UpdateJournal(config)
@@ -0,0 +1,334 @@
+"""
+SOLAR PhotoSync v1.2.0 - User State Module
+Активная категория пользователей (Command Routing): ограниченный размер, TTL, снимок в SQLite
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from logger import get_logger
+from state_store import connect
+
+
+class UserState:
+    """Компактная запись состояния пользователя"""
+    
+    __slots__ = ("category", "last_activity")
+    
+    def __init__(self, category: str, last_activity: float):
+        self.category = category
+        self.last_activity = last_activity
+
+
+class UserStateManager:
+    """Менеджер состояния пользователей для Command Routing"""
+    
+    # Доступные категории команд
+    CATEGORY_COMMANDS = {
+        '/sprinter': 'Sprinter',
+        '/actros': 'Actros',
+        '/engine': 'Engine',
+        '/vin': 'VIN',
+        '/docs': 'Documents',
+        '/invoice': 'Invoice',
+        '/photos': 'Photos',
+        '/tires': 'Tires',
+        '/ldz': 'LDZ',
+        '/legal': 'Legal',
+        '/other': 'Other',
+    }
+    
+    # Команды сброса
+    RESET_COMMANDS = {'/cancel', '/reset'}
+    
+    # Таймаут неактивности (секунды)
+    INACTIVITY_TIMEOUT = 600  # 10 минут
+    
+    def __init__(self, config: Optional[dict] = None):
+        """
+        Инициализация менеджера
+        
+        Args:
+            config: Конфигурация приложения (без неё - только в памяти)
+        """
+        self.logger = get_logger()
+        
+        state_config = (config or {}).get("user_state", {})
+        self.inactivity_timeout = state_config.get("inactivity_timeout", self.INACTIVITY_TIMEOUT)
+        self.max_entries = state_config.get("max_entries", 100000)
+        self.flush_interval = state_config.get("flush_interval", 5)
+        
+        # Храним только пользователей с активной категорией (не Other).
+        # Таймаут одинаковый для всех, поэтому порядок по last_activity совпадает
+        # с порядком истечения: просроченные и вытесняемые записи всегда в начале.
+        self._user_states: "OrderedDict[int, UserState]" = OrderedDict()
+        
+        # Пользователи, у которых изменилась только активность (пишутся пачкой)
+        self._dirty: Dict[int, float] = {}
+        self._last_flush = time.monotonic()
+        
+        self.expired = 0
+        self.evicted = 0
+        
+        self.conn = connect(config, "user_state.sqlite3") if config is not None else None
+        if self.conn is not None:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " user_id INTEGER PRIMARY KEY,"
+                " category TEXT NOT NULL,"
+                " last_activity REAL NOT NULL"
+                ")"
+            )
+            self.conn.commit()
+            self._load()
+        
+        # --workers N: категорию мог сменить другой процесс, источник истины - SQLite
+        workers = (config or {}).get("server", {}).get("workers", 1)
+        self.shared = self.conn is not None and workers > 1
+    
+    def _load(self) -> None:
+        """Восстановить непросроченные состояния из снимка"""
+        cutoff = time.time() - self.inactivity_timeout
+        self.conn.execute("DELETE FROM users WHERE last_activity <= ?", (cutoff,))
+        # Сверх max_entries - как вытесненные при работе
+        self.conn.execute(
+            "DELETE FROM users WHERE user_id NOT IN"
+            " (SELECT user_id FROM users ORDER BY last_activity DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+        self.conn.commit()
+        
+        rows = self.conn.execute(
+            "SELECT user_id, category, last_activity FROM users"
+            " ORDER BY last_activity DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        
+        for user_id, category, last_activity in reversed(rows):
+            self._user_states[user_id] = UserState(category, last_activity)
+        
+        if rows:
+            self.logger.info(f"Restored {len(rows)} active user categories")
+    
+    def get_user_category(self, user_id: int) -> str:
+        """
+        Получить текущую категорию пользователя с проверкой таймаута
+        
+        Args:
+            user_id: ID пользователя Telegram
+        
+        Returns:
+            Активная категория или "Other"
+        """
+        now = time.time()
+        self._expire(now)
+        if self.shared:
+            self._refresh(user_id, now)
+        
+        state = self._user_states.get(user_id)
+        if state is None:
+            return "Other"
+        return state.category
+    
+    def _refresh(self, user_id: int, now: float) -> None:
+        """Перечитать запись пользователя из общей базы (режим --workers)"""
+        row = self.conn.execute(
+            "SELECT category, last_activity FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        
+        # Последняя активность могла ещё не дойти до базы ни из одного процесса
+        last_activity = max(row[1], self._dirty.get(user_id, 0.0)) if row else 0.0
+        if row is None or last_activity <= now - self.inactivity_timeout:
+            self._user_states.pop(user_id, None)
+            self._dirty.pop(user_id, None)
+            return
+        
+        state = self._user_states.get(user_id)
+        if state is None:
+            self._touch(user_id, UserState(row[0], last_activity))
+        else:
+            state.category = row[0]
+            if last_activity > state.last_activity:
+                state.last_activity = last_activity
+                self._touch(user_id, state)
+    
+    def set_user_category(self, user_id: int, category: str) -> None:
+        """
+        Установить категорию для пользователя
+        
+        Args:
+            user_id: ID пользователя
+            category: Категория для установки
+        """
+        if category == "Other":
+            self._remove(user_id)
+        else:
+            now = time.time()
+            self._touch(user_id, UserState(category, now))
+            self._write(user_id, category, now)
+        
+        self.logger.info(f"Set active category → {category} (user: {user_id})")
+    
+    def update_activity(self, user_id: int) -> None:
+        """Обновить время последней активности"""
+        state = self._user_states.get(user_id)
+        if state is None:
+            return
+        
+        state.last_activity = time.time()
+        self._user_states.move_to_end(user_id)
+        self._dirty[user_id] = state.last_activity
+        
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def reset_category(self, user_id: int) -> None:
+        """Сбросить категорию пользователя"""
+        state = self._user_states.get(user_id)
+        old_category = state.category if state else "Other"
+        self._remove(user_id)
+        self.logger.info(f"Category reset → Other (was: {old_category}, user: {user_id})")
+    
+    def _touch(self, user_id: int, state: UserState) -> None:
+        """
+        Поставить запись в очередь по last_activity, соблюдая max_entries
+        
+        Обычно активность - сейчас, и запись просто идёт в конец. Более старая
+        (прочитанная из общей базы) встаёт перед более новыми: они
+        переставляются в конец за ней, порядок истечения сохраняется.
+        """
+        self._user_states.pop(user_id, None)
+        newer = []
+        for other_id in reversed(self._user_states):
+            if self._user_states[other_id].last_activity <= state.last_activity:
+                break
+            newer.append(other_id)
+        
+        self._user_states[user_id] = state
+        for other_id in reversed(newer):
+            self._user_states.move_to_end(other_id)
+        
+        evicted = []
+        while len(self._user_states) > self.max_entries:
+            evicted_id, _ = self._user_states.popitem(last=False)
+            self._dirty.pop(evicted_id, None)
+            evicted.append((evicted_id,))
+            self.evicted += 1
+        
+        # Вытесненная запись - то же, что сброс: иначе она вернётся из снимка в _load
+        if evicted and self.conn is not None:
+            self.conn.executemany("DELETE FROM users WHERE user_id = ?", evicted)
+            self.conn.commit()
+    
+    def _expire(self, now: float) -> None:
+        """Снять с начала очереди все просроченные записи"""
+        cutoff = now - self.inactivity_timeout
+        while self._user_states:
+            user_id, state = next(iter(self._user_states.items()))
+            if state.last_activity > cutoff:
+                break
+            del self._user_states[user_id]
+            self._dirty.pop(user_id, None)
+            self.expired += 1
+            self.logger.info(f"Category auto-reset → Other (was: {state.category}, user: {user_id})")
+    
+    def _remove(self, user_id: int) -> None:
+        """Удалить состояние (категория Other) из памяти и снимка"""
+        self._user_states.pop(user_id, None)
+        self._dirty.pop(user_id, None)
+        if self.conn is not None:
+            self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            self.conn.commit()
+    
+    def _write(self, user_id: int, category: str, last_activity: float) -> None:
+        """Записать смену категории в снимок сразу"""
+        self._dirty.pop(user_id, None)
+        if self.conn is not None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, category, last_activity) VALUES (?, ?, ?)",
+                (user_id, category, last_activity)
+            )
+            self.conn.commit()
+    
+    def flush(self) -> None:
+        """Записать накопленные обновления активности и удалить просроченные записи снимка"""
+        self._last_flush = time.monotonic()
+        if self.conn is None:
+            self._dirty.clear()
+            return
+        
+        if self._dirty:
+            self.conn.executemany(
+                "UPDATE users SET last_activity = ? WHERE user_id = ?",
+                [(last_activity, user_id) for user_id, last_activity in self._dirty.items()]
+            )
+            self._dirty.clear()
+        
+        self.conn.execute(
+            "DELETE FROM users WHERE last_activity <= ?",
+            (time.time() - self.inactivity_timeout,)
+        )
+        self.conn.commit()
+    
+    def process_command(self, user_id: int, command: str) -> Tuple[bool, str]:
+        """
+        Обработать команду от пользователя
+        
+        Args:
+            user_id: ID пользователя
+            command: Команда (например /sprinter)
+        
+        Returns:
+            Tuple[успех, сообщение для отправки]
+        """
+        command_lower = command.lower().strip()
+        
+        # Команда сброса
+        if command_lower in self.RESET_COMMANDS:
+            self.reset_category(user_id)
+            return True, "🔄 Category reset → Other"
+        
+        # Команда категории
+        if command_lower in self.CATEGORY_COMMANDS:
+            category = self.CATEGORY_COMMANDS[command_lower]
+            self.set_user_category(user_id, category)
+            return True, f"📁 Active category → {category}\n\nAll following photos will be saved to {category}/"
+        
+        # Неизвестная команда
+        available = ", ".join(sorted(self.CATEGORY_COMMANDS.keys()))
+        return False, f"❗ Unknown category command.\n\nAvailable: {available}\n\nReset: /cancel, /reset"
+    
+    def get_available_commands(self) -> str:
+        """Получить список доступных команд"""
+        commands = sorted(self.CATEGORY_COMMANDS.keys())
+        return ", ".join(commands)
+    
+    def get_stats(self) -> dict:
+        """Статистика для /api/photosync/stats"""
+        return {
+            "active": len(self._user_states),
+            "shared": self.shared,
+            "max_entries": self.max_entries,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+    
+    def close(self) -> None:
+        """Сбросить активность на диск и закрыть базу"""
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+
+
+def create_user_state_manager(config: dict) -> UserStateManager:
+    """
+    Фабричная функция для создания UserStateManager
+    
+    Args:
+        config: Конфигурация приложения
+    
+    Returns:
+        Экземпляр UserStateManager
+    """
+    return UserStateManager(config)
@@ -4,145 +4,42 @@ SOLAR PhotoSync v1.2.0 - Webhook Handler (Command Routing Edition)
 """
 
 import json
-import aiohttp
 import time
+import asyncio
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
+from typing import Callable, Optional, Dict, Any, List, Tuple
 from logger import get_logger
+from metrics import StageTimings, THROUGHPUT_BUCKETS, get_registry
 from classifier import FileClassifier
 from file_saver import FileSaver
-
-
-class UserStateManager:
-    """Менеджер состояния пользователей для Command Routing"""
-    
-    # Доступные категории команд
-    CATEGORY_COMMANDS = {
-        '/sprinter': 'Sprinter',
-        '/actros': 'Actros',
-        '/engine': 'Engine',
-        '/vin': 'VIN',
-        '/docs': 'Documents',
-        '/invoice': 'Invoice',
-        '/photos': 'Photos',
-        '/tires': 'Tires',
-        '/ldz': 'LDZ',
-        '/legal': 'Legal',
-        '/other': 'Other',
-    }
-    
-    # Команды сброса
-    RESET_COMMANDS = {'/cancel', '/reset'}
-    
-    # Таймаут неактивности (секунды)
-    INACTIVITY_TIMEOUT = 600  # 10 минут
-    
-    def __init__(self):
-        self.logger = get_logger()
-        # Состояние пользователей: {user_id: {"category": str, "last_activity": float}}
-        self._user_states: Dict[int, Dict[str, Any]] = {}
-    
-    def get_user_category(self, user_id: int) -> str:
-        """
-        Получить текущую категорию пользователя с проверкой таймаута
-        
-        Args:
-            user_id: ID пользователя Telegram
-        
-        Returns:
-            Активная категория или "Other"
-        """
-        if user_id not in self._user_states:
-            return "Other"
-        
-        state = self._user_states[user_id]
-        
-        # Проверяем таймаут неактивности
-        if time.time() - state["last_activity"] > self.INACTIVITY_TIMEOUT:
-            old_category = state["category"]
-            self._user_states[user_id] = {
-                "category": "Other",
-                "last_activity": time.time()
-            }
-            self.logger.info(f"Category auto-reset → Other (was: {old_category}, user: {user_id})")
-            return "Other"
-        
-        return state["category"]
-    
-    def set_user_category(self, user_id: int, category: str) -> None:
-        """
-        Установить категорию для пользователя
-        
-        Args:
-            user_id: ID пользователя
-            category: Категория для установки
-        """
-        self._user_states[user_id] = {
-            "category": category,
-            "last_activity": time.time()
-        }
-        self.logger.info(f"Set active category → {category} (user: {user_id})")
-    
-    def update_activity(self, user_id: int) -> None:
-        """Обновить время последней активности"""
-        if user_id in self._user_states:
-            self._user_states[user_id]["last_activity"] = time.time()
-    
-    def reset_category(self, user_id: int) -> None:
-        """Сбросить категорию пользователя"""
-        old_category = self._user_states.get(user_id, {}).get("category", "Other")
-        self._user_states[user_id] = {
-            "category": "Other",
-            "last_activity": time.time()
-        }
-        self.logger.info(f"Category reset → Other (was: {old_category}, user: {user_id})")
-    
-    def process_command(self, user_id: int, command: str) -> Tuple[bool, str]:
-        """
-        Обработать команду от пользователя
-        
-        Args:
-            user_id: ID пользователя
-            command: Команда (например /sprinter)
-        
-        Returns:
-            Tuple[успех, сообщение для отправки]
-        """
-        command_lower = command.lower().strip()
-        
-        # Команда сброса
-        if command_lower in self.RESET_COMMANDS:
-            self.reset_category(user_id)
-            return True, "🔄 Category reset → Other"
-        
-        # Команда категории
-        if command_lower in self.CATEGORY_COMMANDS:
-            category = self.CATEGORY_COMMANDS[command_lower]
-            self.set_user_category(user_id, category)
-            return True, f"📁 Active category → {category}\n\nAll following photos will be saved to {category}/"
-        
-        # Неизвестная команда
-        available = ", ".join(sorted(self.CATEGORY_COMMANDS.keys()))
-        return False, f"❗ Unknown category command.\n\nAvailable: {available}\n\nReset: /cancel, /reset"
-    
-    def get_available_commands(self) -> str:
-        """Получить список доступных команд"""
-        commands = sorted(self.CATEGORY_COMMANDS.keys())
-        return ", ".join(commands)
+from telegram_api import TelegramApiClient, create_api_client
+from file_id_cache import FileIdCache, create_file_id_cache
+from user_state import UserStateManager, create_user_state_manager
+from media_index import MediaIndex, create_media_index
+from album_aggregator import create_album_aggregator
+from message_sender import create_message_sender
+from models import MediaFile, Message, Update
+from admission import MB, FileTooLarge, AdmissionTimeout, create_admission_controller
+from update_journal import create_update_journal
+from ingest_journal import create_ingest_journal
 
 
 class WebhookHandler:
     """Обработчик Telegram Webhook с Command Routing"""
     
-    TELEGRAM_API_BASE = "https://api.telegram.org/bot{token}"
-    TELEGRAM_FILE_BASE = "https://api.telegram.org/file/bot{token}"
+    # Неудачи, которые повторная доставка не исправит (update считается обработанным)
+    FINAL_FAILURES = {"No supported media found", "File too large"}
     
     def __init__(
         self,
         config: dict,
         classifier: FileClassifier,
-        file_saver: FileSaver
+        file_saver: FileSaver,
+        api_client: Optional[TelegramApiClient] = None,
+        file_cache: Optional[FileIdCache] = None,
+        user_state: Optional[UserStateManager] = None,
+        media_index: Optional[MediaIndex] = None
     ):
         """
         Инициализация обработчика webhook
@@ -151,6 +48,10 @@ class WebhookHandler:
             config: Конфигурация приложения
             classifier: Классификатор файлов
             file_saver: Сохранятель файлов
+            api_client: Общий клиент Telegram API (создаётся, если не передан)
+            file_cache: Кэш file_unique_id -> сохранённый файл (создаётся, если не передан)
+            user_state: Менеджер активных категорий (создаётся, если не передан)
+            media_index: Индекс метаданных для /api/photosync/files (создаётся, если не передан)
         """
         self.logger = get_logger()
         self.config = config
@@ -158,15 +59,71 @@ class WebhookHandler:
         self.file_saver = file_saver
         
         # Менеджер состояния пользователей
-        self.user_state = UserStateManager()
+        self.user_state = user_state or create_user_state_manager(config)
+        
+        # Общая сессия с пулом соединений для всех запросов к Telegram
+        self.api = api_client or create_api_client(config)
+        self.bot_token = self.api.bot_token
+        self.api_base = self.api.api_base
+        self.file_base = self.api.file_base
+        
+        # Уже скачанные файлы по file_unique_id
+        self.file_cache = file_cache or create_file_id_cache(config)
         
-        self.bot_token = config.get("bot", {}).get("token", "")
-        self.api_base = self.TELEGRAM_API_BASE.format(token=self.bot_token)
-        self.file_base = self.TELEGRAM_FILE_BASE.format(token=self.bot_token)
+        # Метаданные сохранённых файлов (чат, отправитель, подпись) для поиска
+        self.media_index = media_index or create_media_index(config)
         
         storage_config = config.get("storage", {})
         self.allowed_types = set(storage_config.get("allowed_types", []))
         
+        # Размер чанка потоковой загрузки
+        processing_config = config.get("processing", {})
+        self.chunk_size = processing_config.get("download_chunk_kb", 256) * 1024
+        
+        # Время выполнения этапов (download, classify, save, confirm)
+        self.timings = StageTimings()
+        
+        # Исходящие сообщения: лимиты Telegram и склейка подтверждений
+        self.sender = create_message_sender(config, self.api, self.timings)
+        
+        # Альбомы (media_group_id) обрабатываются одним пакетом
+        self.albums = create_album_aggregator(config, self.handle_album)
+        
+        # Лимит размера и бюджет байт для одновременных загрузок
+        self.admission = create_admission_controller(config)
+        
+        # Обработанные update_id: повторные доставки Telegram не обрабатываются заново
+        self.journal = create_update_journal(config)
+        
+        # Принятые updates и их этапы: незавершённые доигрываются после рестарта
+        self.ingest = create_ingest_journal(config, self.api.codec)
+        self.sender.on_delivered = self.ingest.confirmed
+        
+        # Альбом обработан (update_id участников): поллер убирает их из poll_state.json
+        self.on_album_done: Optional[Callable[[List[int]], None]] = None
+        
+        # Счётчики для /api/photosync/metrics
+        registry = get_registry()
+        self.files_counter = registry.counter(
+            "photosync_files_total",
+            "Files stored, by media type, category and result",
+            ("media_type", "category", "result")
+        )
+        self.failures_counter = registry.counter(
+            "photosync_failures_total",
+            "Files that were not stored, by reason",
+            ("reason",)
+        )
+        self.downloaded_bytes = registry.counter(
+            "photosync_downloaded_bytes_total",
+            "Bytes downloaded from Telegram"
+        ).labels()
+        self.throughput_histogram = registry.histogram(
+            "photosync_download_throughput_bytes_per_second",
+            "Download throughput per file",
+            buckets=THROUGHPUT_BUCKETS
+        ).labels()
+        
         self.logger.info("WebhookHandler initialized with Command Routing")
     
     async def handle_update(self, update: dict) -> Dict[str, Any]:
@@ -176,6 +133,65 @@ class WebhookHandler:
         Args:
             update: JSON объект update от Telegram
         
+        Returns:
+            Результат обработки
+        """
+        parsed = Update.from_dict(update)
+        
+        # Фильтрация пустых updates (webhook ping)
+        if parsed.message is None:
+            self.ingest.finish(parsed.update_id, True)
+            return {"success": True, "message": "empty_update", "file_path": None}
+        
+        # Повторная доставка: уже обработан - ничего не делаем, обрабатывается - ждём
+        if not await self.journal.acquire(parsed.update_id):
+            self.logger.info("Update %s already processed, skipped", parsed.update_id)
+            self.logger.event("duplicate_update", update_id=parsed.update_id)
+            self.ingest.finish(parsed.update_id, True)
+            return {"success": True, "message": "duplicate_update", "file_path": None}
+        
+        done = False
+        result = None
+        try:
+            result = await self._process_update(parsed)
+            done = result["success"] or result["message"] in self.FINAL_FAILURES
+            return result
+        finally:
+            # Участник альбома только поставлен в очередь: его закрывает handle_album,
+            # сохранённые в журнале приёма закрывает доставка подтверждения
+            if result is None or result["message"] != "album_member":
+                self.ingest.finish(parsed.update_id, done)
+                await self._release([parsed.update_id], done)
+    
+    async def _release(self, update_ids: List[int], done: bool) -> None:
+        """
+        Отпустить updates в журнале update_id
+        
+        Отметка "обработан" пишется только после того, как этапы этих updates
+        в журнале приёма (stored / skipped) на диске: иначе после падения
+        доигрывание сочтёт update дубликатом и потеряет файл или подтверждение.
+        
+        Args:
+            update_ids: ID updates
+            done: Обработаны окончательно
+        """
+        try:
+            if done:
+                await self.ingest.sync()
+        except BaseException:
+            done = False
+            raise
+        finally:
+            for update_id in update_ids:
+                self.journal.release(update_id, done)
+    
+    async def _process_update(self, parsed: Update) -> Dict[str, Any]:
+        """
+        Обработать непустой update (захваченный в журнале)
+        
+        Args:
+            parsed: Разобранный update
+        
         Returns:
             Результат обработки
         """
@@ -185,31 +201,20 @@ class WebhookHandler:
             "file_path": None
         }
         
-        update_id = update.get("update_id", 0)
-        message = update.get("message", {})
-        
-        # Фильтрация пустых updates (webhook ping)
-        if not message:
-            result["success"] = True
-            result["message"] = "empty_update"
-            return result
-        
-        chat_id = message.get("chat", {}).get("id")
-        user_id = message.get("from", {}).get("id", chat_id)
-        chat_title = message.get("chat", {}).get("title", "")
-        caption = message.get("caption", "")
-        text = message.get("text", "")
+        message = parsed.message
+        chat_id = message.chat_id
+        text = message.text
         
-        self.logger.webhook_received(update_id, chat_id)
+        self.logger.webhook_received(parsed.update_id, chat_id)
         
         # Обработка текстовых команд
         if text and text.startswith('/'):
             command = text.split()[0].lower()
-            self.logger.info(f"Command received: {command}")
+            self.logger.info("Command received: %s", command)
             
             # Проверяем, это команда категории?
             if command in self.user_state.CATEGORY_COMMANDS or command in self.user_state.RESET_COMMANDS:
-                success, response_msg = self.user_state.process_command(user_id, command)
+                success, response_msg = self.user_state.process_command(message.user_id, command)
                 await self._send_message(chat_id, response_msg)
                 result["success"] = True
                 result["message"] = f"Command processed: {command}"
@@ -217,75 +222,84 @@ class WebhookHandler:
             
             # Неизвестная команда
             if command.startswith('/'):
-                _, error_msg = self.user_state.process_command(user_id, command)
+                _, error_msg = self.user_state.process_command(message.user_id, command)
                 await self._send_message(chat_id, error_msg)
                 result["success"] = True
                 result["message"] = "Unknown command"
                 return result
         
-        # Определяем тип медиа и получаем file_info
-        file_info = self._extract_file_info(message)
-        
-        if not file_info:
+        media = message.media
+        if media is None:
             result["message"] = "No supported media found"
             return result
         
-        file_id = file_info["file_id"]
-        file_name = file_info.get("file_name", f"file_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        file_type = file_info["type"]
-        file_size = file_info.get("file_size", 0)
+        # Участник альбома: ждём остальных, обработка - в handle_album
+        if message.media_group_id and self.albums.enabled:
+            self.albums.add(message)
+            result["success"] = True
+            result["message"] = "album_member"
+            return result
         
-        self.logger.file_received(file_name, file_type, file_size)
+        self.logger.file_received(media)
+        self.logger.event(
+            "received",
+            size=media.file_size,
+            update_id=parsed.update_id,
+            chat_id=chat_id,
+            media_type=media.type
+        )
+        
+        if not self.admission.check_size(media.file_size):
+            limit_mb = self.admission.max_file_size // MB
+            self.logger.warning(f"Rejected {media.file_name}: {media.file_size / MB:.1f} MB > {limit_mb} MB")
+            self.failures_counter.labels("too_large").inc()
+            await self._send_message(
+                chat_id,
+                f"⚠️ File too large: {media.file_size / MB:.1f} MB (limit {limit_mb} MB)"
+            )
+            result["message"] = "File too large"
+            return result
+        
+        started = time.perf_counter()
         
         try:
-            # Скачиваем файл
-            file_bytes, actual_filename = await self._download_file(file_id, file_name)
+            saved, category, actual_filename = await self._store_file(media, message)
             
-            if not file_bytes:
+            if saved is None:
                 result["message"] = "Failed to download file"
                 return result
             
-            # Получаем активную категорию пользователя
-            user_category = self.user_state.get_user_category(user_id)
-            
-            # Обновляем активность
-            self.user_state.update_activity(user_id)
+            success = saved["success"]
+            saved_path = saved["file_path"] if success else saved["message"]
             
-            # Если у пользователя есть активная категория (не Other), используем её
-            # Иначе классифицируем автоматически
-            if user_category != "Other":
-                category = user_category
-                reason = "user_command"
-            else:
-                # Извлекаем команду из caption если есть
-                command = self.classifier.extract_command_from_text(caption)
+            if success and saved["message"] == "already_saved":
+                # Дубликат: такой файл уже есть в хранилище
+                existing = Path(saved_path)
+                result["success"] = True
+                result["message"] = "Already saved"
+                result["file_path"] = saved_path
                 
-                # Автоматическая классификация
-                category, reason = self.classifier.classify(
-                    filename=actual_filename,
-                    caption=caption,
-                    chat_title=chat_title,
-                    command=command
+                self._confirm(
+                    chat_id,
+                    existing.parent.name,
+                    existing.parent.parent.name,
+                    [parsed.update_id],
+                    saved=0,
+                    duplicates=1
                 )
-            
-            # Определяем дату сохранения
-            save_date = datetime.now()
-            
-            # Сохраняем
-            success, saved_path = self.file_saver.save_from_bytes(
-                file_bytes=file_bytes,
-                category=category,
-                original_filename=actual_filename,
-                file_date=save_date
-            )
-            
-            if success:
+                
+                self.timings.record("total", time.perf_counter() - started, result="duplicate", category=category)
+            elif success:
                 result["success"] = True
                 result["message"] = f"Saved to {category}"
                 result["file_path"] = saved_path
                 
-                # Отправляем подтверждение пользователю
-                await self._send_confirmation(chat_id, category, actual_filename, save_date)
+                # Отправляем подтверждение пользователю (дата - папки, куда лёг файл)
+                await self._send_confirmation(
+                    chat_id, category, saved.get("file_date") or message.save_date, parsed.update_id
+                )
+                
+                self.timings.record("total", time.perf_counter() - started, category=category)
             else:
                 result["message"] = f"Failed to save: {saved_path}"
                 self.logger.error_processing(actual_filename, saved_path)
@@ -293,195 +307,401 @@ class WebhookHandler:
         except Exception as e:
             error_msg = str(e)
             result["message"] = f"Error: {error_msg}"
-            self.logger.error_processing(file_name, error_msg)
+            self.logger.error_processing(media.file_name, error_msg)
+            self._count_failure(e)
+        
+        return result
+    
+    async def handle_album(self, messages: List[Message]) -> Dict[str, Any]:
+        """
+        Обработать альбом: одна классификация, параллельные загрузки, одно подтверждение
+        
+        Участники альбома остаются захваченными в журнале update_id, пока
+        их файлы не сохранены: до этого повторная доставка ждёт, а после
+        падения доигрывание обрабатывает их заново.
+        
+        Args:
+            messages: Сообщения с общим media_group_id
+        
+        Returns:
+            Результат обработки (saved, duplicates, failed)
+        """
+        done = False
+        try:
+            result = await self._process_album(messages)
+            # Неудачные файлы вошли в подтверждение - повтор их не исправит
+            done = True
+            return result
+        finally:
+            update_ids = [m.update_id for m in messages]
+            await self._release(update_ids, done)
+            if self.on_album_done is not None:
+                self.on_album_done(update_ids)
+    
+    async def _process_album(self, messages: List[Message]) -> Dict[str, Any]:
+        """
+        Сохранить файлы альбома и поставить подтверждения
+        
+        Args:
+            messages: Сообщения с общим media_group_id
         
+        Returns:
+            Результат обработки (saved, duplicates, failed)
+        """
+        messages = sorted(messages, key=lambda m: m.message_id)
+        first = messages[0]
+        
+        # Подпись альбома Telegram кладёт в одно из сообщений (обычно первое);
+        # пользователь, чат и дата сохранения - общие для альбома, берутся из first
+        first.caption = next((m.caption for m in messages if m.caption), "")
+        
+        with_media = [m for m in messages if m.media is not None]
+        result = {"success": False, "saved": 0, "duplicates": 0, "failed": 0}
+        if not with_media:
+            for message in messages:
+                self.ingest.finish(message.update_id, False)
+            return result
+        files = [m.media for m in with_media]
+        
+        started = time.perf_counter()
+        self.logger.start_trace()
+        self.logger.info("Album %s: %d files", first.media_group_id, len(files))
+        
+        category, reason = self._resolve_category(first, files[0].file_name)
+        semaphore = asyncio.Semaphore(self.albums.concurrency)
+        
+        async def store(media: MediaFile) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    saved, _, _ = await self._store_file(media, first, category)
+                    return saved
+                except Exception as e:
+                    self.logger.error_processing(media.file_name, str(e))
+                    self._count_failure(e)
+                    return None
+        
+        # Подтверждение на каждую папку даты: с датой съёмки файлы альбома
+        # могут лечь в разные дни. Неудачи - в дату получения
+        received = first.save_date.strftime("%Y-%m-%d")
+        groups: Dict[str, dict] = {}
+        stored = await asyncio.gather(*(store(info) for info in files))
+        for message, saved in zip(with_media, stored):
+            if saved is None or not saved["success"]:
+                outcome, date = "failed", received
+            else:
+                outcome = "duplicates" if saved["message"] == "already_saved" else "saved"
+                date = (saved.get("file_date") or first.save_date).strftime("%Y-%m-%d")
+            result[outcome] += 1
+            group = groups.setdefault(date, {"saved": 0, "duplicates": 0, "failed": 0, "update_ids": []})
+            group[outcome] += 1
+            group["update_ids"].append(message.update_id)
+        
+        # Сообщения альбома без медиа закрываются первым подтверждением
+        next(iter(groups.values()))["update_ids"].extend(m.update_id for m in messages if m.media is None)
+        
+        result["success"] = result["failed"] == 0
+        
+        for date, group in groups.items():
+            self._confirm(first.chat_id, category, date, **group)
+        
+        self.timings.record(
+            "album_total",
+            time.perf_counter() - started,
+            result="ok" if result["success"] else "failed",
+            media_group_id=first.media_group_id,
+            category=category,
+            saved=result["saved"],
+            duplicates=result["duplicates"],
+            failed=result["failed"]
+        )
         return result
     
-    def _extract_file_info(self, message: dict) -> Optional[Dict[str, Any]]:
+    async def _store_file(
+        self,
+        media: MediaFile,
+        message: Message,
+        category: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], str, str]:
+        """
+        Сохранить один файл: из кэша file_unique_id или скачиванием
+        
+        Args:
+            media: Медиафайл
+            message: Сообщение (пользователь, подпись, чат, дата сохранения)
+            category: Уже известная категория (альбом) или None - определить здесь
+        
+        Returns:
+            Tuple[результат FileSaver или None если getFile не удался, категория, имя файла]
+        """
+        file_unique_id = media.file_unique_id
+        save_date = message.save_date
+        
+        saved = None
+        actual_filename = media.file_name
+        
+        # Этот файл уже скачивался (в том числе из другого чата) - обходимся без сети
+        cached_path = self.file_cache.get(file_unique_id) if file_unique_id else None
+        if cached_path:
+            if category is None:
+                category, reason = self._resolve_category(message, actual_filename)
+            saved = await self.file_saver.save_existing(cached_path, category, actual_filename, save_date)
+        
+        if saved is None:
+            # Место в полосе загрузок (мелкие файлы не ждут крупные)
+            async with self.admission.admit(media.file_size):
+                # Получаем путь к файлу на серверах Telegram
+                with self.timings.measure("get_file") as span:
+                    telegram_path, actual_filename = await self._get_file(media.file_id, media.file_name)
+                    if not telegram_path:
+                        span["result"] = "failed"
+                
+                if not telegram_path:
+                    self.failures_counter.labels("get_file").inc()
+                    return None, category, actual_filename
+                
+                if category is None:
+                    category, reason = self._resolve_category(message, actual_filename)
+                
+                # Скачиваем потоком сразу в хранилище
+                with self.timings.measure("download") as span:
+                    saved = await self._download_to_storage(
+                        telegram_path,
+                        category,
+                        actual_filename,
+                        save_date
+                    )
+                    span["size"] = saved["size"]
+                    span["file"] = file_unique_id
+                    if not saved["success"]:
+                        span["result"] = "failed"
+            
+            if saved["success"] and file_unique_id:
+                self.file_cache.put(file_unique_id, saved["file_path"], saved["size"])
+        
+        if saved["success"]:
+            outcome = "duplicate" if saved["message"] == "already_saved" or saved.get("duplicate") else "saved"
+            self.files_counter.labels(media.type, category, outcome).inc()
+            if saved["message"] != "already_saved":
+                await asyncio.to_thread(
+                    self.media_index.add,
+                    saved["file_path"],
+                    saved["size"],
+                    media.type,
+                    message.chat_id,
+                    message.user_id,
+                    actual_filename,
+                    message.caption,
+                    exif=saved.get("exif")
+                )
+        
+        return saved, category, actual_filename
+    
+    def _count_failure(self, error: Exception) -> None:
+        """Учесть исключение при сохранении файла в photosync_failures_total"""
+        if isinstance(error, FileTooLarge):
+            reason = "too_large"
+        elif isinstance(error, AdmissionTimeout):
+            reason = "admission_timeout"
+        else:
+            reason = "error"
+        self.failures_counter.labels(reason).inc()
+    
+    def _resolve_category(self, message: Message, filename: str) -> Tuple[str, str]:
         """
-        Извлечь информацию о файле из сообщения
+        Определить категорию: активная команда пользователя или автоклассификация
         
         Args:
-            message: Объект сообщения Telegram
+            message: Сообщение (пользователь, подпись, название чата)
+            filename: Имя файла
         
         Returns:
-            Словарь с информацией о файле или None
+            Tuple[category, reason]
         """
-        # Фото (берём самое большое)
-        if "photo" in message and message["photo"]:
-            photo = message["photo"][-1]
-            return {
-                "file_id": photo["file_id"],
-                "file_name": f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg",
-                "type": "photo",
-                "file_size": photo.get("file_size", 0)
-            }
-        
-        # Документ
-        if "document" in message:
-            doc = message["document"]
-            return {
-                "file_id": doc["file_id"],
-                "file_name": doc.get("file_name", "document"),
-                "type": "document",
-                "file_size": doc.get("file_size", 0),
-                "mime_type": doc.get("mime_type", "")
-            }
-        
-        # Видео
-        if "video" in message:
-            video = message["video"]
-            return {
-                "file_id": video["file_id"],
-                "file_name": video.get("file_name", f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"),
-                "type": "video",
-                "file_size": video.get("file_size", 0)
-            }
-        
-        # Анимация (GIF)
-        if "animation" in message:
-            anim = message["animation"]
-            return {
-                "file_id": anim["file_id"],
-                "file_name": anim.get("file_name", f"animation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.gif"),
-                "type": "animation",
-                "file_size": anim.get("file_size", 0)
-            }
-        
-        # Аудио
-        if "audio" in message:
-            audio = message["audio"]
-            return {
-                "file_id": audio["file_id"],
-                "file_name": audio.get("file_name", f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"),
-                "type": "audio",
-                "file_size": audio.get("file_size", 0)
-            }
-        
-        # Голосовое сообщение
-        if "voice" in message:
-            voice = message["voice"]
-            return {
-                "file_id": voice["file_id"],
-                "file_name": f"voice_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ogg",
-                "type": "voice",
-                "file_size": voice.get("file_size", 0)
-            }
-        
-        # Видео-сообщение (кружок)
-        if "video_note" in message:
-            vnote = message["video_note"]
-            return {
-                "file_id": vnote["file_id"],
-                "file_name": f"video_note_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4",
-                "type": "video_note",
-                "file_size": vnote.get("file_size", 0)
-            }
-        
-        return None
+        user_id = message.user_id
+        
+        # Получаем активную категорию пользователя
+        user_category = self.user_state.get_user_category(user_id)
+        
+        # Обновляем активность
+        self.user_state.update_activity(user_id)
+        
+        # Если у пользователя есть активная категория (не Other), используем её
+        if user_category != "Other":
+            return user_category, "user_command"
+        
+        # Иначе классифицируем автоматически
+        with self.timings.measure("classify") as span:
+            category, reason = self.classifier.classify_message(message, filename)
+            span["category"] = category
+            span["reason"] = reason
+        return category, reason
     
-    async def _download_file(self, file_id: str, default_name: str) -> Tuple[Optional[bytes], str]:
+    async def _get_file(self, file_id: str, default_name: str) -> Tuple[Optional[str], str]:
         """
-        Скачать файл из Telegram
+        Получить путь к файлу через getFile
         
         Args:
             file_id: ID файла в Telegram
             default_name: Имя файла по умолчанию
         
         Returns:
-            Tuple[bytes содержимое, имя файла]
+            Tuple[file_path на серверах Telegram или None, имя файла]
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                # Получаем путь к файлу
-                get_file_url = f"{self.api_base}/getFile?file_id={file_id}"
+            async with self.api.session.get(
+                self.api.method_url("getFile"),
+                params={"file_id": file_id}
+            ) as resp:
+                if resp.status != 200:
+                    self.logger.error(f"Failed to get file info: {resp.status}")
+                    return None, default_name
                 
-                async with session.get(get_file_url) as resp:
-                    if resp.status != 200:
-                        self.logger.error(f"Failed to get file info: {resp.status}")
-                        return None, default_name
-                    
-                    data = await resp.json()
-                    
-                    if not data.get("ok"):
-                        self.logger.error(f"Telegram API error: {data}")
-                        return None, default_name
-                    
-                    file_path = data["result"]["file_path"]
-                    
-                    # Извлекаем имя файла из пути если есть
-                    actual_name = Path(file_path).name if '/' in file_path else default_name
+                data = self.api.codec.loads(await resp.read())
+            
+            if not data.get("ok"):
+                self.logger.error(f"Telegram API error: {data}")
+                return None, default_name
+            
+            file_path = data["result"]["file_path"]
+            
+            # Извлекаем имя файла из пути если есть
+            actual_name = Path(file_path).name if '/' in file_path else default_name
+            return file_path, actual_name
+            
+        except Exception as e:
+            self.logger.error(f"getFile error: {e}")
+            return None, default_name
+    
+    async def _download_to_storage(
+        self,
+        telegram_path: str,
+        category: str,
+        filename: str,
+        save_date: datetime
+    ) -> Dict[str, Any]:
+        """
+        Скачать файл потоком прямо в хранилище (без буферизации в памяти)
+        
+        Args:
+            telegram_path: file_path из getFile
+            category: Категория сохранения
+            save_date: Дата сохранения
+        
+        Returns:
+            Результат FileSaver.save_stream
+        """
+        started = time.perf_counter()
+        try:
+            async with self.api.session.get(self.api.file_url(telegram_path)) as resp:
+                if resp.status != 200:
+                    self.logger.error(f"Failed to download file: {resp.status}")
+                    self.failures_counter.labels("download_http").inc()
+                    return {"success": False, "file_path": None, "size": 0,
+                            "message": f"Download failed: HTTP {resp.status}"}
+                
+                if resp.content_length and not self.admission.check_size(resp.content_length):
+                    self.failures_counter.labels("too_large").inc()
+                    return {"success": False, "file_path": None, "size": 0,
+                            "message": f"File too large: {resp.content_length / MB:.1f} MB"}
                 
-                # Скачиваем файл
-                download_url = f"{self.file_base}/{file_path}"
+                # Размер из update мог отсутствовать: лимит проверяется и по ходу загрузки
+                stream = self.admission.limit_stream(resp.content.iter_chunked(self.chunk_size))
+                saved = await self.file_saver.save_stream(
+                    stream,
+                    category,
+                    filename,
+                    save_date
+                )
+                
+                self.downloaded_bytes.inc(stream.received)
+                if saved["success"]:
+                    self.logger.debug("Downloaded %d bytes", saved["size"])
+                    self.throughput_histogram.observe(saved["size"] / max(time.perf_counter() - started, 1e-6))
+                else:
+                    self.failures_counter.labels("too_large" if stream.exceeded else "save").inc()
+                return saved
                 
-                async with session.get(download_url) as resp:
-                    if resp.status != 200:
-                        self.logger.error(f"Failed to download file: {resp.status}")
-                        return None, actual_name
-                    
-                    file_bytes = await resp.read()
-                    self.logger.debug(f"Downloaded {len(file_bytes)} bytes")
-                    
-                    return file_bytes, actual_name
-                    
         except Exception as e:
             self.logger.error(f"Download error: {e}")
-            return None, default_name
+            self.failures_counter.labels("download").inc()
+            return {"success": False, "file_path": None, "size": 0, "message": str(e)}
     
     async def _send_message(self, chat_id: int, text: str):
         """
-        Отправить сообщение пользователю
+        Отправить сообщение пользователю (через очередь, без ожидания доставки)
         
         Args:
             chat_id: ID чата
             text: Текст сообщения
         """
-        try:
-            async with aiohttp.ClientSession() as session:
-                url = f"{self.api_base}/sendMessage"
-                payload = {
-                    "chat_id": chat_id,
-                    "text": text,
-                    "parse_mode": "HTML"
-                }
-                
-                async with session.post(url, json=payload) as resp:
-                    if resp.status != 200:
-                        self.logger.warning(f"Failed to send message: {resp.status}")
-                        
-        except Exception as e:
-            self.logger.warning(f"Send message error: {e}")
+        self.sender.send(chat_id, text)
     
-    async def _send_confirmation(self, chat_id: int, category: str, filename: str, save_date: datetime = None):
+    def _confirm(
+        self,
+        chat_id: int,
+        category: str,
+        date: str,
+        update_ids: List[int],
+        saved: int = 1,
+        duplicates: int = 0,
+        failed: int = 0
+    ) -> None:
+        """
+        Поставить подтверждение и отметить updates в журнале приёма сохранёнными
+        
+        Args:
+            chat_id: ID чата
+            category: Категория
+            date: Дата (папка YYYY-MM-DD)
+            update_ids: updates, которые закрывает подтверждение
+            saved: Сохранено файлов
+            duplicates: Уже были сохранены
+            failed: Не удалось сохранить
+        """
+        # Счётчики пишутся на первый update: после рестарта подтверждение собирается их суммой
+        counts = {"saved": saved, "duplicates": duplicates, "failed": failed}
+        for index, update_id in enumerate(update_ids):
+            self.ingest.mark(
+                update_id, "stored", chat_id=chat_id, category=category, date=date,
+                **(counts if index == 0 else {})
+            )
+        self.sender.confirm(chat_id, category, date, saved, duplicates, failed, update_ids)
+    
+    async def _send_confirmation(
+        self,
+        chat_id: int,
+        category: str,
+        save_date: datetime = None,
+        update_id: Optional[int] = None
+    ):
         """
         Отправить подтверждение пользователю
         
+        Подтверждения одного чата, ждущие отправки, склеиваются в одно
+        ("Saved 14 files → ...").
+        
         Args:
             chat_id: ID чата
             category: Категория сохранения
-            filename: Имя файла
             save_date: Дата сохранения
+            update_id: ID update (журнал приёма)
         """
-        try:
-            if save_date is None:
-                save_date = datetime.now()
-            
-            date_str = save_date.strftime("%Y-%m-%d")
-            message = f"☀️ Saved → {category} / {date_str}"
-            
-            await self._send_message(chat_id, message)
-                        
-        except Exception as e:
-            self.logger.warning(f"Confirmation error: {e}")
+        if save_date is None:
+            save_date = datetime.now()
+        
+        self._confirm(chat_id, category, save_date.strftime("%Y-%m-%d"), [update_id] if update_id is not None else [])
 
 
 def create_webhook_handler(
     config: dict,
     classifier: FileClassifier,
-    file_saver: FileSaver
+    file_saver: FileSaver,
+    api_client: Optional[TelegramApiClient] = None,
+    file_cache: Optional[FileIdCache] = None,
+    user_state: Optional[UserStateManager] = None,
+    media_index: Optional[MediaIndex] = None
 ) -> WebhookHandler:
     """
     Фабричная функция для создания WebhookHandler
     """
-    return WebhookHandler(config, classifier, file_saver)
+    return WebhookHandler(config, classifier, file_saver, api_client, file_cache, user_state, media_index)
@@ -0,0 +1,153 @@
+"""
+SOLAR PhotoSync v1.2.0 - Workers Module
+Pre-fork режим (--workers N): N процессов aiohttp на одном порту через SO_REUSEPORT
+"""
+
+import os
+import time
+import signal
+import socket
+from typing import Callable, Dict
+from logger import get_logger
+
+
+# Воркер, умерший быстрее этого срока, считается упавшим при старте
+MIN_UPTIME = 5.0
+
+# Пауза перед перезапуском упавшего воркера (растёт до MAX_RESTART_DELAY)
+MAX_RESTART_DELAY = 30.0
+
+
+def reuse_port_supported() -> bool:
+    """Есть ли fork и SO_REUSEPORT на этой платформе"""
+    return hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")
+
+
+class WorkerSupervisor:
+    """
+    Родительский процесс: запускает N воркеров и перезапускает упавших.
+    
+    Каждый воркер сам создаёт бота (после fork - своё event loop, свои
+    соединения SQLite и сессию aiohttp) и слушает порт с SO_REUSEPORT;
+    входящие соединения распределяет ядро. Общее состояние воркеров -
+    SQLite базы в режиме WAL (state_store).
+    """
+    
+    def __init__(self, workers: int, run_worker: Callable[[int], None]):
+        """
+        Инициализация супервизора
+        
+        Args:
+            workers: Количество процессов
+            run_worker: Запуск воркера с номером 0..N-1 (блокирует до остановки)
+        """
+        self.logger = get_logger()
+        self.workers = workers
+        self.run_worker = run_worker
+        
+        self._children: Dict[int, int] = {}  # pid -> номер воркера
+        self._started: Dict[int, float] = {}
+        self._delays: Dict[int, float] = {}
+        # Код последнего выхода каждого воркера
+        self._exit_codes: Dict[int, int] = {}
+        self._stopping = False
+    
+    def run(self) -> int:
+        """
+        Запустить воркеры и ждать их завершения
+        
+        Returns:
+            Код выхода процесса: 1, если последний выход какого-либо воркера неуспешный
+        """
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self.logger.info(f"Supervisor {os.getpid()}: {self.workers} workers started")
+        
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            
+            worker_id = self._children.pop(pid, None)
+            if worker_id is None:
+                continue
+            
+            code = os.waitstatus_to_exitcode(status)
+            self._exit_codes[worker_id] = code
+            if self._stopping:
+                continue
+            
+            self.logger.warning(f"Worker {worker_id} (pid {pid}) exited with code {code}, restarting")
+            self._restart(worker_id)
+        
+        failed = sorted(worker_id for worker_id, code in self._exit_codes.items() if code != 0)
+        if failed:
+            self.logger.error(f"All workers stopped, workers {failed} exited with errors")
+            return 1
+        self.logger.info("All workers stopped")
+        return 0
+    
+    def _spawn(self, worker_id: int) -> None:
+        """fork + запуск воркера в дочернем процессе"""
+        pid = os.fork()
+        if pid == 0:
+            # Дочерний процесс: обработчики сигналов по умолчанию, их ставит run_app
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                self.run_worker(worker_id)
+            except BaseException as e:
+                if not isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    get_logger().error(f"Worker {worker_id} crashed: {e}")
+                    code = 1
+            finally:
+                os._exit(code)
+        
+        self._children[pid] = worker_id
+        self._started[worker_id] = time.monotonic()
+    
+    def _restart(self, worker_id: int) -> None:
+        """Перезапуск с нарастающей паузой, если воркер падает сразу после старта"""
+        if time.monotonic() - self._started[worker_id] < MIN_UPTIME:
+            delay = min(self._delays.get(worker_id, 0.5) * 2, MAX_RESTART_DELAY)
+        else:
+            delay = 0.0
+        self._delays[worker_id] = delay or 0.5
+        
+        if delay:
+            time.sleep(delay)
+        if not self._stopping:
+            self._spawn(worker_id)
+    
+    def _on_signal(self, signum, frame) -> None:
+        """SIGTERM / SIGINT: передать воркерам и дождаться их graceful shutdown"""
+        if self._stopping:
+            return
+        self._stopping = True
+        self.logger.info(f"Supervisor received signal {signum}, stopping workers")
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def run_workers(workers: int, run_worker: Callable[[int], None]) -> int:
+    """
+    Запустить pre-fork сервер
+    
+    Args:
+        workers: Количество процессов
+        run_worker: Запуск воркера с номером 0..N-1
+    
+    Returns:
+        Код выхода
+    """
+    return WorkerSupervisor(workers, run_worker).run()
@@ -0,0 +1,8 @@
+"""
+Общие настройки тестов: модули src импортируются по имени, как в bot.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
@@ -0,0 +1,92 @@
+"""
+KeywordMatcher: тот же результат, что и прежний перебор \\bkw\\b по категориям
+"""
+
+import random
+import re
+
+import pytest
+
+from classifier import KeywordMatcher
+
+CATEGORIES = {
+    "Sprinter": ["sprinter", "спринтер", "sprint"],
+    "LDZ": ["ldz", "vagon", "вагон", "wagon", "railway", "жд"],
+    "Legal": ["court", "суд", "teismas", "legal", "юрист", "lawyer", "иск", "протокол"],
+    "Documents": ["document", "док", "pasas", "паспорт", "passport", "удостоверение", "license", "справка"],
+    # Фразы и слова с пунктуацией, в том числе пересекающиеся и общие с другими категориями
+    "Phrases": ["tech passport", "c.o.d", "e-mail", "court order", "sprint-2", "жд вагон", "legal"],
+}
+
+NOISE = ["", " ", "  ", ".", ",", "-", "_", "\n", "photo", "img", "2024", "x", "sprinters", "вагоны"]
+
+
+def reference_match(categories: dict, text):
+    """Прежний алгоритм: категории по порядку, в каждой - regex на каждое слово"""
+    if not text:
+        return None
+    text_lower = text.lower()
+    for category, keywords in categories.items():
+        for kw in keywords:
+            if re.search(rf"\b{re.escape(kw)}\b", text_lower, re.IGNORECASE):
+                return category
+    return None
+
+
+def random_text(rng: random.Random) -> str:
+    vocabulary = [kw for keywords in CATEGORIES.values() for kw in keywords] + NOISE
+    parts = []
+    for _ in range(rng.randint(0, 8)):
+        word = rng.choice(vocabulary)
+        if rng.random() < 0.2:
+            word = word.upper()
+        parts.append(word)
+        parts.append(rng.choice([" ", "", "_", ".", "-", "/", "\n"]))
+    return "".join(parts)
+
+
+@pytest.fixture
+def matcher() -> KeywordMatcher:
+    return KeywordMatcher(CATEGORIES)
+
+
+def test_matches_reference_on_random_texts(matcher):
+    rng = random.Random(20240815)
+    for _ in range(5000):
+        text = random_text(rng)
+        assert matcher.match(text) == reference_match(CATEGORIES, text), text
+
+
+def test_match_fields_matches_sequential_fields(matcher):
+    rng = random.Random(7)
+    for _ in range(2000):
+        fields = [random_text(rng) if rng.random() < 0.7 else None for _ in range(3)]
+        expected = None
+        for index, text in enumerate(fields):
+            category = reference_match(CATEGORIES, text)
+            if category is not None:
+                expected = (index, category)
+                break
+        assert matcher.match_fields(fields) == expected, fields
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Sprinter_front.jpg", None),
+    ("sprinter front", "Sprinter"),
+    ("tech passport scan", "Documents"),
+    ("tech passports", None),
+    ("COURT ORDER", "Legal"),
+    ("sprint-2", "Sprinter"),
+    ("e-mail копия", "Phrases"),
+    ("жд вагон", "LDZ"),
+    (None, None),
+    ("", None),
+])
+def test_examples(matcher, text, expected):
+    assert matcher.match(text) == reference_match(CATEGORIES, text) == expected
+
+
+def test_empty_categories():
+    matcher = KeywordMatcher({"Empty": [], "Blank": [""]})
+    assert matcher.match("anything at all") is None
+    assert matcher.match_fields(["a", None, "b"]) is None
@@ -0,0 +1,94 @@
+"""
+ExifScanner: результат не зависит от того, как поток порезан на чанки
+"""
+
+import io
+from datetime import datetime
+
+import pytest
+from PIL import Image
+
+from exif_reader import ExifReader
+
+TAKEN_AT = datetime(2024, 8, 15, 18, 42, 7)
+
+
+def make_exif() -> Image.Exif:
+    exif = Image.Exif()
+    exif.get_ifd(0x8769)[0x9003] = TAKEN_AT.strftime("%Y:%m:%d %H:%M:%S")
+    gps = exif.get_ifd(0x8825)
+    gps[1] = "N"
+    gps[2] = (56.0, 57.0, 3.6)
+    gps[3] = "E"
+    gps[4] = (24.0, 6.0, 18.0)
+    return exif
+
+
+def make_jpeg(padding: int = 3000) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "red").save(buffer, "JPEG", exif=make_exif())
+    data = buffer.getvalue()
+    # Сегмент APP15 перед APP0/APP1: EXIF не в первых байтах
+    return data[:2] + b"\xff\xef" + (padding + 2).to_bytes(2, "big") + b"\0" * padding + data[2:]
+
+
+def make_heic() -> bytes:
+    pillow_heif = pytest.importorskip("pillow_heif")
+    pillow_heif.register_heif_opener()
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "blue").save(buffer, "HEIF", exif=make_exif().tobytes())
+    return buffer.getvalue()
+
+
+def scan(reader: ExifReader, data: bytes, sizes) -> object:
+    """Прогнать data через сканер чанками заданных размеров (последний - остаток)"""
+    scanner = reader.scanner()
+    position = 0
+    for size in sizes:
+        scanner.feed(data[position:position + size])
+        position += size
+    scanner.feed(data[position:])
+    return scanner.result()
+
+
+def assert_info(info) -> None:
+    assert info is not None
+    assert info.taken_at == TAKEN_AT
+    assert info.latitude == pytest.approx(56.951, abs=1e-3)
+    assert info.longitude == pytest.approx(24.105, abs=1e-3)
+
+
+@pytest.fixture
+def reader() -> ExifReader:
+    return ExifReader({"exif": {"enabled": True, "max_header_kb": 64}})
+
+
+@pytest.mark.parametrize("make", [make_jpeg, make_heic], ids=["jpeg", "heic"])
+def test_fixed_chunk_sizes(reader, make, tmp_path):
+    data = make()
+    path = tmp_path / "file"
+    path.write_bytes(data)
+    assert_info(reader.read_file(path))
+
+    for size in (1, 3, 7, 64, 511, 4096, len(data)):
+        assert_info(scan(reader, data, [size] * (len(data) // size)))
+
+
+@pytest.mark.parametrize("make", [make_jpeg, make_heic], ids=["jpeg", "heic"])
+def test_every_split_point(reader, make):
+    data = make()
+    # Две части, граница - каждый байт заголовка
+    for split in range(0, min(len(data), 6000)):
+        assert_info(scan(reader, data, [split]))
+
+
+def test_exif_past_max_header_is_ignored():
+    data = make_jpeg(padding=2000)
+    reader = ExifReader({"exif": {"enabled": True, "max_header_kb": 1}})
+    assert scan(reader, data, [100] * (len(data) // 100)) is None
+    assert reader.with_date == 0
+
+
+def test_non_image_stream():
+    reader = ExifReader({"exif": {"enabled": True}})
+    assert scan(reader, b"%PDF-1.7\n" + b"x" * 10000, [512] * 20) is None
@@ -0,0 +1,124 @@
+"""
+IngestJournal: доигрывание после рестарта, компактизация, журналы без владельца
+"""
+
+import pytest
+
+from ingest_journal import IngestJournal
+from json_codec import create_json_codec
+
+
+def make_journal(tmp_path, **journal_config) -> IngestJournal:
+    config = {
+        "state": {"path": str(tmp_path)},
+        "ingest_journal": {"commit_interval_ms": 0, "fsync": False, **journal_config}
+    }
+    return IngestJournal(config, create_json_codec({}))
+
+
+def make_update(update_id: int) -> dict:
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": 1}}}
+
+
+def read_ids(path) -> list:
+    codec = create_json_codec({})
+    return [codec.loads(line)["id"] for line in path.read_bytes().splitlines() if line.strip()]
+
+
+@pytest.mark.asyncio
+async def test_replay_after_restart(tmp_path):
+    journal = make_journal(tmp_path)
+    await journal.start()
+    for update_id in (1, 2, 3):
+        assert await journal.accept(make_update(update_id))
+    journal.mark(2, "stored", chat_id=1, category="Cat", date="2024-01-02", saved=1)
+    journal.finish(3, True)
+    await journal.sync()
+    # Падение процесса: stop не вызывается
+
+    restarted = make_journal(tmp_path)
+    handled = []
+    confirmed = []
+
+    async def handler(update: dict) -> None:
+        handled.append(update["update_id"])
+        restarted.finish(update["update_id"], True)
+
+    def confirm(chat_id, category, date, **pending) -> None:
+        confirmed.append((chat_id, category, date, pending["saved"], pending["update_ids"]))
+
+    await restarted.start()
+    await restarted.replay(handler, confirm)
+
+    assert handled == [1]
+    assert confirmed == [(1, "Cat", "2024-01-02", 1, [2])]
+    assert restarted.replayed == 1
+
+    restarted.confirmed([2])
+    await restarted.stop()
+    assert read_ids(tmp_path / "ingest.jsonl") == []
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_only_unfinished(tmp_path):
+    journal = make_journal(tmp_path, compact_after=10)
+    await journal.start()
+    for update_id in range(1, 21):
+        await journal.accept(make_update(update_id))
+        if update_id != 7:
+            journal.finish(update_id, True)
+    await journal.sync()
+    # Компактизация идёт в committer после записи
+    await journal.accept(make_update(21))
+    await journal.sync()
+
+    ids = read_ids(tmp_path / "ingest.jsonl")
+    assert len(ids) < journal.records
+    assert 1 not in ids
+    assert 7 in ids
+
+    await journal.stop()
+    assert sorted(set(read_ids(tmp_path / "ingest.jsonl"))) == [7, 21]
+
+
+@pytest.mark.asyncio
+async def test_worker_zero_adopts_orphaned_journals(tmp_path):
+    # Прошлый запуск: 3 воркера, у воркера 2 остался незавершённый update
+    old = IngestJournal(
+        {"state": {"path": str(tmp_path)}, "server": {"workers": 3, "worker_id": 2},
+         "ingest_journal": {"commit_interval_ms": 0, "fsync": False}},
+        create_json_codec({})
+    )
+    await old.start()
+    await old.accept(make_update(5))
+    await old.stop()
+
+    # Новый запуск в одном процессе
+    journal = make_journal(tmp_path)
+    handled = []
+
+    async def handler(update: dict) -> None:
+        handled.append(update["update_id"])
+        journal.finish(update["update_id"], True)
+
+    await journal.start()
+    assert not (tmp_path / "ingest.w2.jsonl").exists()
+    await journal.replay(handler, lambda *args, **kwargs: None)
+    await journal.stop()
+
+    assert handled == [5]
+
+
+def test_live_worker_journals_are_not_adopted(tmp_path):
+    for worker_id in (0, 1, 2):
+        (tmp_path / f"ingest.w{worker_id}.jsonl").write_bytes(b"")
+    (tmp_path / "ingest.jsonl").write_bytes(b"")
+
+    def worker(worker_id: int) -> IngestJournal:
+        return IngestJournal(
+            {"state": {"path": str(tmp_path)}, "server": {"workers": 2, "worker_id": worker_id}},
+            create_json_codec({})
+        )
+
+    assert [path.name for path in worker(0)._orphans] == ["ingest.jsonl", "ingest.w2.jsonl"]
+    assert worker(1)._orphans == []
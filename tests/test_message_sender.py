@@ -0,0 +1,134 @@
+"""
+MessageSender: учёт доставленных / неудачных сообщений и повторы
+"""
+
+import aiohttp
+import pytest
+
+import message_sender
+from json_codec import create_json_codec
+from message_sender import MessageSender
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: bytes = b""):
+        self.status = status
+        self.body = body
+    
+    async def read(self) -> bytes:
+        return self.body
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Ответы sendMessage по очереди: (status, body) или исключение"""
+    
+    def __init__(self, outcomes: list):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+    
+    def post(self, url: str, json: dict = None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(*outcome)
+
+
+class FakeApi:
+    def __init__(self, outcomes: list):
+        self.session = FakeSession(outcomes)
+        self.codec = create_json_codec({})
+    
+    def method_url(self, method: str) -> str:
+        return f"http://telegram.invalid/{method}"
+
+
+def make_sender(outcomes: list, **sender_config) -> MessageSender:
+    config = {"sender": {"global_rate": 1000, "chat_rate": 1000, "drain_timeout": 5, **sender_config}}
+    sender = MessageSender(config, FakeApi(outcomes))
+    sender.delivered_ids = []
+    sender.on_delivered = sender.delivered_ids.extend
+    return sender
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Повтор после сетевой ошибки - сразу, без паузы 1, 2, 4 ... секунд
+    monkeypatch.setattr(message_sender, "MAX_BACKOFF", 0)
+
+
+@pytest.mark.asyncio
+async def test_delivered_confirmation_is_counted_and_timed():
+    sender = make_sender([(200, b"{}")])
+    await sender.start()
+    sender.confirm(1, "Sprinter", "2026-10-17", update_ids=[10])
+    await sender.stop()
+    
+    assert (sender.sent, sender.failed) == (1, 0)
+    assert sender.timings.snapshot()["confirm"]["count"] == 1
+    assert sender.delivered_ids == [10]
+
+
+@pytest.mark.asyncio
+async def test_rejected_message_is_failed_not_sent():
+    sender = make_sender([(400, b'{"ok": false}')])
+    await sender.start()
+    sender.confirm(1, "Sprinter", "2026-10-17", update_ids=[10])
+    await sender.stop()
+    
+    assert (sender.sent, sender.failed) == (0, 1)
+    assert sender.api.session.calls == 1
+    assert "confirm" not in sender.timings.snapshot()
+    assert "send_message" not in sender.timings.snapshot()
+    # Брошенное подтверждение закрывает updates в журнале приёма
+    assert sender.delivered_ids == [10]
+
+
+@pytest.mark.asyncio
+async def test_network_error_is_retried():
+    sender = make_sender([aiohttp.ClientConnectionError("reset"), (502, b""), (200, b"{}")])
+    await sender.start()
+    sender.send(1, "hello")
+    await sender.stop()
+    
+    assert sender.api.session.calls == 3
+    assert (sender.sent, sender.failed) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_retries_are_limited():
+    sender = make_sender([aiohttp.ServerDisconnectedError()] * 3, max_retries=2)
+    await sender.start()
+    sender.confirm(1, "Sprinter", "2026-10-17", update_ids=[10])
+    await sender.stop()
+    
+    assert sender.api.session.calls == 3
+    assert (sender.sent, sender.failed) == (0, 1)
+    assert sender.delivered_ids == [10]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_without_json_body_is_retried():
+    sender = make_sender([(429, b"<html>Too Many Requests</html>"), (200, b"{}")])
+    await sender.start()
+    sender.send(1, "hello")
+    await sender.stop()
+    
+    assert sender.rate_limited == 1
+    assert (sender.sent, sender.failed) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_dropped_confirmation_finishes_updates():
+    sender = make_sender([], max_pending=1)
+    sender.send(1, "first")
+    sender.confirm(2, "Sprinter", "2026-10-17", update_ids=[7, 8])
+    
+    assert sender.dropped == 1
+    assert sender.delivered_ids == [7, 8]
@@ -0,0 +1,96 @@
+"""
+UpdateWindow: кольцо битов, переход через размер окна, сброс; общий журнал --workers
+"""
+
+import pytest
+
+from update_journal import UpdateJournal, UpdateWindow
+
+
+def test_marks_ids_within_window():
+    window = UpdateWindow(64)
+    for update_id in (1000, 1001, 1003):
+        window.add(update_id)
+
+    assert 1000 in window
+    assert 1003 in window
+    assert 1002 not in window
+    assert 1004 not in window
+
+
+def test_wraparound_clears_positions_of_old_ids():
+    window = UpdateWindow(64)
+    for update_id in range(1000, 1064):
+        window.add(update_id)
+
+    # 1064 занимает позицию 1000: старый бит не должен выдать его за обработанный
+    window.add(1070)
+    assert 1064 not in window
+    assert 1069 not in window
+    assert 1070 in window
+    # Окно - (1070 - 64, 1070]
+    assert 1000 not in window
+    assert 1006 not in window
+    assert 1007 in window
+    assert 1063 in window
+
+
+def test_forward_jump_resets_window():
+    window = UpdateWindow(64)
+    for update_id in range(1000, 1010):
+        window.add(update_id)
+
+    # Новая последовательность после простоя
+    window.add(500000)
+    assert window.high == 500000
+    assert 500000 in window
+    assert all(update_id not in window for update_id in range(1000, 1010))
+    assert sum(bin(byte).count("1") for byte in window.bits) == 1
+
+
+def test_id_below_window_is_ignored():
+    window = UpdateWindow(64)
+    for update_id in range(1000, 1064):
+        window.add(update_id)
+
+    # Опоздавший старый id не стирает окно и сам не отмечается
+    window.add(900)
+    assert window.high == 1063
+    assert 900 not in window
+    assert all(update_id in window for update_id in range(1000, 1064))
+
+
+def test_snapshot_roundtrip():
+    window = UpdateWindow(64)
+    for update_id in (10, 20, 30):
+        window.add(update_id)
+
+    restored = UpdateWindow(64)
+    assert restored.load(window.dump())
+    assert restored.high == 30
+    assert 20 in restored
+    assert 25 not in restored
+    assert not UpdateWindow(128).load(window.dump())
+
+
+@pytest.mark.asyncio
+async def test_shared_journal_sees_release_of_other_process(tmp_path):
+    config = {"state": {"path": str(tmp_path)}, "server": {"workers": 2}}
+    first = UpdateJournal(config)
+    second = UpdateJournal(config)
+    try:
+        assert await first.acquire(42)
+        first.release(42, True)
+        # close дожидается отметки, стоящей в очереди потока журнала
+        first.close()
+
+        assert not await second.acquire(42)
+        assert second.duplicates == 1
+
+        # Неудачная обработка снимает захват: повтор обработает update заново
+        assert await second.acquire(43)
+        second.release(43, False)
+        assert await second.acquire(43)
+        second.release(43, True)
+    finally:
+        second.close()
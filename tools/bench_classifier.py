@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: single-pass classifier vs regex per keyword
+
+Генерирует N правдоподобных сообщений (подпись, название чата, имя файла на
+русском / литовском / английском) и словарь из сотен ключевых слов, затем сравнивает:
+  - legacy: отдельный \\b...\\b regex на каждое ключевое слово, до трёх проходов
+            (caption, chat_title, filename) - как было до v1.2.x
+  - single: FileClassifier с KeywordMatcher (одно выражение, один проход)
+
+Результаты обоих вариантов сверяются на каждом сообщении.
+
+Usage:
+  python tools/bench_classifier.py --captions 10000 --extra-keywords 300
+  python tools/bench_classifier.py -c config/photosync.config.json
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from classifier import FileClassifier
+
+
+WORDS = [
+    "фото", "груз", "машина", "ремонт", "счёт", "договор", "отправка", "склад", "рейс",
+    "nuotrauka", "krovinys", "sąskaita", "sutartis", "remontas", "kelionė", "vairuotojas",
+    "photo", "truck", "repair", "delivery", "trailer", "invoice", "damage", "cargo",
+    "today", "вчера", "šiandien", "Riga", "Vilnius", "Kaunas", "Berlin", "Minsk"
+]
+
+STEMS = [
+    "kel", "mar", "vag", "aut", "dok", "sut", "tran", "log", "fakt", "serv", "det", "kuz",
+    "рем", "пере", "доку", "авто", "шин", "масл", "фильт", "кабин"
+]
+
+# Фразы и слова с пунктуацией (идут через общее regex выражение)
+PHRASES = ["railway station", "e-mail", "c.m.r", "tech passport", "акт приёмки", "teismo sprendimas"]
+
+CHATS = ["Logistics team", "LDZ вагоны", "Sprinter fleet", "Семья", "Darbas", "Court case 2026", "Photos"]
+
+
+def legacy_classify(patterns: dict, filename: str, caption: str, chat_title: str):
+    """Прежний алгоритм: по очереди поля, категории и regex каждого слова"""
+    for field, text in ((0, caption), (1, chat_title), (2, filename)):
+        if not text:
+            continue
+        text_lower = text.lower()
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                if pattern.search(text_lower):
+                    return category, field
+    return None, None
+
+
+def make_keywords(config: dict, extra: int, rng: random.Random) -> dict:
+    """Ключевые слова из конфига + синтетические до нужного количества"""
+    categories = {name: list(kws) for name, kws in config["classification"]["categories"].items()}
+    names = list(categories)
+    for n in range(extra):
+        word = rng.choice(STEMS) + rng.choice(STEMS) + str(n % 7 or "")
+        categories[names[n % len(names)]].append(word)
+    for n, phrase in enumerate(PHRASES):
+        categories[names[n % len(names)]].append(phrase)
+    return categories
+
+
+def make_messages(categories: dict, count: int, rng: random.Random) -> list:
+    """Сообщения: ~40% содержат ключевое слово где-то в подписи, чате или имени файла"""
+    keywords = [kw for kws in categories.values() for kw in kws]
+    messages = []
+    for n in range(count):
+        words = rng.choices(WORDS, k=rng.randint(0, 12))
+        if rng.random() < 0.4:
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords).capitalize())
+        caption = " ".join(words) if words or rng.random() < 0.5 else None
+        chat_title = rng.choice(CHATS)
+        filename = rng.choice([f"IMG_{n:04d}.HEIC", f"photo_{n}.jpg", f"scan {rng.choice(WORDS)}.pdf"])
+        messages.append((filename, caption, chat_title))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classifier benchmark')
+    parser.add_argument('-c', '--config', default=str(Path(__file__).parent.parent / "config" / "photosync.config.json"))
+    parser.add_argument('--captions', type=int, default=10000)
+    parser.add_argument('--extra-keywords', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    
+    with open(args.config, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    
+    categories = make_keywords(config, args.extra_keywords, rng)
+    messages = make_messages(categories, args.captions, rng)
+    total_keywords = sum(len(kws) for kws in categories.values())
+    
+    legacy_patterns = {
+        category: [re.compile(rf'\b{re.escape(kw)}\b', re.IGNORECASE) for kw in kws]
+        for category, kws in categories.items()
+    }
+    classifier = FileClassifier({"classification": {"categories": categories}})
+    
+    reasons = {0: "caption_match", 1: "chat_title_match", 2: "filename_match"}
+    mismatches = 0
+    legacy_times = []
+    single_times = []
+    
+    for filename, caption, chat_title in messages:
+        started = time.perf_counter()
+        expected, field = legacy_classify(legacy_patterns, filename, caption, chat_title)
+        legacy_times.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        category, reason = classifier.classify(filename=filename, caption=caption, chat_title=chat_title)
+        single_times.append(time.perf_counter() - started)
+        
+        if (expected or "Other", reasons.get(field, "no_match")) != (category, reason):
+            mismatches += 1
+    
+    print(f"Messages: {len(messages)}, categories: {len(categories)}, keywords: {total_keywords}")
+    print(f"{'variant':8s} {'total ms':>9s} {'mean us':>8s} {'p99 us':>8s}")
+    for name, times in (("legacy", legacy_times), ("single", single_times)):
+        ordered = sorted(times)
+        print(f"{name:8s} {sum(times) * 1000:9.1f} {statistics.mean(times) * 1e6:8.1f} "
+              f"{ordered[int(0.99 * len(ordered))] * 1e6:8.1f}")
+    print(f"Mismatches: {mismatches}")
+    print(f"Classifier stats: {classifier.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
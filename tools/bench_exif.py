@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: EXIF date / GPS extraction
+
+Сравнивает на одних и тех же файлах:
+  - pil:          HeicConverter.get_exif_date - Image.open + _getexif() + перебор всех тегов
+  - pil+gps:      то же плюс GPS IFD через getexif().get_ifd() (то, что даёт ExifReader)
+  - reader/file:  ExifReader.read_file - только заголовок с диска
+  - reader/stream: ExifScanner на чанках загрузки из памяти (как в FileSaver.save_stream)
+
+Без аргументов генерирует 12 Мп JPEG и HEIC (если есть pillow-heif) с
+DateTimeOriginal и GPS. Дата от PIL и от ExifReader сверяется.
+
+Usage:
+  python tools/bench_exif.py
+  python tools/bench_exif.py IMG_0001.HEIC IMG_0002.JPG --repeat 50
+"""
+
+import sys
+import logging
+import argparse
+import tempfile
+import statistics
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from heic_converter import HeicConverter
+from exif_reader import ExifReader
+
+
+def make_sample(path: Path, image_format: str) -> None:
+    """12 Мп изображение с EXIF: дата съёмки и GPS"""
+    from PIL import Image
+    
+    img = Image.effect_noise((4000, 3000), 60).convert("RGB")
+    exif = Image.Exif()
+    exif[0x010F] = "Apple"
+    exif.get_ifd(0x8769)[0x9003] = "2024:08:15 18:42:07"
+    gps = exif.get_ifd(0x8825)
+    gps.update({1: "N", 2: (56.0, 57.0, 3.6), 3: "E", 4: (24.0, 6.0, 18.0)})
+    img.save(path, image_format, exif=exif.tobytes(), quality=90)
+
+
+def pil_with_gps(path: str):
+    """Дата и GPS через PIL (getexif + get_ifd)"""
+    from PIL import Image
+    
+    with Image.open(path) as img:
+        exif = img.getexif()
+        return exif.get_ifd(0x8769).get(0x9003), exif.get_ifd(0x8825).get(2)
+
+
+def stream(reader: ExifReader, chunks: list):
+    """Все чанки загрузки через сканер (после разбора feed сразу возвращается)"""
+    scanner = reader.scanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.result()
+
+
+def measure(func, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXIF extraction benchmark')
+    parser.add_argument('files', nargs='*', help='JPEG / HEIC files (default: generated samples)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--chunk-kb', type=int, default=256, help='Download chunk (processing.download_chunk_kb)')
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        heif = True
+    except ImportError:
+        heif = False
+    
+    workdir = tempfile.TemporaryDirectory()
+    files = [Path(f) for f in args.files]
+    if not files:
+        files.append(Path(workdir.name) / "sample_12mp.jpg")
+        make_sample(files[-1], "JPEG")
+        if heif:
+            files.append(Path(workdir.name) / "sample_12mp.heic")
+            make_sample(files[-1], "HEIF")
+        else:
+            print("pillow-heif not installed, HEIC sample skipped")
+    
+    converter = HeicConverter({})
+    reader = ExifReader({})
+    chunk_size = args.chunk_kb * 1024
+    
+    print(f"{'method':14s} {'file':24s} {'size KB':>8s} {'mean ms':>9s} {'min ms':>9s} {'x pil':>7s}")
+    for path in files:
+        data = path.read_bytes()
+        chunks = [data[offset:offset + chunk_size] for offset in range(0, len(data), chunk_size)]
+        pil_date = converter.get_exif_date(str(path))
+        info = reader.read_file(path)
+        if pil_date != (info.taken_at if info else None):
+            print(f"  MISMATCH {path.name}: PIL {pil_date}, ExifReader {info}")
+        
+        variants = [
+            ("pil", lambda: converter.get_exif_date(str(path))),
+            ("pil+gps", lambda: pil_with_gps(str(path))),
+            ("reader/file", lambda: reader.read_file(path)),
+            ("reader/stream", lambda: stream(reader, chunks)),
+        ]
+        baseline = None
+        for name, func in variants:
+            times = measure(func, args.repeat)
+            mean = statistics.mean(times)
+            baseline = baseline or mean
+            print(f"{name:14s} {path.name[:24]:24s} {len(data) / 1024:8.0f} "
+                  f"{mean * 1000:9.3f} {min(times) * 1000:9.3f} {baseline / mean:7.1f}")
+        print(f"  -> {info}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: HEIC backends
+
+Сравнивает все инструменты из HeicConverter._detect_converter на реальных HEIC
+файлах (полный путь сохранения, как в FileSaver):
+  - <tool>:       bytes -> временный .heic -> convert() -> .jpg -> copy в хранилище
+  - pillow-heif/bytes: convert_bytes() из памяти прямо в итоговый .jpg
+
+Недоступные инструменты пропускаются.
+
+Usage:
+  python tools/bench_heic_backends.py IMG_0001.HEIC IMG_0002.HEIC --repeat 5
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from heic_converter import HeicConverter
+
+
+TOOLS = ["pillow-heif", "imagemagick", "sips", "heif-convert"]
+
+
+def tool_available(tool: str) -> bool:
+    if tool == "pillow-heif":
+        try:
+            import pillow_heif
+            return True
+        except ImportError:
+            return False
+    if tool == "imagemagick":
+        return bool(shutil.which("magick") or shutil.which("convert"))
+    return bool(shutil.which(tool))
+
+
+def bench_file_path(converter: HeicConverter, data: bytes, workdir: str) -> float:
+    """Старый путь: временный файл -> convert() -> copy2"""
+    started = time.perf_counter()
+    
+    fd, tmp_path = tempfile.mkstemp(dir=workdir, suffix=".heic")
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    
+    success, jpg_path = converter.convert(tmp_path)
+    if not success:
+        raise RuntimeError(jpg_path)
+    shutil.copy2(jpg_path, os.path.join(workdir, "stored.jpg"))
+    
+    elapsed = time.perf_counter() - started
+    os.unlink(tmp_path)
+    os.unlink(jpg_path)
+    return elapsed
+
+
+def bench_bytes_path(converter: HeicConverter, data: bytes, workdir: str) -> float:
+    """Новый путь: convert_bytes() прямо в итоговый файл"""
+    started = time.perf_counter()
+    success, message = converter.convert_bytes(data, os.path.join(workdir, "stored.jpg"))
+    if not success:
+        raise RuntimeError(message)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HEIC backends benchmark')
+    parser.add_argument('files', nargs='+', help='Sample HEIC files')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quality', type=int, default=85)
+    args = parser.parse_args()
+    
+    samples = [(Path(f).name, Path(f).read_bytes()) for f in args.files]
+    converter = HeicConverter({"processing": {"heic_quality": args.quality}})
+    
+    variants = [(tool, bench_file_path) for tool in TOOLS if tool_available(tool)]
+    if tool_available("pillow-heif"):
+        variants.append(("pillow-heif/bytes", bench_bytes_path))
+    
+    skipped = [tool for tool in TOOLS if not tool_available(tool)]
+    if skipped:
+        print(f"Skipped (not installed): {', '.join(skipped)}")
+    
+    print(f"{'backend':20s} {'file':24s} {'size KB':>8s} {'mean ms':>9s} {'min ms':>9s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, data in samples:
+            for variant, bench in variants:
+                converter.converter_tool = variant.split("/")[0]
+                times = [bench(converter, data, workdir) for _ in range(args.repeat)]
+                print(f"{variant:20s} {name[:24]:24s} {len(data) / 1024:8.0f} "
+                      f"{statistics.mean(times) * 1000:9.1f} {min(times) * 1000:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
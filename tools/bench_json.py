@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: webhook body decode / reply encode per JSON backend
+
+Сравнивает на наборе тел webhook:
+  - legacy:         request.text() + json.loads + json.dumps (как было до v1.2.x)
+  - json:           stdlib json.loads прямо из bytes
+  - orjson:         orjson.loads / orjson.dumps
+  - msgspec:        msgspec.json.decode без схемы
+  - msgspec/typed:  JsonCodec.decode_update - только поля схемы Update
+
+decode us - разбор с немедленным освобождением результата; kept us и KB/update -
+разбор с удержанием всех результатов (как updates, ждущие в JobQueue).
+
+Тела берутся из файла (--payloads, одно update JSON на строку, например выгрузка
+getUpdates) или генерируются: полные объекты Telegram с entities, reply_to_message,
+forward_origin и т.п., которые обработчик не читает. Для typed варианта проверяется,
+что разобранные models.Update совпадают с полным разбором.
+
+Usage:
+  python tools/bench_json.py --updates 20000
+  python tools/bench_json.py --payloads recorded_updates.jsonl
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from datetime import datetime
+from json_codec import JsonCodec, available_backends
+from models import Update
+
+
+CAPTIONS = ["sprinter", "Фото машины /docs", "LDZ vagonas 2026", "", "invoice #123 for Actros", "teismas"]
+
+
+def make_user(rng: random.Random, user_id: int) -> dict:
+    return {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": rng.choice(["Leanid", "Dashka", "Jonas", "Anna"]),
+        "last_name": rng.choice(["Petrov", "Kazlauskas", "Smith"]),
+        "username": f"user{user_id}",
+        "language_code": rng.choice(["ru", "lt", "en"]),
+        "is_premium": rng.random() < 0.2
+    }
+
+
+def make_sizes(rng: random.Random, n: int) -> list:
+    return [
+        {
+            "file_id": f"AgACAgIAAxkBAAI{n:08d}{w}" + "x" * 40,
+            "file_unique_id": f"AQAD{n:08d}{w}",
+            "file_size": w * 130,
+            "width": w,
+            "height": w * 3 // 4
+        }
+        for w in (90, 320, 800, 1280)
+    ]
+
+
+def make_update(rng: random.Random, n: int) -> dict:
+    """Правдоподобный update из группы: фото/документ/текст с лишними полями"""
+    user_id = rng.randint(10 ** 8, 10 ** 9)
+    chat_id = -10 ** 12 - rng.randint(0, 50)
+    caption = rng.choice(CAPTIONS)
+    message = {
+        "message_id": n,
+        "from": make_user(rng, user_id),
+        "chat": {"id": chat_id, "title": "Logistics team", "type": "supergroup", "is_forum": False},
+        "date": 1760000000 + n,
+        "message_thread_id": rng.randint(1, 500),
+        "has_media_spoiler": False
+    }
+    kind = rng.random()
+    if kind < 0.6:
+        message["photo"] = make_sizes(rng, n)
+    elif kind < 0.85:
+        message["document"] = {
+            "file_name": f"scan_{n}.pdf",
+            "mime_type": "application/pdf",
+            "file_id": f"BQACAgIAAxkBAAI{n:08d}" + "y" * 40,
+            "file_unique_id": f"AgAD{n:08d}",
+            "file_size": rng.randint(10 ** 4, 10 ** 7),
+            "thumbnail": make_sizes(rng, n)[0]
+        }
+    else:
+        message["text"] = rng.choice(["/sprinter", "/docs", "hello", "/cancel"])
+    if caption and "text" not in message:
+        message["caption"] = caption
+        message["caption_entities"] = [{"offset": 0, "length": len(caption), "type": "bold"}]
+    if rng.random() < 0.3:
+        message["reply_to_message"] = {
+            "message_id": n - 1,
+            "from": make_user(rng, user_id + 1),
+            "chat": message["chat"],
+            "date": message["date"] - 60,
+            "text": "Отправь фото прицепа, пожалуйста " * 3
+        }
+    if rng.random() < 0.2:
+        message["forward_origin"] = {"type": "user", "sender_user": make_user(rng, user_id + 2), "date": message["date"] - 3600}
+    if rng.random() < 0.3:
+        message["media_group_id"] = str(13000000000000000 + n // 5)
+    return {"update_id": 900000000 + n, "message": message}
+
+
+RECEIVED_AT = datetime(2026, 1, 1)
+
+
+def routing_view(update: dict) -> tuple:
+    """Всё, что обработчик берёт из update (models.Update)"""
+    message = Update.from_dict(update, RECEIVED_AT).message
+    if message is None:
+        return None
+    media = message.media
+    return (
+        message.message_id, message.chat_id, message.chat_title, message.user_id,
+        message.caption, message.text, message.media_group_id, message.date,
+        media and tuple(getattr(media, slot) for slot in media.__slots__)
+    )
+
+
+def timed(func, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - started
+
+
+def kept(decode, bodies) -> tuple:
+    """Разбор с удержанием результатов: (мкс на update, байт на update)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    results = [decode(body) for body in bodies]
+    elapsed = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return elapsed / len(bodies) * 1e6, size / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON backend benchmark')
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--payloads', default=None, help='JSONL file with recorded updates')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    if args.payloads:
+        with open(args.payloads, 'rb') as f:
+            bodies = [line.strip() for line in f if line.strip()]
+    else:
+        rng = random.Random(args.seed)
+        bodies = [json.dumps(make_update(rng, n), ensure_ascii=False).encode("utf-8") for n in range(args.updates)]
+    
+    reply = {"status": "ok", "queued": True}
+    installed = available_backends()
+    variants = [("legacy", lambda b: json.loads(b.decode("utf-8")), lambda r: json.dumps(r).encode("utf-8"))]
+    for backend in ("json", "orjson", "msgspec"):
+        if backend not in installed:
+            print(f"{backend}: not installed, skipped")
+            continue
+        codec = JsonCodec({"json": {"backend": backend, "typed_updates": False}})
+        variants.append((backend, codec.loads, codec.dumps))
+        if backend == "msgspec":
+            typed = JsonCodec({"json": {"backend": "msgspec", "typed_updates": True}})
+            variants.append(("msgspec/typed", typed.decode_update, typed.dumps))
+    
+    total_kb = sum(len(b) for b in bodies) / 1024
+    print(f"Updates: {len(bodies)}, mean body {total_kb * 1024 / len(bodies):.0f} B")
+    print(f"{'variant':14s} {'decode us':>10s} {'kept us':>8s} {'KB/update':>10s} {'encode us':>10s} {'speedup':>8s}")
+    
+    expected = [routing_view(json.loads(b)) for b in bodies]
+    baseline = None
+    for name, decode, encode in variants:
+        decode_time = timed(decode, bodies) / len(bodies) * 1e6
+        kept_time, kept_size = kept(decode, bodies)
+        encode_time = timed(encode, [reply] * len(bodies)) / len(bodies) * 1e6
+        baseline = baseline or decode_time
+        mismatches = sum(routing_view(decode(b)) != e for b, e in zip(bodies, expected))
+        print(f"{name:14s} {decode_time:10.2f} {kept_time:8.2f} {kept_size / 1024:10.2f} "
+              f"{encode_time:10.2f} {baseline / decode_time:7.2f}x"
+              + (f"  MISMATCHES: {mismatches}" if mismatches else ""))
+
+
+if __name__ == "__main__":
+    main()
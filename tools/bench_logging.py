@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: event loop stall from logging, sync vs async handlers
+
+Burst из N файлов: на каждый файл пишутся те же строки, что и в handle_update
+(webhook_received, file_received, classification_result, file_saved, Downloaded),
+параллельно тикер раз в 1 мс меряет задержку event loop.
+
+  - sync:   RotatingFileHandler + StreamHandler прямо в event loop (logging.async = false)
+  - async:  QueueHandler -> QueueListener в фоновом потоке (logging.async = true)
+
+log us - время самих вызовов логгера в event loop на файл; lag p99 / max -
+насколько тикер опаздывал; drain - сколько фоновый поток дописывал очередь после
+burst. Маленький --max-log-mb заставляет ротацию (rename + open) случаться во время burst.
+
+Отдельно: цена отключённого DEBUG - f-строка, собранная заранее, против
+ленивых аргументов.
+
+Usage:
+  python tools/bench_logging.py --files 20000
+  python tools/bench_logging.py --log-dir /var/log/photosync-bench --max-log-mb 1 --console
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from logger import get_logger
+from models import MediaFile
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    """Раз в 1 мс: насколько позже запланированного проснулись"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.001
+        await asyncio.sleep(0.001)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def burst(args, log) -> dict:
+    """Параллельная обработка files файлов (только логирование и переключения)"""
+    log_time = 0.0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    
+    async def one(n: int) -> None:
+        nonlocal log_time
+        async with semaphore:
+            media = MediaFile(f"file{n}", f"u{n}", f"photo_{n}.jpg", "photo", 250_000 + n)
+            path = f"/SOLAR/PhotoSync/{datetime.now():%Y-%m-%d}/Sprinter/20260101_000000_photo_{n}.jpg"
+            
+            started = time.perf_counter()
+            log.webhook_received(900000000 + n, -1000000000000 - n % 50)
+            log.file_received(media)
+            log_time += time.perf_counter() - started
+            await asyncio.sleep(0)
+            
+            started = time.perf_counter()
+            log.classification_result(media.file_name, "Sprinter", "caption match")
+            log.debug("Downloaded %d bytes", media.file_size)
+            log.file_saved(media.file_name, path, "Sprinter")
+            log_time += time.perf_counter() - started
+            await asyncio.sleep(0)
+    
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(args.files)))
+    elapsed = time.perf_counter() - started
+    
+    stop.set()
+    await tick
+    return {"elapsed": elapsed, "log_time": log_time, "lags": lags}
+
+
+def run_mode(args, async_mode: bool, log_dir: str) -> dict:
+    config = {
+        "logging": {
+            "enabled": True,
+            "log_path": log_dir,
+            "log_file": f"bench_{'async' if async_mode else 'sync'}.log",
+            "log_level": "INFO",
+            "max_log_size_mb": args.max_log_mb,
+            "backup_count": 3,
+            "async": async_mode
+        }
+    }
+    
+    # StreamHandler запоминает sys.stderr при создании
+    stderr = sys.stderr
+    if not args.console:
+        sys.stderr = open(os.devnull, "w")
+    try:
+        log = get_logger()
+        log.setup(config)
+        result = asyncio.run(burst(args, log))
+        started = time.perf_counter()
+        log.stop()
+        result["drain"] = time.perf_counter() - started
+    finally:
+        if sys.stderr is not stderr:
+            sys.stderr.close()
+            sys.stderr = stderr
+    return result
+
+
+def disabled_debug_cost(calls: int) -> tuple:
+    """Отключённый DEBUG: f-строка собирается заранее vs ленивые аргументы (нс на вызов)"""
+    log = get_logger()
+    update_id, chat_id = 900000000, -1000000000000
+    
+    started = time.perf_counter()
+    for _ in range(calls):
+        log.logger.debug(f"Webhook received: update_id={update_id}, chat_id={chat_id}")
+    eager = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for _ in range(calls):
+        log.webhook_received(update_id, chat_id)
+    lazy = time.perf_counter() - started
+    
+    return eager / calls * 1e9, lazy / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Logging stall benchmark')
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--log-dir', default=None, help='Where to write logs (default: temp dir)')
+    parser.add_argument('--max-log-mb', type=float, default=1, help='Rotation size (small = rotations during burst)')
+    parser.add_argument('--console', action='store_true', help='Keep console output (stderr) enabled')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = args.log_dir or tmp
+        print(f"Files: {args.files}, 5 log calls per file (4 at INFO), logs in {log_dir}")
+        print(f"{'mode':6s} {'burst s':>8s} {'log us/file':>12s} {'loop stall ms':>14s} "
+              f"{'lag p99 ms':>11s} {'lag max ms':>11s} {'drain ms':>9s}")
+        
+        for async_mode in (False, True):
+            r = run_mode(args, async_mode, log_dir)
+            lags = r["lags"]
+            print(f"{'async' if async_mode else 'sync':6s} {r['elapsed']:8.2f} "
+                  f"{r['log_time'] / args.files * 1e6:12.1f} {r['log_time'] * 1000:14.1f} "
+                  f"{percentile(lags, 0.99) * 1000:11.2f} {max(lags, default=0) * 1000:11.2f} "
+                  f"{r['drain'] * 1000:9.1f}")
+        
+        eager, lazy = disabled_debug_cost(200000)
+        print(f"\nDisabled DEBUG: f-string {eager:.0f} ns/call, lazy args {lazy:.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
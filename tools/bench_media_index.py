@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: /api/photosync/files queries on a large media index
+
+Заполняет MediaIndex синтетическими записями (по умолчанию 1M файлов за ~3 года:
+категории, типы, чаты, пользователи, подписи) и меряет запросы страницы
+(limit 50) с разными фильтрами: p50 / p99 / max в мс. Курсор берётся со
+случайной позиции в середине выдачи - глубокая страница должна стоить
+столько же, сколько первая.
+
+Usage:
+  python tools/bench_media_index.py --files 1000000
+  python tools/bench_media_index.py --files 200000 --queries 500 --keep /tmp/media_bench
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from media_index import MediaIndex, day_to_id, encode_cursor
+
+
+CATEGORIES = ["Sprinter", "LDZ", "Legal", "Documents", "Actros", "Other"]
+MEDIA_TYPES = ["photo"] * 14 + ["document"] * 4 + ["video"] * 2
+WORDS = (
+    "sprinter vagonas ldz teismas invoice passport паспорт фото прицеп кузов "
+    "накладная договор суд акт ремонт колесо двигатель таможня cmr frigo"
+).split()
+RARE_WORD = "xylograph"
+
+
+def make_rows(rng: random.Random, root: Path, files: int, days: int):
+    """Записи в порядке сохранения: даты растут, id - вместе с ними"""
+    start = date.today() - timedelta(days=days)
+    per_day = files / days
+    for n in range(files):
+        day = start + timedelta(days=int(n / per_day))
+        category = rng.choice(CATEGORIES)
+        media_type = rng.choice(MEDIA_TYPES)
+        caption = ""
+        if rng.random() < 0.6:
+            caption = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            if n % 100000 == 7:
+                caption += f" {RARE_WORD}"
+        yield (
+            root / day.isoformat() / category / f"20260101_{n:07d}_file.jpg",
+            rng.randint(50_000, 5_000_000),
+            media_type,
+            -1000000000000 - rng.randint(0, 49),
+            rng.randint(1, 500),
+            f"IMG_{n}.jpg",
+            caption,
+            1_700_000_000 + n
+        )
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Media index query benchmark')
+    parser.add_argument('--files', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=1100)
+    parser.add_argument('--queries', type=int, default=200, help='Runs per query type')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', default=None, help='Directory for the index (reused if it exists)')
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    tmp = tempfile.TemporaryDirectory()
+    state_dir = args.keep or tmp.name
+    root = Path(state_dir) / "root"
+    config = {"storage": {"root_path": str(root)}, "state": {"path": state_dir}}
+    index = MediaIndex(config)
+    rng = random.Random(args.seed)
+    
+    if index.count() < args.files:
+        started = time.perf_counter()
+        rows = make_rows(rng, root, args.files, args.days)
+        while True:
+            batch = [row for _, row in zip(range(10000), rows)]
+            if not batch:
+                break
+            index.add_many(batch)
+        elapsed = time.perf_counter() - started
+        print(f"Indexed {args.files} files in {elapsed:.1f}s ({args.files / elapsed:,.0f} rows/s)")
+    
+    total = index.count()
+    days = [d for (d,) in index.conn.execute("SELECT DISTINCT day FROM files")]
+    print(f"Index: {total} files, {len(days)} days, FTS5: {index.fts}")
+    
+    def mid_cursor():
+        day = days[rng.randint(len(days) // 4, len(days) * 3 // 4)]
+        return encode_cursor(day_to_id(day) + rng.randint(0, total // len(days)))
+    
+    def day_range(width: int):
+        first = rng.randrange(len(days) - width)
+        return {"date_from": days[first], "date_to": days[first + width]}
+    
+    queries = {
+        "newest page": lambda: {},
+        "deep cursor": lambda: {"cursor": mid_cursor()},
+        "category": lambda: {"category": rng.choice(CATEGORIES)},
+        "category + cursor": lambda: {"category": rng.choice(CATEGORIES), "cursor": mid_cursor()},
+        "date range 30d": lambda: day_range(30),
+        "category + 7d": lambda: dict(day_range(7), category=rng.choice(CATEGORIES)),
+        "chat": lambda: {"chat_id": -1000000000000 - rng.randint(0, 49)},
+        "user": lambda: {"user_id": rng.randint(1, 500)},
+        "media_type video": lambda: {"media_type": "video"},
+        "chat + user + type": lambda: {
+            "chat_id": -1000000000000 - rng.randint(0, 49),
+            "user_id": rng.randint(1, 500),
+            "media_type": "video"
+        },
+        "text common": lambda: {"text": rng.choice(WORDS)},
+        "text prefix": lambda: {"text": rng.choice(WORDS)[:3]},
+        "text rare": lambda: {"text": RARE_WORD},
+        "text + category": lambda: {"text": rng.choice(WORDS), "category": rng.choice(CATEGORIES)},
+        "text + 30d": lambda: dict(day_range(30), text=rng.choice(WORDS)),
+        "text + cursor": lambda: {"text": rng.choice(WORDS), "cursor": mid_cursor()},
+        # Худший случай: частое слово и фильтр, под который почти ничего не подходит -
+        # FTS5 отдаёт совпадения по убыванию id, пока не наберётся страница
+        "text + chat/user/type": lambda: {
+            "text": rng.choice(WORDS),
+            "chat_id": -1000000000000 - rng.randint(0, 49),
+            "user_id": rng.randint(1, 500),
+            "media_type": "video"
+        },
+    }
+    
+    print(f"{'query':20s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'rows':>6s}")
+    worst = 0.0
+    for name, make in queries.items():
+        times = []
+        rows = 0
+        for _ in range(args.queries):
+            params = make()
+            started = time.perf_counter()
+            files, _ = index.search(limit=50, **params)
+            times.append((time.perf_counter() - started) * 1000)
+            rows += len(files)
+        worst = max(worst, percentile(times, 0.99))
+        print(f"{name:20s} {percentile(times, 0.5):8.2f} {percentile(times, 0.99):8.2f} "
+              f"{max(times):8.2f} {rows / args.queries:6.1f}")
+    
+    print(f"\nWorst p99: {worst:.2f} ms")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
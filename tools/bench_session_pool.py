@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: shared ClientSession vs session per call
+
+Запускает локальную заглушку Bot API (tools/fake_bot_api.py) и прогоняет
+burst из N фото-апдейтов (getFile -> download -> sendMessage):
+  - legacy: новая aiohttp.ClientSession на каждый вызов, файл целиком в
+    памяти, затем на диск (как было до v1.2.x)
+  - pooled: общий TelegramApiClient с пулом keep-alive соединений, загрузка
+    потоком в хранилище (WebhookHandler._download_to_storage -> FileSaver.save_stream)
+
+Usage:
+  python tools/bench_session_pool.py --updates 500
+  python tools/bench_session_pool.py --cert cert.pem --key key.pem   # с TLS handshake
+"""
+
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_bot_api import FakeBotApi, make_ssl_context
+from telegram_api import create_api_client
+from heic_converter import create_converter
+from file_saver import create_file_saver
+from webhook_handler import WebhookHandler
+
+
+TOKEN = "123:BENCH"
+
+
+async def legacy_update(api_url: str, file_id: str, client_ssl, target_dir: Path) -> float:
+    """Старый путь: отдельная сессия для скачивания и для ответа, файл через память"""
+    started = time.perf_counter()
+    
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{api_url}/bot{TOKEN}/getFile", params={"file_id": file_id}, ssl=client_ssl) as resp:
+            data = await resp.json()
+        file_path = data["result"]["file_path"]
+        async with session.get(f"{api_url}/file/bot{TOKEN}/{file_path}", ssl=client_ssl) as resp:
+            file_bytes = await resp.read()
+    (target_dir / f"{file_id}.jpg").write_bytes(file_bytes)
+    
+    async with aiohttp.ClientSession() as session:
+        payload = {"chat_id": 1, "text": "☀️ Saved → Other", "parse_mode": "HTML"}
+        async with session.post(f"{api_url}/bot{TOKEN}/sendMessage", json=payload, ssl=client_ssl) as resp:
+            await resp.read()
+    
+    return time.perf_counter() - started
+
+
+async def pooled_update(handler: WebhookHandler, file_id: str) -> float:
+    """Новый путь: методы WebhookHandler поверх общей сессии, загрузка потоком в хранилище"""
+    started = time.perf_counter()
+    telegram_path, filename = await handler._get_file(file_id, "photo.jpg")
+    saved = await handler._download_to_storage(telegram_path, "Other", filename, datetime.now())
+    if not saved["success"]:
+        raise RuntimeError(saved["message"])
+    await handler.sender._post(1, "☀️ Saved → Other")
+    return time.perf_counter() - started
+
+
+def report(name: str, latencies: list, wall: float, fake: FakeBotApi):
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{name:8s} files={len(latencies):4d}  wall={wall:6.2f}s  "
+          f"p50={p(0.50):7.1f}ms  p95={p(0.95):7.1f}ms  p99={p(0.99):7.1f}ms  "
+          f"mean={statistics.mean(latencies) * 1000:7.1f}ms  "
+          f"connections={len(fake.connections)}")
+
+
+async def run(args):
+    server_ssl = make_ssl_context(args.cert, args.key) if args.cert and args.key else None
+    client_ssl = False if server_ssl else None
+    scheme = "https" if server_ssl else "http"
+    
+    for mode in ("legacy", "pooled"):
+        fake = FakeBotApi(file_size=args.file_size, latency_ms=args.latency_ms)
+        runner = await fake.start(ssl_context=server_ssl)
+        port = runner.addresses[0][1]
+        api_url = f"{scheme}://127.0.0.1:{port}"
+        
+        root = tempfile.mkdtemp(prefix="photosync-bench-")
+        config = {
+            "bot": {"token": TOKEN, "api_url": api_url},
+            # verify_ssl=False: у заглушки самоподписанный сертификат
+            "http": {"limit_per_host": args.limit_per_host, "verify_ssl": not server_ssl},
+            "storage": {"root_path": root},
+            "media_index": {"enabled": False}
+        }
+        
+        started = time.perf_counter()
+        if mode == "legacy":
+            latencies = await asyncio.gather(*[
+                legacy_update(api_url, str(i), client_ssl, Path(root)) for i in range(args.updates)
+            ])
+        else:
+            api_client = create_api_client(config)
+            await api_client.start()
+            heic_converter = create_converter(config)
+            file_saver = create_file_saver(config, heic_converter)
+            handler = WebhookHandler(config, None, file_saver, api_client)
+            latencies = await asyncio.gather(*[
+                pooled_update(handler, str(i)) for i in range(args.updates)
+            ])
+            await api_client.close()
+            heic_converter.close()
+        wall = time.perf_counter() - started
+        
+        report(mode, latencies, wall, fake)
+        await runner.cleanup()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared session benchmark')
+    parser.add_argument('--updates', type=int, default=500)
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--limit-per-host', type=int, default=30)
+    parser.add_argument('--cert', default=None)
+    parser.add_argument('--key', default=None)
+    args = parser.parse_args()
+    
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: UserStateManager memory per N users
+
+Сравнивает объём памяти (tracemalloc) на N пользователей с активной категорией:
+  - legacy: dict {user_id: {"category": str, "last_activity": float}} (как было до v1.2.x)
+  - slots:  UserStateManager (OrderedDict -> UserState со __slots__), без снимка на диск
+
+и время операций set / get / update_activity, а также восстановления из SQLite.
+
+Usage:
+  python tools/bench_user_state.py --users 100000
+"""
+
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from user_state import UserStateManager
+
+
+CATEGORIES = list(UserStateManager.CATEGORY_COMMANDS.values())[:-1]
+
+
+def measure(build) -> tuple:
+    """Память (байт) и время построения структуры"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - started
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before, elapsed
+
+
+def build_legacy(users: int) -> dict:
+    states = {}
+    now = time.time()
+    for user_id in range(users):
+        states[user_id] = {"category": CATEGORIES[user_id % len(CATEGORIES)], "last_activity": now}
+    return states
+
+
+def build_slots(users: int, config=None) -> UserStateManager:
+    manager = UserStateManager(config)
+    manager.max_entries = max(manager.max_entries, users)
+    for user_id in range(users):
+        manager.set_user_category(user_id, CATEGORIES[user_id % len(CATEGORIES)])
+    return manager
+
+
+def bench_ops(manager: UserStateManager, users: int, operations: int) -> dict:
+    """Среднее время операции (мкс) на случайных пользователях"""
+    ids = [random.randrange(users) for _ in range(operations)]
+    result = {}
+    
+    started = time.perf_counter()
+    for user_id in ids:
+        manager.get_user_category(user_id)
+    result["get"] = (time.perf_counter() - started) / operations * 1e6
+    
+    started = time.perf_counter()
+    for user_id in ids:
+        manager.update_activity(user_id)
+    result["update_activity"] = (time.perf_counter() - started) / operations * 1e6
+    
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UserStateManager memory benchmark')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--ops', type=int, default=100000)
+    args = parser.parse_args()
+    
+    # Логи "Set active category" на каждого пользователя не нужны
+    import logging
+    logging.disable(logging.INFO)
+    
+    _, legacy_bytes, legacy_time = measure(lambda: build_legacy(args.users))
+    manager, slots_bytes, slots_time = measure(lambda: build_slots(args.users))
+    
+    print(f"Users: {args.users}")
+    print(f"{'variant':10s} {'total MB':>9s} {'B/user':>8s} {'build ms':>9s}")
+    print(f"{'legacy':10s} {legacy_bytes / 1e6:9.2f} {legacy_bytes / args.users:8.0f} {legacy_time * 1000:9.0f}")
+    print(f"{'slots':10s} {slots_bytes / 1e6:9.2f} {slots_bytes / args.users:8.0f} {slots_time * 1000:9.0f}")
+    
+    ops = bench_ops(manager, args.users, args.ops)
+    print(f"\nget_user_category: {ops['get']:.2f} us/op, update_activity: {ops['update_activity']:.2f} us/op")
+    
+    with tempfile.TemporaryDirectory() as state_dir:
+        config = {"state": {"path": state_dir}, "user_state": {"max_entries": args.users}}
+        
+        persisted = UserStateManager(config)
+        persisted.conn.executemany(
+            "INSERT INTO users (user_id, category, last_activity) VALUES (?, ?, ?)",
+            [(user_id, CATEGORIES[user_id % len(CATEGORIES)], time.time()) for user_id in range(args.users)]
+        )
+        persisted.conn.commit()
+        persisted.close()
+        
+        started = time.perf_counter()
+        restored = UserStateManager(config)
+        print(f"Restore {len(restored._user_states)} users from snapshot: "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        restored.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Benchmark: throughput of --workers 1..N
+
+Запускает заглушку Bot API (tools/fake_bot_api.py) и бота (src/bot.py) отдельными
+процессами, для каждого числа воркеров отправляет burst из N фото-апдейтов в
+webhook и ждёт, пока все файлы не окажутся в хранилище (по /api/photosync/stats,
+счётчики общие для всех воркеров).
+
+Чтобы упереться в CPU, а не в сеть, отдавайте HEIC: --sample-file photo.heic
+(каждый файл конвертируется в JPEG).
+
+Usage:
+  python tools/bench_workers.py --max-workers 4 --updates 2000
+  python tools/bench_workers.py --workers 1 2 4 8 --sample-file sample.heic
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import aiohttp
+
+
+ROOT = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, timeout: float = 30) -> None:
+    """Ждать, пока сервер не начнёт отвечать"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start in {timeout}s")
+
+
+async def total_files(session: aiohttp.ClientSession, base_url: str) -> int:
+    async with session.get(f"{base_url}/api/photosync/stats") as resp:
+        return (await resp.json())["total_files"]
+
+
+def make_update(n: int) -> dict:
+    chat_id = n % 50
+    return {
+        "update_id": n,
+        "message": {
+            "message_id": n,
+            "chat": {"id": chat_id, "title": "Bench"},
+            "from": {"id": chat_id},
+            "caption": "sprinter",
+            "photo": [{"file_id": f"bench{n}", "file_unique_id": f"benchu{n}"}]
+        }
+    }
+
+
+async def run_once(args, workers: int, api_url: str) -> dict:
+    """Один прогон: запуск бота с N воркерами, burst, ожидание сохранения"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        config["bot"]["api_url"] = api_url
+        config["bot"]["token"] = "123:BENCH"
+        config["storage"]["root_path"] = os.path.join(work_dir, "storage")
+        config["logging"]["log_path"] = os.path.join(work_dir, "logs")
+        config.setdefault("dedup", {})["enabled"] = False
+        config_path = os.path.join(work_dir, "config.json")
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = dict(os.environ, TELEGRAM_BOT_TOKEN="123:BENCH")
+        bot = subprocess.Popen(
+            [sys.executable, str(ROOT / "src" / "bot.py"), "-c", config_path, "-p", str(port),
+             "--workers", str(workers)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        
+        try:
+            connector = aiohttp.TCPConnector(limit=args.concurrency, force_close=True)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                await wait_ready(session, f"{base_url}/api/photosync/ping")
+                # Все воркеры должны успеть подняться
+                await asyncio.sleep(1 + 0.2 * workers)
+                
+                semaphore = asyncio.Semaphore(args.concurrency)
+                rejected = 0
+                
+                async def post(n: int) -> None:
+                    nonlocal rejected
+                    async with semaphore:
+                        while True:
+                            async with session.post(f"{base_url}/api/photosync/webhook", json=make_update(n)) as resp:
+                                if resp.status != 503:
+                                    return
+                            rejected += 1
+                            await asyncio.sleep(0.05)
+                
+                started = time.perf_counter()
+                await asyncio.gather(*(post(n) for n in range(1, args.updates + 1)))
+                accepted = time.perf_counter() - started
+                
+                saved = 0
+                deadline = time.monotonic() + args.timeout
+                while saved < args.updates and time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+                    saved = await total_files(session, base_url)
+                elapsed = time.perf_counter() - started
+        finally:
+            bot.send_signal(signal.SIGTERM)
+            try:
+                bot.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+    
+    return {
+        "workers": workers,
+        "saved": saved,
+        "accepted_s": accepted,
+        "elapsed_s": elapsed,
+        "files_per_s": saved / elapsed,
+        "rejected": rejected
+    }
+
+
+async def run(args):
+    fake_port = free_port()
+    fake_cmd = [sys.executable, str(ROOT / "tools" / "fake_bot_api.py"), "--port", str(fake_port),
+                "--file-size", str(args.file_size)]
+    if args.sample_file:
+        fake_cmd += ["--sample-file", args.sample_file]
+    fake = subprocess.Popen(fake_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    api_url = f"http://127.0.0.1:{fake_port}"
+    
+    counts = args.workers or list(range(1, args.max_workers + 1))
+    results = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_ready(session, f"{api_url}/_stats")
+        for workers in counts:
+            results.append(await run_once(args, workers, api_url))
+            r = results[-1]
+            print(f"workers={r['workers']:2d}  saved={r['saved']:5d}  accepted={r['accepted_s']:6.2f}s  "
+                  f"total={r['elapsed_s']:6.2f}s  {r['files_per_s']:8.1f} files/s  "
+                  f"speedup={r['files_per_s'] / results[0]['files_per_s']:4.2f}x  503s={r['rejected']}")
+    finally:
+        fake.terminate()
+        fake.wait()
+    
+    print(f"\nCPU cores: {os.cpu_count()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='--workers throughput benchmark')
+    parser.add_argument('-c', '--config', default=str(ROOT / "config" / "photosync.config.json"))
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='Explicit worker counts')
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=40, help='Parallel webhook connections')
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    parser.add_argument('--sample-file', default=None, help='Serve this file (e.g. HEIC) for every download')
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+    
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
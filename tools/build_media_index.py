@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Media Index Builder
+Сверка индекса метаданных (/api/photosync/files) с деревом root_path: добавить
+файлы, сохранённые до появления индекса, и удалить записи исчезнувших
+
+Usage:
+  python tools/build_media_index.py
+  python tools/build_media_index.py --config /var/www/SolarPhotoSync/config/photosync.config.json
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from media_index import create_media_index
+
+
+def load_config(config_path: str = None) -> dict:
+    """Загрузить конфигурацию"""
+    if config_path is None:
+        config_path = Path(__file__).parent.parent / "config" / "photosync.config.json"
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SOLAR PhotoSync - Build media index')
+    parser.add_argument('--config', '-c', help='Path to config file', default=None)
+    parser.add_argument('--root', help='Storage root (overrides storage.root_path)', default=None)
+    args = parser.parse_args()
+    
+    config = load_config(args.config)
+    if args.root:
+        config.setdefault("storage", {})["root_path"] = args.root
+    config.setdefault("media_index", {})["enabled"] = True
+    
+    root_path = Path(config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync"))
+    if not root_path.exists():
+        print(f"Error: root path not found: {root_path}")
+        sys.exit(1)
+    
+    print("=" * 50)
+    print("☀️  SOLAR PhotoSync - Media Index Builder")
+    print("=" * 50)
+    print(f"Root: {root_path}")
+    
+    index = create_media_index(config)
+    started = time.time()
+    
+    def progress(added: int, removed: int):
+        print(f"  added: {added}, removed: {removed}", end="\r", flush=True)
+    
+    added, removed = index.sync(progress)
+    elapsed = time.time() - started
+    
+    print()
+    print(f"✅ Added {added} files, removed {removed} missing ({elapsed:.1f}s)")
+    print(f"   Index entries: {index.count()}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
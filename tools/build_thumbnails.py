@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Thumbnail Backfill
+Миниатюры для уже существующего дерева root_path (пропускаются файлы, у которых они актуальны)
+
+Usage:
+  python tools/build_thumbnails.py
+  python tools/build_thumbnails.py --config /var/www/SolarPhotoSync/config/photosync.config.json --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from dedup_index import iter_media_files
+from thumbnailer import create_thumbnailer
+
+
+def load_config(config_path: str = None) -> dict:
+    """Загрузить конфигурацию"""
+    if config_path is None:
+        config_path = Path(__file__).parent.parent / "config" / "photosync.config.json"
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SOLAR PhotoSync - Build thumbnails')
+    parser.add_argument('--config', '-c', help='Path to config file', default=None)
+    parser.add_argument('--root', help='Storage root (overrides storage.root_path)', default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+    
+    config = load_config(args.config)
+    if args.root:
+        config.setdefault("storage", {})["root_path"] = args.root
+    thumbs_config = config.setdefault("thumbnails", {})
+    thumbs_config["enabled"] = True
+    thumbs_config["workers"] = args.workers
+    
+    root_path = Path(config.get("storage", {}).get("root_path", "/SOLAR/PhotoSync"))
+    if not root_path.exists():
+        print(f"Error: root path not found: {root_path}")
+        sys.exit(1)
+    
+    thumbnailer = create_thumbnailer(config)
+    if not thumbnailer.enabled:
+        print("Error: Pillow is not installed")
+        sys.exit(1)
+    
+    print("=" * 50)
+    print("☀️  SOLAR PhotoSync - Thumbnail Backfill")
+    print("=" * 50)
+    print(f"Root: {root_path}")
+    print(f"Sizes: {thumbnailer.sizes}, format: {thumbnailer.image_format}, workers: {thumbnailer.workers}")
+    
+    started = time.time()
+    up_to_date = 0
+    for path in iter_media_files(root_path):
+        if not thumbnailer.accepts(path):
+            continue
+        if thumbnailer.is_fresh(path):
+            up_to_date += 1
+            continue
+        
+        # Не больше queue_limit файлов в очереди пула
+        thumbnailer.wait(thumbnailer.queue_limit - 1)
+        thumbnailer.submit(path)
+        print(f"  generated: {thumbnailer.generated}, up to date: {up_to_date}, "
+              f"failed: {thumbnailer.failed}", end="\r", flush=True)
+    
+    thumbnailer.wait()
+    elapsed = time.time() - started
+    thumbnailer.close()
+    
+    print()
+    rate = thumbnailer.generated / elapsed if elapsed else 0.0
+    print(f"✅ Generated {thumbnailer.generated} files ({rate:.1f} files/s), "
+          f"{up_to_date + thumbnailer.cached} up to date, {thumbnailer.failed} failed ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+SOLAR PhotoSync - Fake Telegram Bot API
+Локальная заглушка Bot API для бенчмарков и проверки без доступа к api.telegram.org
+
+Поддерживает: getFile, скачивание /file/bot<token>/<path>, sendMessage
+(опционально с лимитами Telegram: 1 сообщение/с в чат, 30/с всего -> 429),
+getUpdates (long polling по очереди add_update) и deleteWebhook.
+Для подключения бота укажите в конфиге "bot": {"api_url": "http://127.0.0.1:8081"}
+"""
+
+import os
+import sys
+import ssl
+import asyncio
+import argparse
+import time
+import hashlib
+from aiohttp import web
+
+
+class FakeBotApi:
+    """Заглушка Telegram Bot API"""
+    
+    # Лимиты sendMessage Telegram
+    CHAT_INTERVAL = 1.0
+    GLOBAL_PER_SECOND = 30
+    
+    def __init__(self, file_size: int = 256 * 1024, latency_ms: float = 0.0, sample_file: str = None,
+                 enforce_limits: bool = False):
+        """
+        Args:
+            file_size: Размер отдаваемых файлов в байтах
+            latency_ms: Искусственная задержка ответа каждого метода
+            sample_file: Отдавать содержимое этого файла (например HEIC) вместо синтетических байтов
+            enforce_limits: Отвечать 429 с retry_after при превышении лимитов sendMessage
+        """
+        self.file_size = file_size
+        self.latency = latency_ms / 1000.0
+        self.extension = ".jpg"
+        
+        # Счётчики для проверки переиспользования соединений
+        self.requests = 0
+        self.connections = set()
+        self.sent_messages = []
+        self.rate_limited = 0
+        
+        self.enforce_limits = enforce_limits
+        self._last_by_chat = {}
+        self._recent = []
+        
+        # Очередь для getUpdates
+        self.updates = []
+        self._next_update_id = 1
+        self._new_updates = None
+        
+        self._payload = hashlib.sha256(b"solar").digest() * (file_size // 32 + 1)
+        
+        if sample_file:
+            with open(sample_file, 'rb') as f:
+                self._payload = f.read()
+            self.file_size = len(self._payload)
+            self.extension = os.path.splitext(sample_file)[1].lower() or ".bin"
+    
+    def make_app(self) -> web.Application:
+        """Собрать aiohttp приложение"""
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/getFile', self.handle_get_file)
+        app.router.add_route('*', '/bot{token}/sendMessage', self.handle_send_message)
+        app.router.add_route('*', '/bot{token}/getUpdates', self.handle_get_updates)
+        app.router.add_route('*', '/bot{token}/deleteWebhook', self.handle_delete_webhook)
+        app.router.add_get('/file/bot{token}/{path:.+}', self.handle_download)
+        app.router.add_get('/_stats', self.handle_stats)
+        return app
+    
+    def _track(self, request: web.Request):
+        self.requests += 1
+        self.connections.add(id(request.transport))
+    
+    async def _params(self, request: web.Request) -> dict:
+        params = dict(request.query)
+        if request.method == 'POST' and request.can_read_body:
+            if request.content_type == 'application/json':
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+    
+    async def handle_get_file(self, request: web.Request) -> web.Response:
+        self._track(request)
+        params = await self._params(request)
+        file_id = str(params.get("file_id", "unknown"))
+        
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        return web.json_response({
+            "ok": True,
+            "result": {
+                "file_id": file_id,
+                "file_unique_id": f"u_{file_id}",
+                "file_size": self.file_size,
+                "file_path": f"photos/file_{file_id}{self.extension}"
+            }
+        })
+    
+    async def handle_download(self, request: web.Request) -> web.Response:
+        self._track(request)
+        
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        return web.Response(
+            body=self._payload[:self.file_size],
+            content_type='application/octet-stream'
+        )
+    
+    def _retry_after(self, chat_id) -> int:
+        """Секунды до снятия лимита (0 - можно отправлять)"""
+        now = time.monotonic()
+        self._recent = [t for t in self._recent if now - t < 1.0]
+        
+        since_chat = now - self._last_by_chat.get(chat_id, -self.CHAT_INTERVAL)
+        if since_chat < self.CHAT_INTERVAL or len(self._recent) >= self.GLOBAL_PER_SECOND:
+            return 1
+        
+        self._last_by_chat[chat_id] = now
+        self._recent.append(now)
+        return 0
+    
+    async def handle_send_message(self, request: web.Request) -> web.Response:
+        self._track(request)
+        params = await self._params(request)
+        
+        if self.enforce_limits:
+            retry_after = self._retry_after(params.get("chat_id"))
+            if retry_after:
+                self.rate_limited += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after}
+                }, status=429)
+        
+        self.sent_messages.append(params)
+        
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        return web.json_response({
+            "ok": True,
+            "result": {"message_id": len(self.sent_messages), "chat": {"id": params.get("chat_id")}}
+        })
+    
+    def add_update(self, message: dict) -> int:
+        """Положить update в очередь getUpdates, вернуть его update_id"""
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        self.updates.append({"update_id": update_id, "message": message})
+        if self._new_updates is not None:
+            self._new_updates.set()
+        return update_id
+    
+    def add_photo_updates(self, count: int, chat_id: int = 1, caption: str = "sprinter") -> None:
+        """Сгенерировать count фото-сообщений"""
+        for n in range(count):
+            self.add_update({
+                "message_id": self._next_update_id,
+                "chat": {"id": chat_id, "title": "Fake chat"},
+                "from": {"id": chat_id},
+                "caption": caption,
+                "photo": [{"file_id": f"p{self._next_update_id}", "file_unique_id": f"pu{self._next_update_id}",
+                           "file_size": self.file_size}]
+            })
+    
+    async def handle_get_updates(self, request: web.Request) -> web.Response:
+        self._track(request)
+        params = await self._params(request)
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+        
+        # Как в Telegram: offset подтверждает все updates с меньшим id
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        
+        if not self.updates and timeout > 0:
+            self._new_updates = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._new_updates = None
+        
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        return web.json_response({"ok": True, "result": self.updates[:limit]})
+    
+    async def handle_delete_webhook(self, request: web.Request) -> web.Response:
+        self._track(request)
+        return web.json_response({"ok": True, "result": True})
+    
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.requests,
+            "connections": len(self.connections),
+            "sent_messages": len(self.sent_messages),
+            "rate_limited": self.rate_limited,
+            "pending_updates": len(self.updates)
+        })
+    
+    async def start(self, host: str = "127.0.0.1", port: int = 0,
+                    ssl_context: ssl.SSLContext = None) -> web.AppRunner:
+        """
+        Запустить сервер в текущем event loop
+        
+        Returns:
+            AppRunner (порт доступен через runner.addresses)
+        """
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port, ssl_context=ssl_context)
+        await site.start()
+        return runner
+
+
+def make_ssl_context(cert: str, key: str) -> ssl.SSLContext:
+    """SSL контекст сервера (самоподписанный сертификат для замера TLS handshake)"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SOLAR PhotoSync - Fake Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', '-p', type=int, default=8081)
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help='Download size in bytes')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Artificial latency per request')
+    parser.add_argument('--sample-file', default=None, help='Serve this file for every download')
+    parser.add_argument('--enforce-limits', action='store_true', help='Reply 429 above Telegram sendMessage limits')
+    parser.add_argument('--feed', type=int, default=0, help='Queue N photo updates for getUpdates')
+    parser.add_argument('--cert', default=None, help='TLS certificate (enables HTTPS)')
+    parser.add_argument('--key', default=None, help='TLS private key')
+    args = parser.parse_args()
+    
+    fake = FakeBotApi(file_size=args.file_size, latency_ms=args.latency_ms, sample_file=args.sample_file,
+                      enforce_limits=args.enforce_limits)
+    fake.add_photo_updates(args.feed)
+    ssl_context = make_ssl_context(args.cert, args.key) if args.cert and args.key else None
+    
+    scheme = "https" if ssl_context else "http"
+    print(f"Fake Bot API listening on {scheme}://{args.host}:{args.port}")
+    web.run_app(fake.make_app(), host=args.host, port=args.port,
+                ssl_context=ssl_context, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    sys.exit(main())